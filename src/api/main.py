@@ -0,0 +1,289 @@
+import argparse
+import os
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Annotated
+
+from fastapi import Depends, FastAPI, Query, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from starlette.concurrency import run_in_threadpool
+
+from application.exceptions import (
+    FlatNotFound,
+    InvalidCredentials,
+    InvalidSortKey,
+    ItemAlreadySold,
+    NotAnOwnerError,
+    TransactionConflict,
+    UsernameTaken,
+    UserNotFound,
+)
+from application.async_use_cases import (
+    AsyncAddMoney,
+    AsyncBuyFlat,
+    AsyncEditProfile,
+    AsyncGetFlatFacets,
+    AsyncGetFlatPage,
+    AsyncGetUser,
+    AsyncGetUserProperty,
+    AsyncLogin,
+    AsyncRegister,
+    AsyncSellFlat,
+)
+from application.metrics import METRICS
+from domain.exceptions import InvalidPassword, InvalidUsername, NotEnoughMoney
+from domain.value_objects import FlatQuery
+from infrastructure.resources import (
+    AsyncResources,
+    create_async_resources,
+    get_resources,
+    shutdown_resources,
+)
+from infrastructure.versions import SharedVersions
+
+from .schemas import (
+    CredentialsIn,
+    DepositIn,
+    FlatFacetsOut,
+    FlatOut,
+    FlatPageOut,
+    ProfileIn,
+    TokenOut,
+    UserOut,
+    UserPropertyOut,
+)
+from .tokens import API_SECRET_KEY_VARIABLE, InvalidToken, TokenSigner
+
+API_THREADS = int(os.environ.get("API_THREADS", 64))
+MAX_PAGE_SIZE = 100
+
+_ERROR_STATUSES = {
+    InvalidUsername: status.HTTP_400_BAD_REQUEST,
+    InvalidPassword: status.HTTP_400_BAD_REQUEST,
+    InvalidSortKey: status.HTTP_400_BAD_REQUEST,
+    InvalidCredentials: status.HTTP_401_UNAUTHORIZED,
+    InvalidToken: status.HTTP_401_UNAUTHORIZED,
+    UserNotFound: status.HTTP_404_NOT_FOUND,
+    FlatNotFound: status.HTTP_404_NOT_FOUND,
+    NotAnOwnerError: status.HTTP_403_FORBIDDEN,
+    UsernameTaken: status.HTTP_409_CONFLICT,
+    ItemAlreadySold: status.HTTP_409_CONFLICT,
+    NotEnoughMoney: status.HTTP_409_CONFLICT,
+    TransactionConflict: status.HTTP_409_CONFLICT,
+}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    app.state.token_signer = TokenSigner.from_environment()
+    executor = ThreadPoolExecutor(API_THREADS, thread_name_prefix="api")
+    resources = await run_in_threadpool(get_resources)
+    app.state.resources = create_async_resources(resources, executor)
+    yield
+    await app.state.resources.close()
+    executor.shutdown()
+    await run_in_threadpool(shutdown_resources)
+
+
+app = FastAPI(title="Flat market", lifespan=lifespan)
+
+
+async def _handle_error(request: Request, error: Exception) -> JSONResponse:
+    # Subclasses of the mapped errors get the status of their nearest base.
+    status_code = next(
+        _ERROR_STATUSES[error_class]
+        for error_class in type(error).__mro__
+        if error_class in _ERROR_STATUSES
+    )
+    return JSONResponse(status_code=status_code, content={"detail": str(error)})
+
+
+for error_class in _ERROR_STATUSES:
+    app.add_exception_handler(error_class, _handle_error)
+
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """Traces the request under the ``X-Request-ID`` passed by the client.
+
+    The trace ID is returned in the ``X-Trace-ID`` header.
+    """
+    trace_name = f"{request.method} {request.url.path}"
+    with METRICS.trace(trace_name, request.headers.get("X-Request-ID")) as trace:
+        response = await call_next(request)
+    if trace is not None:
+        response.headers["X-Trace-ID"] = trace.trace_id
+    return response
+
+
+async def get_app_resources(request: Request) -> AsyncResources:
+    return request.app.state.resources
+
+
+async def get_current_user_id(
+    request: Request,
+    authorization: Annotated[
+        HTTPAuthorizationCredentials, Depends(HTTPBearer(auto_error=True))
+    ],
+) -> int:
+    return request.app.state.token_signer.read(authorization.credentials)
+
+
+ResourcesDep = Annotated[AsyncResources, Depends(get_app_resources)]
+UserIdDep = Annotated[int, Depends(get_current_user_id)]
+
+
+@app.post("/users", status_code=status.HTTP_201_CREATED)
+async def register(credentials: CredentialsIn, resources: ResourcesDep) -> None:
+    uc = AsyncRegister(user_repo=resources.user_repo, hasher=resources.hasher)
+    await uc.execute(credentials.username, credentials.password)
+
+
+@app.post("/tokens")
+async def login(
+    credentials: CredentialsIn, request: Request, resources: ResourcesDep
+) -> TokenOut:
+    uc = AsyncLogin(user_repo=resources.user_repo, hasher=resources.hasher)
+    user_id = await uc.execute(credentials.username, credentials.password)
+    token = request.app.state.token_signer.issue(user_id)
+    return TokenOut(access_token=token, user_id=user_id)
+
+
+@app.get("/users/me", response_model=UserOut)
+async def get_user(user_id: UserIdDep, resources: ResourcesDep):
+    uc = AsyncGetUser(user_repo=resources.user_repo)
+    return await uc.execute(user_id)
+
+
+@app.patch("/users/me", status_code=status.HTTP_204_NO_CONTENT)
+async def edit_profile(
+    profile: ProfileIn, user_id: UserIdDep, resources: ResourcesDep
+) -> None:
+    uc = AsyncEditProfile(user_repo=resources.user_repo, hasher=resources.hasher)
+    await uc.execute(user_id, profile.new_username, profile.new_password)
+
+
+@app.post("/users/me/deposits", status_code=status.HTTP_204_NO_CONTENT)
+async def add_money(
+    deposit: DepositIn, user_id: UserIdDep, resources: ResourcesDep
+) -> None:
+    uc = AsyncAddMoney(user_repo=resources.user_repo)
+    await uc.execute(user_id, deposit.amount)
+
+
+@app.get("/users/me/flats", response_model=UserPropertyOut)
+async def get_user_property(user_id: UserIdDep, resources: ResourcesDep):
+    uc = AsyncGetUserProperty(user_repo=resources.user_repo)
+    return await uc.execute(user_id)
+
+
+@app.get("/flats", response_model=FlatPageOut)
+async def get_flat_page(
+    resources: ResourcesDep,
+    room_amount: int | None = None,
+    only_available: bool = False,
+    min_price: int | None = None,
+    max_price: int | None = None,
+    sort: str = "price",
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=0, le=MAX_PAGE_SIZE)] = 20,
+):
+    query = FlatQuery(
+        room_amount=room_amount,
+        only_available=only_available,
+        min_price=min_price,
+        max_price=max_price,
+        sort=sort,
+        offset=offset,
+        limit=limit,
+    )
+    uc = AsyncGetFlatPage(market_repo=resources.market_repo)
+    return await uc.execute(query)
+
+
+@app.get("/flats/facets", response_model=FlatFacetsOut)
+async def get_flat_facets(
+    resources: ResourcesDep,
+    room_amount: int | None = None,
+    only_available: bool = False,
+):
+    query = FlatQuery(room_amount=room_amount, only_available=only_available)
+    uc = AsyncGetFlatFacets(market_repo=resources.market_repo)
+    return await uc.execute(query)
+
+
+@app.get("/flats/{flat_id}", response_model=FlatOut)
+async def get_flat(flat_id: int, resources: ResourcesDep):
+    return await resources.market_repo.get_flat(flat_id)
+
+
+@app.post("/flats/{flat_id}/purchase", status_code=status.HTTP_204_NO_CONTENT)
+async def buy_flat(flat_id: int, user_id: UserIdDep, resources: ResourcesDep) -> None:
+    uc = AsyncBuyFlat(user_repo=resources.user_repo, market_repo=resources.market_repo)
+    await uc.execute(user_id, flat_id)
+
+
+@app.post("/flats/{flat_id}/sale", status_code=status.HTTP_204_NO_CONTENT)
+async def sell_flat(flat_id: int, user_id: UserIdDep, resources: ResourcesDep) -> None:
+    uc = AsyncSellFlat(user_repo=resources.user_repo, market_repo=resources.market_repo)
+    await uc.execute(user_id, flat_id)
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+
+def main() -> None:
+    """Runs the API server.  Run from the ``src`` directory::
+
+        python -m api.main --workers 4
+
+    The handlers await the asynchronous use cases, so one worker serves many
+    requests at once: the ``sqlite`` backend is queried through aiosqlite, the
+    ``local`` one and the password hashing run on ``API_THREADS`` threads.
+
+    Workers share sessions through the ``API_SECRET_KEY`` secret, required by
+    the application.  Only a single worker started here gets a random one.
+    Both backends keep several workers coherent: the ``local`` one through its
+    shared change counters and journal, which rely on POSIX file locks, SQLite
+    through its own locking.
+    """
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Runs the JSON API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    storage_backend = os.environ.get("STORAGE_BACKEND", "local")
+    if (
+        args.workers > 1
+        and storage_backend == "local"
+        and not SharedVersions.supported()
+    ):
+        parser.error(
+            "several workers of the local backend require POSIX file locks,"
+            " use STORAGE_BACKEND=sqlite"
+        )
+
+    if not os.environ.get(API_SECRET_KEY_VARIABLE):
+        if args.workers > 1:
+            parser.error(f"several workers require {API_SECRET_KEY_VARIABLE} to be set")
+        # Tokens of a single worker do not have to outlive it.
+        os.environ[API_SECRET_KEY_VARIABLE] = TokenSigner.generate_secret()
+
+    uvicorn.run(
+        "api.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+from pydantic import BaseModel, Field
+
+
+class CredentialsIn(BaseModel):
+    username: str
+    password: str
+
+
+class TokenOut(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    user_id: int
+
+
+class DepositIn(BaseModel):
+    amount: int = Field(gt=0)
+
+
+class ProfileIn(BaseModel):
+    """Profile changes.  Empty fields are left unchanged."""
+
+    new_username: str = ""
+    new_password: str = ""
+
+
+class UserOut(BaseModel):
+    id: int
+    username: str
+    balance: int
+
+
+class FlatOut(BaseModel):
+    id: int
+    address: str
+    number: int
+    floor: int
+    room_amount: int
+    price: int
+    is_available: bool
+
+
+class FlatPageOut(BaseModel):
+    flats: list[FlatOut]
+    total: int
+    offset: int
+    limit: int | None
+
+
+class FlatFacetsOut(BaseModel):
+    flat_amount: int
+    min_rooms: int
+    max_rooms: int
+    min_price: int
+    max_price: int
+
+
+class UserPropertyOut(BaseModel):
+    user_id: int
+    properties: list[FlatOut]
@@ -0,0 +1,75 @@
+import base64
+import hashlib
+import hmac
+import os
+import time
+
+API_SECRET_KEY_VARIABLE = "API_SECRET_KEY"
+TOKEN_TTL = 24 * 60 * 60
+
+
+class InvalidToken(Exception): ...
+
+
+class TokenSigner:
+    """Issues and reads stateless HMAC-SHA256 signed session tokens.
+
+    Tokens look like ``<user_id>.<expires_at>.<signature>``.  Nothing is stored
+    on the server, so any worker sharing the secret can read a token issued by
+    another one.
+    """
+
+    def __init__(self, secret: bytes, ttl: int = TOKEN_TTL) -> None:
+        self._secret = secret
+        self._ttl = ttl
+
+    @classmethod
+    def from_environment(cls) -> "TokenSigner":
+        """Creates the signer with the secret from ``API_SECRET_KEY``.
+
+        :raises RuntimeError: Raised when the variable is not set.
+        :return: Token signer.
+        :rtype: TokenSigner
+        """
+        secret = os.environ.get(API_SECRET_KEY_VARIABLE)
+        if not secret:
+            raise RuntimeError(f"{API_SECRET_KEY_VARIABLE} is not set")
+        return cls(secret.encode())
+
+    @staticmethod
+    def generate_secret() -> str:
+        """Generates a random secret, e.g. for ``API_SECRET_KEY``."""
+        return base64.urlsafe_b64encode(os.urandom(32)).decode()
+
+    def _sign(self, payload: str) -> str:
+        digest = hmac.new(self._secret, payload.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+    def issue(self, user_id: int) -> str:
+        """Issues a token of the user.
+
+        :param user_id: ID of the logged in user.
+        :type user_id: int
+        :return: Signed token.
+        :rtype: str
+        """
+        payload = f"{user_id}.{int(time.time()) + self._ttl}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def read(self, token: str) -> int:
+        """Checks the token and returns the ID of its user.
+
+        :param token: Token issued by :meth:`issue`.
+        :type token: str
+        :raises InvalidToken: Raised when the token is malformed, forged or expired.
+        :return: ID of the user.
+        :rtype: int
+        """
+        payload, _, signature = token.rpartition(".")
+        if not hmac.compare_digest(self._sign(payload), signature):
+            raise InvalidToken("Invalid token")
+
+        user_id, expires_at = payload.split(".")
+        if int(expires_at) < time.time():
+            raise InvalidToken("Token expired")
+        return int(user_id)
@@ -0,0 +1,181 @@
+from dataclasses import replace
+
+from domain.entities import Flat, FlatPage, User, UserProperty
+from domain.value_objects import FLAT_SORT_KEYS, Credentials, FlatFacets, FlatQuery
+
+from .exceptions import (
+    InvalidCredentials,
+    InvalidSortKey,
+    ItemAlreadySold,
+    UserNotFound,
+)
+from .ports import (
+    AsyncMarketDatabaseRepository,
+    AsyncPasswordHasher,
+    AsyncUserDatabaseRepository,
+)
+
+
+class AsyncRegister:
+    def __init__(
+        self, user_repo: AsyncUserDatabaseRepository, hasher: AsyncPasswordHasher
+    ) -> None:
+        self._user_repo = user_repo
+        self._hasher = hasher
+
+    async def execute(self, username: str, password: str) -> None:
+        credentials = Credentials.create(username, password)
+        credentials.check_username()
+        credentials.check_password()
+
+        password_hash = await self._hasher.hash(credentials.password)
+        await self._user_repo.register(credentials.username, password_hash)
+
+
+class AsyncLogin:
+    def __init__(
+        self, user_repo: AsyncUserDatabaseRepository, hasher: AsyncPasswordHasher
+    ) -> None:
+        self._user_repo = user_repo
+        self._hasher = hasher
+
+    async def execute(self, username: str, password: str) -> int:
+        credentials = Credentials.create(username, password)
+
+        try:
+            user_id, password_hash = await self._user_repo.get_credentials(
+                credentials.username
+            )
+        except UserNotFound:
+            raise InvalidCredentials("Invalid credentials")
+
+        if not await self._hasher.verify(credentials.password, password_hash):
+            raise InvalidCredentials("Invalid credentials")
+
+        if await self._hasher.needs_rehash(password_hash):
+            await self._user_repo.edit_profile(
+                user_id=user_id,
+                new_username=None,
+                new_password_hash=await self._hasher.hash(credentials.password),
+            )
+        return user_id
+
+
+class AsyncGetUser:
+    def __init__(self, user_repo: AsyncUserDatabaseRepository) -> None:
+        self._user_repo = user_repo
+
+    async def execute(self, user_id: int) -> User:
+        return await self._user_repo.get_user(user_id)
+
+
+class AsyncGetUserProperty:
+    def __init__(self, user_repo: AsyncUserDatabaseRepository) -> None:
+        self._user_repo = user_repo
+
+    async def execute(self, user_id: int) -> UserProperty:
+        return await self._user_repo.get_property(user_id)
+
+
+class AsyncAddMoney:
+    def __init__(self, user_repo: AsyncUserDatabaseRepository) -> None:
+        self._user_repo = user_repo
+
+    async def execute(self, user_id: int, amount: int) -> None:
+        user = await self._user_repo.get_user(user_id)
+        user.deposit(amount)
+        await self._user_repo.add_money(user_id=user_id, amount=amount)
+
+
+class AsyncEditProfile:
+    def __init__(
+        self, user_repo: AsyncUserDatabaseRepository, hasher: AsyncPasswordHasher
+    ) -> None:
+        self._user_repo = user_repo
+        self._hasher = hasher
+
+    async def execute(self, user_id: int, new_username: str, new_password: str) -> None:
+        user = await self._user_repo.get_user(user_id)
+        credentials = Credentials.create(new_username, new_password)
+
+        new_password_hash = None
+        if new_username:
+            credentials.check_username()
+            user.change_username(credentials.username)
+        if new_password:
+            credentials.check_password()
+            new_password_hash = await self._hasher.hash(credentials.password)
+
+        await self._user_repo.edit_profile(
+            user_id=user_id,
+            new_username=credentials.username or None,
+            new_password_hash=new_password_hash,
+        )
+
+
+class AsyncGetFlatList:
+    def __init__(self, market_repo: AsyncMarketDatabaseRepository) -> None:
+        self._market_repo = market_repo
+
+    async def execute(self) -> list[Flat]:
+        return await self._market_repo.get_flat_list()
+
+
+class AsyncGetFlatPage:
+    def __init__(self, market_repo: AsyncMarketDatabaseRepository) -> None:
+        self._market_repo = market_repo
+
+    async def execute(self, query: FlatQuery) -> FlatPage:
+        if query.sort not in FLAT_SORT_KEYS:
+            raise InvalidSortKey(f"Unknown sort key: {query.sort}")
+
+        limit = max(query.limit, 0) if query.limit is not None else None
+        query = replace(query, offset=max(query.offset, 0), limit=limit)
+        return await self._market_repo.find_flats(query)
+
+
+class AsyncGetFlatFacets:
+    def __init__(self, market_repo: AsyncMarketDatabaseRepository) -> None:
+        self._market_repo = market_repo
+
+    async def execute(self, query: FlatQuery = FlatQuery()) -> FlatFacets:
+        return await self._market_repo.get_flat_facets(query)
+
+
+class AsyncBuyFlat:
+    def __init__(
+        self,
+        user_repo: AsyncUserDatabaseRepository,
+        market_repo: AsyncMarketDatabaseRepository,
+    ) -> None:
+        self._user_repo = user_repo
+        self._market_repo = market_repo
+
+    async def execute(self, user_id: int, flat_id: int) -> None:
+        user = await self._user_repo.get_user(user_id)
+        flat = await self._market_repo.get_flat(flat_id)
+
+        if not flat.is_available:
+            raise ItemAlreadySold(f"Flat is already sold. ID: {flat_id}")
+
+        user.charge(flat.price)
+        flat.sell()
+        await self._market_repo.purchase_flat(user_id=user_id, flat_id=flat_id)
+
+
+class AsyncSellFlat:
+    def __init__(
+        self,
+        user_repo: AsyncUserDatabaseRepository,
+        market_repo: AsyncMarketDatabaseRepository,
+    ) -> None:
+        self._user_repo = user_repo
+        self._market_repo = market_repo
+
+    async def execute(self, user_id: int, flat_id: int) -> None:
+        user = await self._user_repo.get_user(user_id)
+        flat = await self._market_repo.get_flat(flat_id)
+
+        user.deposit(flat.price)
+        flat.free()
+        await self._market_repo.sell_flat(user_id=user_id, flat_id=flat_id)
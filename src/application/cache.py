@@ -0,0 +1,171 @@
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from functools import wraps
+
+from .metrics import METRICS
+
+
+class UseCaseCache:
+    """Read-through cache of use case results with TTL and LRU eviction.
+
+    Entries are keyed by ``(namespace, id)`` pairs, e.g. ``("user", 1)``, so
+    that write use cases can drop exactly the entries they make stale, or
+    a whole namespace when a bulk write makes any of its entries stale.
+    Cached results are shared and must not be modified by callers.
+
+    A load is tagged with a new generation of its key, and the loaded value
+    is only stored if the key was not invalidated in the meantime, so that a
+    value read before a concurrent write does not outlive the write.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 60.0) -> None:
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, object]] = OrderedDict()
+        # Generations of the keys being loaded.
+        self._loading: dict[Hashable, int] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], object]) -> object:
+        """Returns the cached value or loads and caches it.
+
+        :param key: Cache key.
+        :type key: Hashable
+        :param loader: Callable producing the value on a cache miss.
+        :type loader: Callable[[], object]
+        :return: Cached or loaded value.
+        :rtype: object
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                METRICS.increment(
+                    "cache_requests_total", cache="use_case", result="hit"
+                )
+                return entry[1]
+            self.misses += 1
+            self._generation += 1
+            generation = self._generation
+            self._loading[key] = generation
+        METRICS.increment("cache_requests_total", cache="use_case", result="miss")
+
+        try:
+            value = loader()
+        except BaseException:
+            with self._lock:
+                if self._loading.get(key) == generation:
+                    del self._loading[key]
+            raise
+
+        with self._lock:
+            if self._loading.get(key) != generation:
+                return value
+            del self._loading[key]
+            self._entries[key] = (now + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, *keys: Hashable) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._loading.pop(key, None)
+
+    def invalidate_namespaces(self, *namespaces: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in namespaces]:
+                del self._entries[key]
+            for key in [key for key in self._loading if key[0] in namespaces]:
+                del self._loading[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._loading.clear()
+
+
+def _argument(signature: inspect.Signature, name: str, args, kwargs) -> Hashable:
+    return signature.bind(None, *args, **kwargs).arguments[name]
+
+
+def cached(namespace: str, argument: str | None = None) -> Callable:
+    """Caches results of the decorated ``execute`` in the use case cache.
+
+    The use case must keep its cache (or None to disable caching) in the
+    ``_cache`` attribute.
+
+    :param namespace: Namespace of the cached results, e.g. ``"user"``.
+    :type namespace: str
+    :param argument: Name of the ``execute`` argument identifying the result,
+        or None if the namespace holds a single result.
+    :type argument: str | None
+    """
+
+    def decorator(execute: Callable) -> Callable:
+        signature = inspect.signature(execute)
+
+        @wraps(execute)
+        def wrapper(self, *args, **kwargs):
+            if self._cache is None:
+                return execute(self, *args, **kwargs)
+
+            key = (
+                namespace,
+                argument and _argument(signature, argument, args, kwargs),
+            )
+            return self._cache.get_or_load(key, lambda: execute(self, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+def invalidates(*entries: tuple[str, str | None]) -> Callable:
+    """Drops the cached results made stale by the decorated ``execute``.
+
+    Entries are dropped after the write, whether it succeeded or not.
+
+    :param entries: Pairs of the namespace and the name of the ``execute``
+        argument identifying the stale result, e.g. ``("user", "user_id")``.
+        The whole namespace is dropped if the name is None.
+    :type entries: tuple[str, str | None]
+    """
+
+    def decorator(execute: Callable) -> Callable:
+        signature = inspect.signature(execute)
+
+        @wraps(execute)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return execute(self, *args, **kwargs)
+            finally:
+                if self._cache is not None:
+                    self._cache.invalidate(
+                        *(
+                            (namespace, _argument(signature, argument, args, kwargs))
+                            for namespace, argument in entries
+                            if argument is not None
+                        )
+                    )
+                    self._cache.invalidate_namespaces(
+                        *(
+                            namespace
+                            for namespace, argument in entries
+                            if argument is None
+                        )
+                    )
+
+        return wrapper
+
+    return decorator
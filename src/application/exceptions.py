@@ -15,5 +15,16 @@ class ItemAlreadySold(Exception):
 class FlatNotFound(Exception): ...
 
 
+class FlatAlreadyExists(Exception):
+    """Raises if imported flat has the ID of an existing one."""
+
+
+class InvalidSortKey(Exception): ...
+
+
 class NotAnOwnerError(Exception):
     """Raises if user that is not an owner of the property trying to sell one."""
+
+
+class TransactionConflict(Exception):
+    """Raises if the data a transaction relies on was changed before it committed."""
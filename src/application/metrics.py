@@ -0,0 +1,298 @@
+import bisect
+import inspect
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+
+METRICS_ENABLED_VARIABLE = "METRICS_ENABLED"
+METRIC_PREFIX = "app_"
+LATENCY_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+RECENT_TRACES = 50
+
+_NULL_CONTEXT = nullcontext()
+
+Labels = tuple[tuple[str, str], ...]
+
+
+@dataclass
+class Histogram:
+    bucket_counts: list[int] = field(
+        default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1)
+    )
+    total: float = 0.0
+    count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, share: float) -> float:
+        """Estimates the quantile as the upper bound of its bucket."""
+        rank = share * self.count
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS, self.bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+
+@dataclass
+class Span:
+    name: str
+    depth: int
+    offset: float
+    duration: float
+    failed: bool
+
+
+@dataclass
+class Trace:
+    """Timed calls made while serving one request or one script rerun."""
+
+    trace_id: str
+    name: str
+    started_at: float
+    spans: list[Span] = field(default_factory=list)
+    duration: float = 0.0
+    depth: int = 0
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+
+
+def current_trace_id() -> str | None:
+    """Returns the ID of the trace of the current request, if any."""
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+class _SpanContext:
+    __slots__ = ("_metrics", "_name", "_trace", "_started")
+
+    def __init__(self, metrics: "Metrics", name: str) -> None:
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self) -> None:
+        self._trace = _current_trace.get()
+        if self._trace is not None:
+            self._trace.depth += 1
+        self._started = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        finished = time.perf_counter()
+        duration = finished - self._started
+        self._metrics.observe("call_duration_seconds", duration, operation=self._name)
+        if exc_type is not None:
+            self._metrics.increment("call_errors_total", operation=self._name)
+
+        trace = self._trace
+        if trace is not None:
+            trace.depth -= 1
+            trace.spans.append(
+                Span(
+                    name=self._name,
+                    depth=trace.depth,
+                    offset=self._started - trace._started,
+                    duration=duration,
+                    failed=exc_type is not None,
+                )
+            )
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    items = [f'{name}="{_escape(value)}"' for name, value in labels]
+    if extra:
+        items.append(extra)
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+class Metrics:
+    """Process-wide registry of counters, latency histograms and recent traces.
+
+    Recording is skipped entirely while the registry is disabled, so the
+    instrumented code only pays for one attribute check.  It is enabled by
+    the ``METRICS_ENABLED`` environment variable or at runtime.
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._histograms: dict[tuple[str, Labels], Histogram] = {}
+        self._traces: deque[Trace] = deque(maxlen=RECENT_TRACES)
+
+    def increment(self, name: str, amount: float = 1, **labels: str) -> None:
+        """Adds the amount to the counter with the passed labels."""
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Records the value in the histogram with the passed labels."""
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def span(self, name: str):
+        """Times the block as a call of the named operation.
+
+        The call is also added to the trace of the current request.
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _SpanContext(self, name)
+
+    @contextmanager
+    def _trace(self, name: str, trace_id: str | None) -> Iterator[Trace]:
+        trace = Trace(
+            trace_id=trace_id or uuid.uuid4().hex[:16],
+            name=name,
+            started_at=time.time(),
+        )
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+            trace.duration = time.perf_counter() - trace._started
+            trace.spans.sort(key=lambda span: span.offset)
+            with self._lock:
+                self._traces.append(trace)
+
+    def trace(self, name: str, trace_id: str | None = None):
+        """Collects the calls made in the block into a new trace.
+
+        :param name: Name of the traced request, e.g. a page or a route.
+        :type name: str
+        :param trace_id: ID of the trace, e.g. passed by the client.  A random
+            one is used when not passed.
+        :type trace_id: str | None
+        :return: Context manager yielding the trace, or None while disabled.
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._trace(name, trace_id)
+
+    def counters(self) -> dict[tuple[str, Labels], float]:
+        with self._lock:
+            return dict(self._counters)
+
+    def histograms(self) -> dict[tuple[str, Labels], Histogram]:
+        with self._lock:
+            return {
+                key: Histogram(list(value.bucket_counts), value.total, value.count)
+                for key, value in self._histograms.items()
+            }
+
+    def traces(self) -> list[Trace]:
+        """Returns the recent traces, newest first."""
+        with self._lock:
+            return list(reversed(self._traces))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._traces.clear()
+
+    def render(self) -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = []
+        counters = sorted(self.counters().items())
+        for position, ((name, labels), value) in enumerate(counters):
+            if position == 0 or counters[position - 1][0][0] != name:
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} counter")
+            lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels)} {value:g}")
+
+        histograms = sorted(self.histograms().items(), key=lambda item: item[0])
+        for position, ((name, labels), histogram) in enumerate(histograms):
+            metric = f"{METRIC_PREFIX}{name}"
+            if position == 0 or histograms[position - 1][0][0] != name:
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            bounds = [f"{bound:g}" for bound in LATENCY_BUCKETS] + ["+Inf"]
+            for bound, bucket_count in zip(bounds, histogram.bucket_counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(labels, f'le="{bound}"')
+                lines.append(f"{metric}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.total:g}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics(
+    enabled=os.environ.get(METRICS_ENABLED_VARIABLE, "").lower() in ("1", "true")
+)
+
+
+def timed(name: str) -> Callable:
+    """Records every call of the decorated function as the named operation."""
+
+    def decorator(function: Callable) -> Callable:
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+            with METRICS.span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instrumented(cls: type) -> type:
+    """Times every public method defined by the decorated class.
+
+    Operations are named ``ClassName.method``.  Generator methods are left
+    as they are, since their work happens after the call returns.
+    """
+    for attribute, value in list(vars(cls).items()):
+        if (
+            attribute.startswith("_")
+            or not inspect.isfunction(value)
+            or inspect.isgeneratorfunction(value)
+        ):
+            continue
+        setattr(cls, attribute, timed(f"{cls.__name__}.{attribute}")(value))
+    return cls
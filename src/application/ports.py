@@ -1,19 +1,27 @@
 from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator, Mapping, Sequence
 
-from domain.entities import Flat, User, UserProperty
+from domain.entities import Flat, FlatPage, User, UserProperty
+from domain.value_objects import FlatFacets, FlatQuery, MarketStats
 
 
 class PasswordHasher(ABC):
     @abstractmethod
     def hash(self, password: str) -> str: ...
 
+    @abstractmethod
+    def verify(self, password: str, password_hash: str) -> bool: ...
+
+    @abstractmethod
+    def needs_rehash(self, password_hash: str) -> bool: ...
+
 
 class UserDatabaseRepository(ABC):
     @abstractmethod
     def register(self, username: str, password_hash: str) -> None: ...
 
     @abstractmethod
-    def login(self, username: str, password_hash: str) -> int: ...
+    def get_credentials(self, username: str) -> tuple[int, str]: ...
 
     @abstractmethod
     def get_user(self, user_id: int) -> User: ...
@@ -29,11 +37,34 @@ class UserDatabaseRepository(ABC):
     @abstractmethod
     def get_property(self, user_id: int) -> UserProperty: ...
 
+    @abstractmethod
+    def deposit_many(self, amounts: Mapping[int, int]) -> None:
+        """Adds the amounts to the balances of the users in one write."""
+
+    @abstractmethod
+    def iter_users(self, chunk_size: int = 1000) -> Iterator[User]:
+        """Iterates over all the users by ID, reading them in chunks."""
+
+    @abstractmethod
+    def iter_ownership(self, chunk_size: int = 1000) -> Iterator[tuple[int, int]]:
+        """Iterates over ``(user_id, flat_id)`` pairs by flat ID, in chunks."""
+
 
 class MarketDatabaseRepository(ABC):
     @abstractmethod
     def get_flat_list(self) -> list[Flat]: ...
 
+    @abstractmethod
+    def find_flats(self, query: FlatQuery) -> FlatPage: ...
+
+    @abstractmethod
+    def get_flat_facets(self, query: FlatQuery) -> FlatFacets: ...
+
+    @abstractmethod
+    def get_market_stats(
+        self, query: FlatQuery, price_bins: int = 20
+    ) -> MarketStats: ...
+
     @abstractmethod
     def get_flat(self, flat_id: int) -> Flat: ...
 
@@ -42,3 +73,72 @@ class MarketDatabaseRepository(ABC):
 
     @abstractmethod
     def sell_flat(self, user_id: int, flat_id: int) -> None: ...
+
+    @abstractmethod
+    def import_flats(self, flats: Sequence[Flat]) -> None:
+        """Adds the flats in one write.
+
+        :raises FlatAlreadyExists: Raised when one of the IDs is already taken
+            or repeated, so that existing and sold flats are never replaced.
+        """
+
+    @abstractmethod
+    def update_prices(self, prices: Mapping[int, int]) -> None:
+        """Sets the prices of the flats by their IDs in one write."""
+
+    @abstractmethod
+    def iter_flats(self, chunk_size: int = 1000) -> Iterator[Flat]:
+        """Iterates over all the flats by ID, reading them in chunks."""
+
+
+class AsyncPasswordHasher(ABC):
+    @abstractmethod
+    async def hash(self, password: str) -> str: ...
+
+    @abstractmethod
+    async def verify(self, password: str, password_hash: str) -> bool: ...
+
+    @abstractmethod
+    async def needs_rehash(self, password_hash: str) -> bool: ...
+
+
+class AsyncUserDatabaseRepository(ABC):
+    @abstractmethod
+    async def register(self, username: str, password_hash: str) -> None: ...
+
+    @abstractmethod
+    async def get_credentials(self, username: str) -> tuple[int, str]: ...
+
+    @abstractmethod
+    async def get_user(self, user_id: int) -> User: ...
+
+    @abstractmethod
+    async def add_money(self, user_id: int, amount: int) -> None: ...
+
+    @abstractmethod
+    async def edit_profile(
+        self, user_id: int, new_username, new_password_hash: str
+    ) -> None: ...
+
+    @abstractmethod
+    async def get_property(self, user_id: int) -> UserProperty: ...
+
+
+class AsyncMarketDatabaseRepository(ABC):
+    @abstractmethod
+    async def get_flat_list(self) -> list[Flat]: ...
+
+    @abstractmethod
+    async def find_flats(self, query: FlatQuery) -> FlatPage: ...
+
+    @abstractmethod
+    async def get_flat_facets(self, query: FlatQuery) -> FlatFacets: ...
+
+    @abstractmethod
+    async def get_flat(self, flat_id: int) -> Flat: ...
+
+    @abstractmethod
+    async def purchase_flat(self, user_id: int, flat_id: int) -> None: ...
+
+    @abstractmethod
+    async def sell_flat(self, user_id: int, flat_id: int) -> None: ...
@@ -1,10 +1,54 @@
-from domain.entities import Flat, User, UserProperty
-from domain.value_objects import Credentials
-
-from .exceptions import ItemAlreadySold
+from collections.abc import Iterable, Iterator, Mapping
+from dataclasses import replace
+from itertools import islice
+
+from domain.entities import Flat, FlatPage, User, UserProperty
+from domain.exceptions import InvalidAmount
+from domain.value_objects import (
+    FLAT_SORT_KEYS,
+    Credentials,
+    FlatFacets,
+    FlatQuery,
+    MarketStats,
+)
+
+from .cache import UseCaseCache, cached, invalidates
+from .exceptions import (
+    InvalidCredentials,
+    InvalidSortKey,
+    ItemAlreadySold,
+    UserNotFound,
+)
+from .metrics import instrumented
 from .ports import MarketDatabaseRepository, PasswordHasher, UserDatabaseRepository
 
+BULK_CHUNK_SIZE = 10_000
+
+
+def _chunks(items: Iterable, size: int = BULK_CHUNK_SIZE) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _pairs(
+    items: Mapping[int, int] | Iterable[tuple[int, int]],
+) -> Iterable[tuple[int, int]]:
+    return items.items() if isinstance(items, Mapping) else items
+
+
+def check_amount(amount: int) -> None:
+    """Checks that the amount of money, e.g. a deposit or a price, is positive.
 
+    :param amount: Amount to be checked.
+    :type amount: int
+    :raises InvalidAmount: Raised when the amount is not positive.
+    """
+    if amount < 1:
+        raise InvalidAmount(f"Amount must be positive: {amount}")
+
+
+@instrumented
 class Register:
     def __init__(
         self, user_repo: UserDatabaseRepository, hasher: PasswordHasher
@@ -21,6 +65,7 @@ class Register:
         self._user_repo.register(credentials.username, password_hash)
 
 
+@instrumented
 class Login:
     def __init__(
         self, user_repo: UserDatabaseRepository, hasher: PasswordHasher
@@ -31,76 +76,158 @@ class Login:
     def execute(self, username: str, password: str) -> int:
         credentials = Credentials.create(username, password)
 
-        password_hash = self._hasher.hash(credentials.password)
-        return self._user_repo.login(credentials.username, password_hash)
+        try:
+            user_id, password_hash = self._user_repo.get_credentials(
+                credentials.username
+            )
+        except UserNotFound:
+            raise InvalidCredentials("Invalid credentials")
 
+        if not self._hasher.verify(credentials.password, password_hash):
+            raise InvalidCredentials("Invalid credentials")
 
+        if self._hasher.needs_rehash(password_hash):
+            self._user_repo.edit_profile(
+                user_id=user_id,
+                new_username=None,
+                new_password_hash=self._hasher.hash(credentials.password),
+            )
+        return user_id
+
+
+@instrumented
 class GetUser:
-    def __init__(self, user_repo: UserDatabaseRepository) -> None:
+    def __init__(
+        self, user_repo: UserDatabaseRepository, cache: UseCaseCache | None = None
+    ) -> None:
         self._user_repo = user_repo
+        self._cache = cache
 
+    @cached("user", "user_id")
     def execute(self, user_id: int) -> User:
         return self._user_repo.get_user(user_id)
 
 
+@instrumented
 class GetUserProperty:
-    def __init__(self, user_repo: UserDatabaseRepository) -> None:
+    def __init__(
+        self, user_repo: UserDatabaseRepository, cache: UseCaseCache | None = None
+    ) -> None:
         self._user_repo = user_repo
+        self._cache = cache
 
+    @cached("property", "user_id")
     def execute(self, user_id: int) -> UserProperty:
         return self._user_repo.get_property(user_id)
 
 
+@instrumented
 class AddMoney:
-    def __init__(self, user_repo: UserDatabaseRepository) -> None:
+    def __init__(
+        self, user_repo: UserDatabaseRepository, cache: UseCaseCache | None = None
+    ) -> None:
         self._user_repo = user_repo
+        self._cache = cache
 
+    @invalidates(("user", "user_id"))
     def execute(self, user_id: int, amount: int) -> None:
         user = self._user_repo.get_user(user_id)
         user.deposit(amount)
         self._user_repo.add_money(user_id=user_id, amount=amount)
 
 
+@instrumented
 class EditProfile:
     def __init__(
-        self, user_repo: UserDatabaseRepository, hasher: PasswordHasher
+        self,
+        user_repo: UserDatabaseRepository,
+        hasher: PasswordHasher,
+        cache: UseCaseCache | None = None,
     ) -> None:
         self._user_repo = user_repo
         self._hasher = hasher
+        self._cache = cache
 
+    @invalidates(("user", "user_id"))
     def execute(self, user_id: int, new_username: str, new_password: str) -> None:
         user = self._user_repo.get_user(user_id)
         credentials = Credentials.create(new_username, new_password)
 
+        new_password_hash = None
         if new_username:
             credentials.check_username()
+            user.change_username(credentials.username)
         if new_password:
             credentials.check_password()
+            new_password_hash = self._hasher.hash(credentials.password)
 
-        user.change_username(credentials.username)
-        new_password_hash = self._hasher.hash(credentials.password)
         self._user_repo.edit_profile(
             user_id=user_id,
-            new_username=credentials.username,
+            new_username=credentials.username or None,
             new_password_hash=new_password_hash,
         )
 
 
+@instrumented
 class GetFlatList:
-    def __init__(self, market_repo: MarketDatabaseRepository) -> None:
+    def __init__(
+        self, market_repo: MarketDatabaseRepository, cache: UseCaseCache | None = None
+    ) -> None:
         self._market_repo = market_repo
+        self._cache = cache
 
+    @cached("flat_list")
     def execute(self) -> list[Flat]:
         return self._market_repo.get_flat_list()
 
 
+@instrumented
+class GetFlatPage:
+    def __init__(self, market_repo: MarketDatabaseRepository) -> None:
+        self._market_repo = market_repo
+
+    def execute(self, query: FlatQuery) -> FlatPage:
+        if query.sort not in FLAT_SORT_KEYS:
+            raise InvalidSortKey(f"Unknown sort key: {query.sort}")
+
+        limit = max(query.limit, 0) if query.limit is not None else None
+        query = replace(query, offset=max(query.offset, 0), limit=limit)
+        return self._market_repo.find_flats(query)
+
+
+@instrumented
+class GetFlatFacets:
+    def __init__(self, market_repo: MarketDatabaseRepository) -> None:
+        self._market_repo = market_repo
+
+    def execute(self, query: FlatQuery = FlatQuery()) -> FlatFacets:
+        return self._market_repo.get_flat_facets(query)
+
+
+@instrumented
+class GetMarketStats:
+    def __init__(self, market_repo: MarketDatabaseRepository) -> None:
+        self._market_repo = market_repo
+
+    def execute(
+        self, query: FlatQuery = FlatQuery(), price_bins: int = 20
+    ) -> MarketStats:
+        return self._market_repo.get_market_stats(query, max(price_bins, 1))
+
+
+@instrumented
 class BuyFlat:
     def __init__(
-        self, user_repo: UserDatabaseRepository, market_repo: MarketDatabaseRepository
+        self,
+        user_repo: UserDatabaseRepository,
+        market_repo: MarketDatabaseRepository,
+        cache: UseCaseCache | None = None,
     ) -> None:
         self._user_repo = user_repo
         self._market_repo = market_repo
+        self._cache = cache
 
+    @invalidates(("user", "user_id"), ("property", "user_id"), ("flat_list", None))
     def execute(self, user_id: int, flat_id: int) -> None:
         user = self._user_repo.get_user(user_id)
         flat = self._market_repo.get_flat(flat_id)
@@ -113,13 +240,19 @@ class BuyFlat:
         self._market_repo.purchase_flat(user_id=user_id, flat_id=flat_id)
 
 
+@instrumented
 class SellFlat:
     def __init__(
-        self, user_repo: UserDatabaseRepository, market_repo: MarketDatabaseRepository
+        self,
+        user_repo: UserDatabaseRepository,
+        market_repo: MarketDatabaseRepository,
+        cache: UseCaseCache | None = None,
     ) -> None:
         self._user_repo = user_repo
         self._market_repo = market_repo
+        self._cache = cache
 
+    @invalidates(("user", "user_id"), ("property", "user_id"), ("flat_list", None))
     def execute(self, user_id: int, flat_id: int) -> None:
         user = self._user_repo.get_user(user_id)
         flat = self._market_repo.get_flat(flat_id)
@@ -127,3 +260,102 @@ class SellFlat:
         user.deposit(flat.price)
         flat.free()
         self._market_repo.sell_flat(user_id=user_id, flat_id=flat_id)
+
+
+@instrumented
+class ImportFlats:
+    def __init__(
+        self, market_repo: MarketDatabaseRepository, cache: UseCaseCache | None = None
+    ) -> None:
+        self._market_repo = market_repo
+        self._cache = cache
+
+    @invalidates(("property", None), ("flat_list", None))
+    def execute(self, flats: Iterable[Flat]) -> int:
+        """Imports the flats in chunks, each checked and written at once.
+
+        The input is consumed lazily, so it can be streamed from a file.  A
+        chunk with an invalid flat is rejected as a whole, the chunks before
+        it stay imported.
+
+        :param flats: Flats to be added.
+        :type flats: Iterable[Flat]
+        :raises InvalidFlat: Raised when one of the flats is invalid.
+        :raises FlatAlreadyExists: Raised when one of the IDs is already taken.
+        :return: Amount of the imported flats.
+        :rtype: int
+        """
+        imported = 0
+        for chunk in _chunks(flats):
+            for flat in chunk:
+                flat.check()
+            self._market_repo.import_flats(chunk)
+            imported += len(chunk)
+        return imported
+
+
+@instrumented
+class UpdatePrices:
+    def __init__(
+        self, market_repo: MarketDatabaseRepository, cache: UseCaseCache | None = None
+    ) -> None:
+        self._market_repo = market_repo
+        self._cache = cache
+
+    @invalidates(("property", None), ("flat_list", None))
+    def execute(self, prices: Mapping[int, int] | Iterable[tuple[int, int]]) -> int:
+        """Sets the flat prices in chunks, each checked and written at once.
+
+        :param prices: New prices by flat ID, or a stream of such pairs.
+        :type prices: Mapping[int, int] | Iterable[tuple[int, int]]
+        :raises InvalidAmount: Raised when one of the prices is not positive.
+        :raises FlatNotFound: Raised when one of the flats does not exist.
+        :return: Amount of the updated prices.
+        :rtype: int
+        """
+        updated = 0
+        for chunk in _chunks(_pairs(prices)):
+            chunk_prices = {}
+            for flat_id, price in chunk:
+                check_amount(price)
+                chunk_prices[flat_id] = price
+            self._market_repo.update_prices(chunk_prices)
+            updated += len(chunk_prices)
+        return updated
+
+
+@instrumented
+class DepositMany:
+    def __init__(
+        self, user_repo: UserDatabaseRepository, cache: UseCaseCache | None = None
+    ) -> None:
+        self._user_repo = user_repo
+        self._cache = cache
+
+    def execute(self, amounts: Mapping[int, int] | Iterable[tuple[int, int]]) -> int:
+        """Tops the balances up in chunks, each checked and written at once.
+
+        Amounts of a user repeated within a stream are summed.
+
+        :param amounts: Amounts by user ID, or a stream of such pairs.
+        :type amounts: Mapping[int, int] | Iterable[tuple[int, int]]
+        :raises InvalidAmount: Raised when one of the amounts is not positive.
+        :raises UserNotFound: Raised when one of the users does not exist.
+        :return: Amount of the processed deposits.
+        :rtype: int
+        """
+        deposited = 0
+        for chunk in _chunks(_pairs(amounts)):
+            chunk_amounts = {}
+            for user_id, amount in chunk:
+                check_amount(amount)
+                chunk_amounts[user_id] = chunk_amounts.get(user_id, 0) + amount
+            try:
+                self._user_repo.deposit_many(chunk_amounts)
+            finally:
+                if self._cache is not None:
+                    self._cache.invalidate(
+                        *(("user", user_id) for user_id in chunk_amounts)
+                    )
+            deposited += len(chunk)
+        return deposited
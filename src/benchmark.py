@@ -0,0 +1,605 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from itertools import count
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+BACKENDS = ("local", "sqlite")
+BENCHMARK_PASSWORD = "Benchmark-123"
+ADDRESSES = (
+    "Тверская",
+    "Арбат",
+    "Ленинградский проспект",
+    "Мясницкая",
+    "Профсоюзная",
+    "Кутузовский проспект",
+    "Новый Арбат",
+    "Пятницкая",
+)
+DEFAULT_ITERATIONS = 200
+WARM_UP_ITERATIONS = 3
+REGRESSION_THRESHOLD = 0.2
+IMPORT_SCENARIOS = {
+    "main": "import main",
+    "login": (
+        "import main\n"
+        "import ui.pages.auth\n"
+        "from infrastructure.resources import get_resources\n"
+        "get_resources()"
+    ),
+    "api": "import api.main",
+}
+
+
+def generate_dataset(
+    directory: str, scale: int, owned_share: float = 0.1, seed: int = 0
+) -> None:
+    """Writes synthetic ``users.csv``, ``flats.csv`` and ``owners.csv`` tables.
+
+    Every user has the password :data:`BENCHMARK_PASSWORD`.  It is hashed
+    once, so generating millions of users takes seconds.
+
+    :param directory: Directory to write the tables to.
+    :type directory: str
+    :param scale: Amount of flats.  There are ten times less users.
+    :type scale: int
+    :param owned_share: Share of the flats owned by random users.
+    :type owned_share: float
+    :param seed: Seed of the random generator.
+    :type seed: int
+    """
+    from infrastructure.security import ScryptHasher
+
+    rng = random.Random(seed)
+    user_amount = max(scale // 10, 1)
+    password_hash = ScryptHasher().hash(BENCHMARK_PASSWORD)
+    os.makedirs(directory, exist_ok=True)
+
+    with open(
+        os.path.join(directory, "users.csv"), "w", encoding="UTF-8", newline=""
+    ) as file:
+        writer = csv.writer(file)
+        writer.writerow(("id", "username", "password_hash", "balance"))
+        writer.writerows(
+            (user_id, f"user{user_id}", password_hash, 10**12)
+            for user_id in range(1, user_amount + 1)
+        )
+
+    with open(
+        os.path.join(directory, "flats.csv"), "w", encoding="UTF-8", newline=""
+    ) as file:
+        writer = csv.writer(file)
+        writer.writerow(("id", "number", "floor", "room_amount", "price", "address"))
+        for flat_id in range(1, scale + 1):
+            room_amount = rng.randint(1, 5)
+            writer.writerow(
+                (
+                    flat_id,
+                    rng.randint(1, 300),
+                    rng.randint(1, 30),
+                    room_amount,
+                    rng.randint(3, 25) * room_amount * 10**6 + rng.randint(0, 10**6),
+                    f"{rng.choice(ADDRESSES)}, {rng.randint(1, 150)}",
+                )
+            )
+
+    with open(
+        os.path.join(directory, "owners.csv"), "w", encoding="UTF-8", newline=""
+    ) as file:
+        writer = csv.writer(file)
+        writer.writerow(("user_id", "flat_id"))
+        writer.writerows(
+            (rng.randint(1, user_amount), flat_id)
+            for flat_id in range(1, int(scale * owned_share) + 1)
+        )
+
+
+@dataclass
+class OperationStats:
+    iterations: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    throughput_per_s: float
+    peak_allocated_kb: float
+
+
+def _percentile(sorted_values: list[float], share: float) -> float:
+    position = min(int(share * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[position]
+
+
+def measure(operation: Callable[[], object], iterations: int) -> OperationStats:
+    """Times the operation and measures the memory allocated by one call.
+
+    :param operation: Operation to be measured.
+    :type operation: Callable[[], object]
+    :param iterations: Amount of timed calls, made after a few warm-up calls.
+    :type iterations: int
+    :return: Latency percentiles, throughput and peak allocation.
+    :rtype: OperationStats
+    """
+    for _ in range(WARM_UP_ITERATIONS):
+        operation()
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        operation()
+        latencies.append((time.perf_counter() - call_started) * 1000)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    operation()
+    _, peak_allocated = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return OperationStats(
+        iterations=iterations,
+        p50_ms=round(_percentile(latencies, 0.50), 4),
+        p95_ms=round(_percentile(latencies, 0.95), 4),
+        p99_ms=round(_percentile(latencies, 0.99), 4),
+        mean_ms=round(sum(latencies) / iterations, 4),
+        throughput_per_s=round(iterations / elapsed, 2),
+        peak_allocated_kb=round(peak_allocated / 1024, 1),
+    )
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return round(peak_rss / 1024**2, 1)
+    return round(peak_rss / 1024, 1)
+
+
+def _operations(resources, scale: int, seed: int) -> dict[str, tuple[Callable, int]]:
+    """Builds the measured operations and their iteration divisors.
+
+    Purchases buy flats that are free in the generated data and sales sell
+    the flats bought, so the data stays the same between runs.
+    """
+    from application.use_cases import (
+        BuyFlat,
+        GetFlatFacets,
+        GetFlatList,
+        GetFlatPage,
+        GetMarketStats,
+        GetUser,
+        GetUserProperty,
+        Login,
+        Register,
+        SellFlat,
+    )
+    from domain.value_objects import FlatQuery
+
+    user_repo, market_repo, hasher = (
+        resources.user_repo,
+        resources.market_repo,
+        resources.hasher,
+    )
+    rng = random.Random(seed)
+    user_amount = max(scale // 10, 1)
+    free_flat_ids = count(scale // 10 + 1)
+    bought = []
+
+    def random_user_id() -> int:
+        return rng.randint(1, user_amount)
+
+    def random_flat_id() -> int:
+        return rng.randint(1, scale)
+
+    def random_query() -> FlatQuery:
+        return FlatQuery(
+            room_amount=rng.choice((None, 1, 2, 3)),
+            only_available=rng.random() < 0.5,
+            sort=rng.choice(("price", "-price", "room_amount")),
+            limit=10,
+            offset=rng.choice((0, 10, 100)),
+        )
+
+    def buy(buy_flat: Callable[[int, int], None]) -> Callable[[], None]:
+        def operation() -> None:
+            user_id, flat_id = random_user_id(), next(free_flat_ids)
+            buy_flat(user_id, flat_id)
+            bought.append((user_id, flat_id))
+
+        return operation
+
+    def sell(sell_flat: Callable[[int, int], None]) -> Callable[[], None]:
+        def operation() -> None:
+            sell_flat(*bought.pop())
+
+        return operation
+
+    usernames = (f"bench{seed}x{number}" for number in count())
+    register = Register(user_repo, hasher)
+    login = Login(user_repo, hasher)
+    buy_flat = BuyFlat(user_repo, market_repo)
+    sell_flat = SellFlat(user_repo, market_repo)
+
+    return {
+        "repo.get_credentials": (
+            lambda: user_repo.get_credentials(f"user{random_user_id()}"),
+            1,
+        ),
+        "repo.get_user": (lambda: user_repo.get_user(random_user_id()), 1),
+        "repo.get_property": (lambda: user_repo.get_property(random_user_id()), 1),
+        "repo.get_flat": (lambda: market_repo.get_flat(random_flat_id()), 1),
+        "repo.get_flat_list": (market_repo.get_flat_list, 20),
+        "repo.find_flats": (lambda: market_repo.find_flats(random_query()), 1),
+        "repo.get_flat_facets": (
+            lambda: market_repo.get_flat_facets(random_query()),
+            1,
+        ),
+        "repo.get_market_stats": (
+            lambda: market_repo.get_market_stats(random_query()),
+            5,
+        ),
+        "repo.purchase_flat": (buy(market_repo.purchase_flat), 1),
+        "repo.sell_flat": (sell(market_repo.sell_flat), 1),
+        "use_case.register": (
+            lambda: register.execute(next(usernames), BENCHMARK_PASSWORD),
+            10,
+        ),
+        "use_case.login": (
+            lambda: login.execute(f"user{random_user_id()}", BENCHMARK_PASSWORD),
+            10,
+        ),
+        "use_case.get_user": (
+            lambda: GetUser(user_repo).execute(random_user_id()),
+            1,
+        ),
+        "use_case.get_property": (
+            lambda: GetUserProperty(user_repo).execute(random_user_id()),
+            1,
+        ),
+        "use_case.get_flat_list": (GetFlatList(market_repo).execute, 20),
+        "use_case.get_flat_page": (
+            lambda: GetFlatPage(market_repo).execute(random_query()),
+            1,
+        ),
+        "use_case.get_flat_facets": (GetFlatFacets(market_repo).execute, 1),
+        "use_case.get_market_stats": (GetMarketStats(market_repo).execute, 5),
+        "use_case.purchase": (buy(buy_flat.execute), 1),
+        "use_case.sell": (sell(sell_flat.execute), 1),
+    }
+
+
+def run_backend(
+    backend: str, scale: int, iterations: int, seed: int, only: list[str] | None
+) -> dict:
+    """Measures every operation against the backend chosen by ``STORAGE_BACKEND``.
+
+    Has to be called in a fresh process whose working directory holds the
+    generated tables in ``data/db``.
+    """
+    from infrastructure.resources import get_resources, shutdown_resources
+
+    started = time.perf_counter()
+    if backend == "sqlite":
+        from infrastructure.sqlite_db import SqliteConnectionPool, migrate_from_csv
+
+        pool = SqliteConnectionPool()
+        migrate_from_csv(pool)
+        pool.close()
+    resources = get_resources()
+    load_s = time.perf_counter() - started
+
+    operations = {}
+    for name, (operation, divisor) in _operations(resources, scale, seed).items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        stats = measure(operation, max(iterations // divisor, 5))
+        operations[name] = asdict(stats)
+        print(f"{backend:>6} {name:<26} p50 {stats.p50_ms:>10.3f} ms", file=sys.stderr)
+
+    shutdown_resources()
+    return {
+        "load_s": round(load_s, 3),
+        "peak_rss_mb": _peak_rss_mb(),
+        "operations": operations,
+    }
+
+
+def _spawn_backend(args: argparse.Namespace, backend: str, dataset: str) -> dict:
+    with tempfile.TemporaryDirectory(prefix=f"benchmark-{backend}-") as workdir:
+        shutil.copytree(dataset, os.path.join(workdir, "data", "db"))
+        command = [
+            sys.executable,
+            os.path.abspath(__file__),
+            "worker",
+            backend,
+            f"--scale={args.scale}",
+            f"--iterations={args.iterations}",
+            f"--seed={args.seed}",
+            *(f"--only={pattern}" for pattern in args.only or ()),
+        ]
+        environment = dict(os.environ, STORAGE_BACKEND=backend)
+        completed = subprocess.run(
+            command,
+            cwd=workdir,
+            env=environment,
+            stdout=subprocess.PIPE,
+            check=True,
+            text=True,
+        )
+    return json.loads(completed.stdout)
+
+
+@dataclass
+class ImportTime:
+    module: str
+    depth: int
+    self_ms: float
+    cumulative_ms: float
+    parent: "ImportTime | None" = None
+
+    @property
+    def chain(self) -> str:
+        """Returns the chain of imports which brought the module in."""
+        modules = []
+        entry = self
+        while entry is not None:
+            modules.append(entry.module)
+            entry = entry.parent
+        return " > ".join(reversed(modules))
+
+
+def parse_import_times(report: str) -> list[ImportTime]:
+    """Parses the report printed to stderr by ``python -X importtime``.
+
+    Modules are listed after the modules they import, indented by two
+    spaces per nesting level.
+
+    :param report: Output of the interpreter.
+    :type report: str
+    :return: Import times of the modules, in the order of the report.
+    :rtype: list[ImportTime]
+    """
+    entries = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        name = name[1:]
+        module = name.lstrip(" ")
+        entries.append(
+            ImportTime(
+                module=module,
+                depth=(len(name) - len(module)) // 2,
+                self_ms=int(self_us) / 1000,
+                cumulative_ms=int(cumulative_us) / 1000,
+            )
+        )
+
+    pending: list[ImportTime] = []
+    for entry in entries:
+        while pending and pending[-1].depth > entry.depth:
+            pending.pop().parent = entry
+        pending.append(entry)
+    return entries
+
+
+def import_report(
+    scenario: str, backend: str, dataset: str, top: int, forbidden: list[str]
+) -> bool:
+    """Prints the slowest imports of a startup scenario.
+
+    The scenario runs in a fresh interpreter, on a copy of the dataset.
+
+    :param scenario: Name of the scenario in :data:`IMPORT_SCENARIOS`.
+    :type scenario: str
+    :param backend: Storage backend.
+    :type backend: str
+    :param dataset: Directory with the tables.
+    :type dataset: str
+    :param top: Amount of the modules to print.
+    :type top: int
+    :param forbidden: Packages the scenario must not import.
+    :type forbidden: list[str]
+    :return: Whether no forbidden package was imported.
+    :rtype: bool
+    """
+    with tempfile.TemporaryDirectory(prefix="benchmark-imports-") as workdir:
+        shutil.copytree(dataset, os.path.join(workdir, "data", "db"))
+        environment = dict(
+            os.environ,
+            STORAGE_BACKEND=backend,
+            PYTHONPATH=os.path.dirname(os.path.abspath(__file__)),
+        )
+        started_at = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", IMPORT_SCENARIOS[scenario]],
+            cwd=workdir,
+            env=environment,
+            stderr=subprocess.PIPE,
+            check=True,
+            text=True,
+        )
+        wall_ms = (time.perf_counter() - started_at) * 1000
+
+    entries = parse_import_times(completed.stderr)
+    import_ms = sum(entry.self_ms for entry in entries)
+    print(
+        f"{scenario}: {wall_ms:.0f} ms in total, {import_ms:.0f} ms importing"
+        f" {len(entries)} modules"
+    )
+    print("\nSlowest top-level imports, cumulative:")
+    top_level = [entry for entry in entries if entry.depth == 0]
+    for entry in sorted(top_level, key=lambda entry: -entry.cumulative_ms)[:top]:
+        print(f"{entry.cumulative_ms:>10.1f} ms  {entry.module}")
+    print("\nSlowest modules, self:")
+    for entry in sorted(entries, key=lambda entry: -entry.self_ms)[:top]:
+        importer = f" (from {entry.parent.module})" if entry.parent else ""
+        print(f"{entry.self_ms:>10.1f} ms  {entry.module}{importer}")
+
+    violations = [
+        entry
+        for entry in entries
+        if entry.module in forbidden
+        or any(entry.module.startswith(f"{package}.") for package in forbidden)
+    ]
+    for entry in violations:
+        if entry.parent is None or entry.parent.module.split(".")[0] != (
+            entry.module.split(".")[0]
+        ):
+            print(f"Forbidden import: {entry.chain}", file=sys.stderr)
+    return not violations
+
+
+def compare(
+    results: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD
+) -> list[str]:
+    """Finds the operations whose p50 or p95 latency grew beyond the threshold.
+
+    :param results: Current benchmark report.
+    :type results: dict
+    :param baseline: Earlier benchmark report.
+    :type baseline: dict
+    :param threshold: Allowed relative latency growth.
+    :type threshold: float
+    :return: Descriptions of the regressions.
+    :rtype: list[str]
+    """
+    regressions = []
+    for backend, backend_results in results["backends"].items():
+        baseline_operations = (
+            baseline["backends"].get(backend, {}).get("operations", {})
+        )
+        for name, stats in backend_results["operations"].items():
+            if name not in baseline_operations:
+                continue
+            for metric in ("p50_ms", "p95_ms"):
+                before, after = baseline_operations[name][metric], stats[metric]
+                if before > 0 and after > before * (1 + threshold):
+                    regressions.append(
+                        f"{backend} {name} {metric}: {before:.3f} -> {after:.3f}"
+                        f" (+{(after / before - 1) * 100:.0f}%)"
+                    )
+    return regressions
+
+
+def main() -> None:
+    """Benchmarks repositories and use cases on synthetic data.
+
+    Run from the ``src`` directory, e.g.::
+
+        python benchmark.py run --scale 100000 --output bench.json
+        python benchmark.py run --scale 100000 --baseline bench.json
+        python benchmark.py generate --scale 1000000 datasets/1m
+        python benchmark.py run --dataset datasets/1m --scale 1000000
+        python benchmark.py imports --scenario login --forbid pandas
+
+    Every backend runs in its own process, on its own copy of the data.  A
+    run fails when it is slower than the baseline beyond the threshold.  An
+    import report fails when the scenario imports a forbidden package.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks the storages.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate")
+    generate_parser.add_argument("directory")
+
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("--backend", choices=BACKENDS, action="append")
+    run_parser.add_argument("--dataset")
+    run_parser.add_argument("--output")
+    run_parser.add_argument("--baseline")
+    run_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+
+    worker_parser = subparsers.add_parser("worker")
+    worker_parser.add_argument("backend", choices=BACKENDS)
+
+    imports_parser = subparsers.add_parser("imports")
+    imports_parser.add_argument("--scenario", choices=IMPORT_SCENARIOS, default="login")
+    imports_parser.add_argument("--backend", choices=BACKENDS, default="local")
+    imports_parser.add_argument("--dataset")
+    imports_parser.add_argument("--top", type=int, default=15)
+    imports_parser.add_argument("--forbid", action="append", default=[])
+
+    for subparser in (generate_parser, run_parser, worker_parser, imports_parser):
+        subparser.add_argument("--scale", type=int, default=10_000)
+        subparser.add_argument("--seed", type=int, default=0)
+    for subparser in (run_parser, worker_parser):
+        subparser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+        subparser.add_argument("--only", action="append")
+    args = parser.parse_args()
+
+    match args.command:
+        case "generate":
+            generate_dataset(args.directory, args.scale, seed=args.seed)
+        case "imports":
+            with tempfile.TemporaryDirectory(prefix="benchmark-data-") as temp_dir:
+                dataset = args.dataset
+                if dataset is None:
+                    dataset = temp_dir
+                    generate_dataset(dataset, args.scale, seed=args.seed)
+                passed = import_report(
+                    args.scenario, args.backend, dataset, args.top, args.forbid
+                )
+            if not passed:
+                sys.exit(1)
+        case "worker":
+            results = run_backend(
+                args.backend, args.scale, args.iterations, args.seed, args.only
+            )
+            print(json.dumps(results))
+        case "run":
+            with tempfile.TemporaryDirectory(prefix="benchmark-data-") as temp_dir:
+                dataset = args.dataset
+                if dataset is None:
+                    dataset = temp_dir
+                    generate_dataset(dataset, args.scale, seed=args.seed)
+
+                report = {
+                    "scale": args.scale,
+                    "iterations": args.iterations,
+                    "seed": args.seed,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "backends": {
+                        backend: _spawn_backend(args, backend, dataset)
+                        for backend in args.backend or BACKENDS
+                    },
+                }
+
+            output = json.dumps(report, indent=2, ensure_ascii=False)
+            if args.output:
+                with open(args.output, "w", encoding="UTF-8") as file:
+                    file.write(output)
+            else:
+                print(output)
+
+            if args.baseline:
+                with open(args.baseline, "r", encoding="UTF-8") as file:
+                    regressions = compare(report, json.load(file), args.threshold)
+                for regression in regressions:
+                    print(f"Regression: {regression}", file=sys.stderr)
+                if regressions:
+                    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
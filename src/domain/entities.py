@@ -1,9 +1,9 @@
 from dataclasses import dataclass
 
-from .exceptions import NotEnoughMoney
+from .exceptions import InvalidFlat, NotEnoughMoney
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     id: int
     username: str
@@ -38,7 +38,7 @@ class User:
         self.username = new_username
 
 
-@dataclass
+@dataclass(slots=True)
 class Flat:
     id: int
     address: str
@@ -56,8 +56,17 @@ class Flat:
         """Is used to implement flat stock return by unlocking its availability"""
         self.is_available = True
 
+    def check(self) -> None:
+        """Checks that the flat data can be put on the market.
 
-@dataclass
+        :raises InvalidFlat: Raised when the flat has no address, or its price,
+            number or room amount is not positive.
+        """
+        if not self.address or min(self.price, self.number, self.room_amount) < 1:
+            raise InvalidFlat(f"Invalid flat data. ID: {self.id}")
+
+
+@dataclass(slots=True)
 class UserProperty:
     """Model to implement user property ownership.  Implemented by linking user to
     the property list.
@@ -65,3 +74,15 @@ class UserProperty:
 
     user_id: int
     properties: list[Flat]
+
+
+@dataclass(slots=True)
+class FlatPage:
+    """Model to implement catalogue pagination.  Contains one page of the flats
+    matching the filters and the total amount of such flats.
+    """
+
+    flats: list[Flat]
+    total: int
+    offset: int
+    limit: int | None
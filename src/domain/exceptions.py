@@ -5,3 +5,9 @@ class InvalidPassword(Exception): ...
 
 
 class NotEnoughMoney(Exception): ...
+
+
+class InvalidAmount(Exception): ...
+
+
+class InvalidFlat(Exception): ...
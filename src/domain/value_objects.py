@@ -35,3 +35,64 @@ class Credentials:
         )
 
         return length_correct and all_in_alphabet
+
+
+FLAT_SORT_KEYS = ("price", "-price", "room_amount", "-room_amount")
+
+
+@dataclass(frozen=True)
+class FlatQuery:
+    """Specification of a flat catalogue query.  Conditions set to None are not
+    checked.  Flats with equal sort keys are ordered by price and then by ID.
+    """
+
+    room_amount: int | None = None
+    only_available: bool = False
+    min_price: int | None = None
+    max_price: int | None = None
+    sort: str = "price"
+    offset: int = 0
+    limit: int | None = None
+
+
+@dataclass(frozen=True)
+class FlatFacets:
+    """Value ranges of the flat catalogue used to build the filters.  Room range
+    covers the whole catalogue, price range covers the flats matching the room
+    and availability conditions of the query.
+    """
+
+    flat_amount: int
+    min_rooms: int
+    max_rooms: int
+    min_price: int
+    max_price: int
+
+
+@dataclass(frozen=True)
+class GroupStats:
+    """Price and availability aggregates of the flats sharing a column value."""
+
+    key: int
+    flat_amount: int
+    available_amount: int
+    min_price: int
+    median_price: float
+    mean_price: float
+    max_price: int
+    mean_price_per_room: float
+
+
+@dataclass(frozen=True)
+class MarketStats:
+    """Aggregates of the flats matching a catalogue query.  The price histogram
+    is given by bin edges (one more than counts) and flat counts per bin.
+    """
+
+    flat_amount: int
+    available_amount: int
+    median_price: float
+    by_room_amount: tuple[GroupStats, ...]
+    by_floor: tuple[GroupStats, ...]
+    price_bin_edges: tuple[int, ...]
+    price_bin_counts: tuple[int, ...]
@@ -0,0 +1,133 @@
+import argparse
+import csv
+import json
+import os
+from collections.abc import Iterable, Iterator
+from dataclasses import fields
+from itertools import islice
+from operator import attrgetter
+
+from domain.entities import Flat, User
+from infrastructure.resources import get_resources
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+FORMATS = ("csv", "jsonl", "parquet")
+EXPORT_CHUNK_SIZE = 10_000
+
+USER_COLUMNS = tuple(field.name for field in fields(User))
+FLAT_COLUMNS = tuple(field.name for field in fields(Flat))
+OWNERSHIP_COLUMNS = ("user_id", "flat_id")
+
+
+def _write_csv(path: str, columns: tuple[str, ...], rows: Iterable[tuple]) -> None:
+    with open(path, "w", encoding="UTF-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        writer.writerows(rows)
+
+
+def _write_jsonl(path: str, columns: tuple[str, ...], rows: Iterable[tuple]) -> None:
+    with open(path, "w", encoding="UTF-8") as file:
+        for row in rows:
+            file.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            file.write("\n")
+
+
+def _write_parquet(path: str, columns: tuple[str, ...], rows: Iterable[tuple]) -> None:
+    if pq is None:
+        raise RuntimeError("Parquet export requires pyarrow to be installed")
+
+    iterator = iter(rows)
+    writer = None
+    try:
+        while chunk := list(islice(iterator, EXPORT_CHUNK_SIZE)):
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(values) for values in zip(*chunk)], names=list(columns)
+            )
+            if writer is None:
+                writer = pq.ParquetWriter(path, batch.schema)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        pq.write_table(pa.table({column: [] for column in columns}), path)
+
+
+_WRITERS = {"csv": _write_csv, "jsonl": _write_jsonl, "parquet": _write_parquet}
+
+
+def export(
+    path: str, columns: tuple[str, ...], rows: Iterable[tuple], file_format: str
+) -> None:
+    """Streams the rows into a file, holding only one chunk in memory.
+
+    The file is written next to the target and moved into place when
+    complete, so readers never see a partial export.
+
+    :param path: Path to the output file.
+    :type path: str
+    :param columns: Column names.
+    :type columns: tuple[str, ...]
+    :param rows: Rows with values in the column order.
+    :type rows: Iterable[tuple]
+    :param file_format: ``csv``, ``jsonl`` or ``parquet``.
+    :type file_format: str
+    """
+    temp_path = f"{path}.tmp"
+    try:
+        _WRITERS[file_format](temp_path, columns, rows)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+
+
+def _entity_rows(entities: Iterator, columns: tuple[str, ...]) -> Iterator[tuple]:
+    return map(attrgetter(*columns), entities)
+
+
+def main() -> None:
+    """Exports a table from the storage chosen by ``STORAGE_BACKEND``.
+
+    Run from the ``src`` directory, e.g.::
+
+        python export.py flats flats.parquet
+        python export.py users users.jsonl
+        python export.py ownership owners.csv
+    """
+    parser = argparse.ArgumentParser(description="Exports data in bulk.")
+    parser.add_argument("kind", choices=("users", "flats", "ownership"))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, dest="file_format")
+    args = parser.parse_args()
+
+    file_format = args.file_format or os.path.splitext(args.path)[1].lstrip(".")
+    if file_format not in FORMATS:
+        parser.error(f"unknown file format: {file_format}")
+
+    resources = get_resources()
+    match args.kind:
+        case "users":
+            columns = USER_COLUMNS
+            rows = _entity_rows(resources.user_repo.iter_users(), columns)
+        case "flats":
+            columns = FLAT_COLUMNS
+            rows = _entity_rows(resources.market_repo.iter_flats(), columns)
+        case "ownership":
+            columns = OWNERSHIP_COLUMNS
+            rows = resources.user_repo.iter_ownership()
+
+    export(args.path, columns, rows, file_format)
+    print(f"Exported {args.kind} to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
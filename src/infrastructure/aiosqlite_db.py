@@ -0,0 +1,292 @@
+import asyncio
+import sqlite3
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+from application.exceptions import (
+    FlatNotFound,
+    ItemAlreadySold,
+    NotAnOwnerError,
+    UsernameTaken,
+    UserNotFound,
+)
+from application.ports import (
+    AsyncMarketDatabaseRepository,
+    AsyncUserDatabaseRepository,
+)
+from domain.entities import Flat, FlatPage, User, UserProperty
+from domain.exceptions import NotEnoughMoney
+from domain.value_objects import FlatFacets, FlatQuery
+
+from .sqlite_db import (
+    FLAT_COLUMNS,
+    SCHEMA,
+    SQLITE_DB_PATH,
+    flat_conditions,
+    flat_order,
+    make_flat,
+    make_flats,
+)
+
+
+class AsyncSqliteConnectionPool:
+    """Fixed set of aiosqlite connections handed out to one task at a time.
+
+    Every connection runs its queries on its own thread, and WAL lets the
+    readers proceed alongside a writer, so queries of different tasks overlap.
+    Connections are opened on first use within the running event loop.
+    """
+
+    def __init__(self, path: str = SQLITE_DB_PATH, size: int = 4) -> None:
+        self._path = path
+        self._size = size
+        self._idle: asyncio.Queue[aiosqlite.Connection] | None = None
+        self._connections: list[aiosqlite.Connection] = []
+        self._open_lock = asyncio.Lock()
+
+    async def _open(self) -> asyncio.Queue:
+        async with self._open_lock:
+            if self._idle is not None:
+                return self._idle
+
+            idle = asyncio.Queue()
+            for _ in range(self._size):
+                connection = await aiosqlite.connect(self._path, isolation_level=None)
+                await connection.execute("PRAGMA journal_mode = WAL")
+                await connection.execute("PRAGMA synchronous = NORMAL")
+                await connection.execute("PRAGMA busy_timeout = 5000")
+                self._connections.append(connection)
+                idle.put_nowait(connection)
+            await self._connections[0].executescript(SCHEMA)
+            self._idle = idle
+            return idle
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        idle = self._idle or await self._open()
+        connection = await idle.get()
+        try:
+            yield connection
+        finally:
+            idle.put_nowait(connection)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Runs the block in a write transaction, rolled back on exceptions."""
+        async with self.connection() as connection:
+            await connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                await connection.execute("ROLLBACK")
+                raise
+            await connection.execute("COMMIT")
+
+    async def close(self) -> None:
+        for connection in self._connections:
+            await connection.close()
+        self._connections.clear()
+        self._idle = None
+
+
+async def _fetchone(
+    connection: aiosqlite.Connection, sql: str, parameters=()
+) -> tuple | None:
+    async with connection.execute(sql, parameters) as cursor:
+        return await cursor.fetchone()
+
+
+class AsyncSqliteUserDatabase(AsyncUserDatabaseRepository):
+    def __init__(self, pool: AsyncSqliteConnectionPool) -> None:
+        self._pool = pool
+
+    async def register(self, username: str, password_hash: str) -> None:
+        try:
+            async with self._pool.transaction() as connection:
+                await connection.execute(
+                    "INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                    (username, password_hash),
+                )
+        except sqlite3.IntegrityError:
+            raise UsernameTaken("This username is not available")
+
+    async def get_credentials(self, username: str) -> tuple[int, str]:
+        async with self._pool.connection() as connection:
+            row = await _fetchone(
+                connection,
+                "SELECT id, password_hash FROM users WHERE username = ?",
+                (username,),
+            )
+
+        if row is None:
+            raise UserNotFound(f"User not found. Username: {username}")
+
+        return row[0], row[1]
+
+    async def get_user(self, user_id: int) -> User:
+        async with self._pool.connection() as connection:
+            row = await _fetchone(
+                connection,
+                "SELECT id, username, balance FROM users WHERE id = ?",
+                (user_id,),
+            )
+
+        if row is None:
+            raise UserNotFound(f"User not found. ID: {user_id}")
+
+        return User(id=row[0], username=row[1], balance=row[2])
+
+    async def get_property(self, user_id: int) -> UserProperty:
+        async with self._pool.connection() as connection:
+            rows = await connection.execute_fetchall(
+                f"SELECT {FLAT_COLUMNS} FROM owners"
+                " JOIN flats ON flats.id = owners.flat_id"
+                " WHERE owners.user_id = ? ORDER BY flats.id",
+                (user_id,),
+            )
+        property_list = [make_flat(row, is_available=False) for row in rows]
+        return UserProperty(user_id, property_list)
+
+    async def add_money(self, user_id: int, amount: int) -> None:
+        async with self._pool.transaction() as connection:
+            cursor = await connection.execute(
+                "UPDATE users SET balance = balance + ? WHERE id = ?",
+                (amount, user_id),
+            )
+            if cursor.rowcount == 0:
+                raise UserNotFound(f"User not found. ID: {user_id}")
+
+    async def edit_profile(
+        self, user_id: int, new_username, new_password_hash: str
+    ) -> None:
+        try:
+            async with self._pool.transaction() as connection:
+                cursor = await connection.execute(
+                    "UPDATE users SET username = coalesce(?, username),"
+                    " password_hash = coalesce(?, password_hash) WHERE id = ?",
+                    (new_username or None, new_password_hash or None, user_id),
+                )
+                if cursor.rowcount == 0:
+                    raise UserNotFound(f"User not found. ID: {user_id}")
+        except sqlite3.IntegrityError:
+            raise UsernameTaken("This username is not available")
+
+
+class AsyncSqliteMarketDatabase(AsyncMarketDatabaseRepository):
+    def __init__(self, pool: AsyncSqliteConnectionPool) -> None:
+        self._pool = pool
+
+    async def get_flat_list(self) -> list[Flat]:
+        async with self._pool.connection() as connection:
+            rows = await connection.execute_fetchall(
+                f"SELECT {FLAT_COLUMNS}, owners.flat_id IS NULL FROM flats"
+                " LEFT JOIN owners ON owners.flat_id = flats.id ORDER BY flats.id"
+            )
+        return make_flats(rows)
+
+    async def find_flats(self, query: FlatQuery) -> FlatPage:
+        conditions, parameters = flat_conditions(query)
+        order = flat_order(query)
+
+        async with self._pool.connection() as connection:
+            (total,) = await _fetchone(
+                connection,
+                "SELECT count(*) FROM flats"
+                " LEFT JOIN owners ON owners.flat_id = flats.id"
+                f" WHERE {conditions}",
+                parameters,
+            )
+            rows = await connection.execute_fetchall(
+                f"SELECT {FLAT_COLUMNS}, owners.flat_id IS NULL FROM flats"
+                " LEFT JOIN owners ON owners.flat_id = flats.id"
+                f" WHERE {conditions} ORDER BY {order} LIMIT ? OFFSET ?",
+                [
+                    *parameters,
+                    query.limit if query.limit is not None else -1,
+                    query.offset,
+                ],
+            )
+
+        flats = make_flats(rows)
+        return FlatPage(flats, total=total, offset=query.offset, limit=query.limit)
+
+    async def get_flat_facets(self, query: FlatQuery) -> FlatFacets:
+        conditions, parameters = flat_conditions(query, check_price=False)
+
+        async with self._pool.connection() as connection:
+            min_rooms, max_rooms = await _fetchone(
+                connection,
+                "SELECT coalesce(min(room_amount), 0), coalesce(max(room_amount), 0)"
+                " FROM flats",
+            )
+            flat_amount, min_price, max_price = await _fetchone(
+                connection,
+                "SELECT count(*), coalesce(min(price), 0), coalesce(max(price), 0)"
+                " FROM flats LEFT JOIN owners ON owners.flat_id = flats.id"
+                f" WHERE {conditions}",
+                parameters,
+            )
+        return FlatFacets(flat_amount, min_rooms, max_rooms, min_price, max_price)
+
+    async def get_flat(self, flat_id: int) -> Flat:
+        async with self._pool.connection() as connection:
+            row = await _fetchone(
+                connection,
+                f"SELECT {FLAT_COLUMNS}, owners.flat_id IS NULL FROM flats"
+                " LEFT JOIN owners ON owners.flat_id = flats.id WHERE flats.id = ?",
+                (flat_id,),
+            )
+
+        if row is None:
+            raise FlatNotFound(f"Flat not found. ID: {flat_id}")
+
+        return make_flat(row[:-1], is_available=bool(row[-1]))
+
+    async def purchase_flat(self, user_id: int, flat_id: int) -> None:
+        async with self._pool.transaction() as connection:
+            user_row = await _fetchone(
+                connection, "SELECT balance FROM users WHERE id = ?", (user_id,)
+            )
+            if user_row is None:
+                raise UserNotFound(f"User not found. ID: {user_id}")
+
+            flat_row = await _fetchone(
+                connection,
+                "SELECT price, EXISTS (SELECT 1 FROM owners WHERE flat_id = flats.id)"
+                " FROM flats WHERE id = ?",
+                (flat_id,),
+            )
+            if flat_row is None:
+                raise FlatNotFound(f"Flat not found. ID: {flat_id}")
+
+            user_balance, (flat_price, is_sold) = user_row[0], flat_row
+            if is_sold:
+                raise ItemAlreadySold(f"Flat is already sold. ID: {flat_id}")
+            if user_balance < flat_price:
+                raise NotEnoughMoney(f"User does not have enough money. ID: {user_id}")
+
+            await connection.execute(
+                "UPDATE users SET balance = balance - ? WHERE id = ?",
+                (flat_price, user_id),
+            )
+            await connection.execute(
+                "INSERT INTO owners (user_id, flat_id) VALUES (?, ?)",
+                (user_id, flat_id),
+            )
+
+    async def sell_flat(self, user_id: int, flat_id: int) -> None:
+        async with self._pool.transaction() as connection:
+            cursor = await connection.execute(
+                "DELETE FROM owners WHERE user_id = ? AND flat_id = ?",
+                (user_id, flat_id),
+            )
+            if cursor.rowcount == 0:
+                raise NotAnOwnerError("User is not the owner of the property")
+
+            await connection.execute(
+                "UPDATE users SET balance = balance"
+                " + (SELECT price FROM flats WHERE id = ?) WHERE id = ?",
+                (flat_id, user_id),
+            )
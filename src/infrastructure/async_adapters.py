@@ -0,0 +1,111 @@
+import asyncio
+import contextvars
+from concurrent.futures import Executor
+from functools import partial
+
+from application.ports import (
+    AsyncMarketDatabaseRepository,
+    AsyncPasswordHasher,
+    AsyncUserDatabaseRepository,
+    MarketDatabaseRepository,
+    PasswordHasher,
+    UserDatabaseRepository,
+)
+from domain.entities import Flat, FlatPage, User, UserProperty
+from domain.value_objects import FlatFacets, FlatQuery
+
+
+class _ExecutorAdapter:
+    """Runs the methods of a synchronous service on an executor.
+
+    The event loop keeps serving other tasks while a call blocks on disk or
+    CPU.  The loop's default thread pool is used when no executor is passed.
+    Calls run in a copy of the caller's context, so that the spans of the
+    synchronous services join the trace of the request.
+    """
+
+    def __init__(self, executor: Executor | None = None) -> None:
+        self._executor = executor
+
+    async def _run(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, partial(context.run, function, *args, **kwargs)
+        )
+
+
+class ExecutorPasswordHasher(_ExecutorAdapter, AsyncPasswordHasher):
+    def __init__(self, hasher: PasswordHasher, executor: Executor | None = None):
+        super().__init__(executor)
+        self._hasher = hasher
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self._hasher.hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(self._hasher.verify, password, password_hash)
+
+    async def needs_rehash(self, password_hash: str) -> bool:
+        return self._hasher.needs_rehash(password_hash)
+
+
+class ExecutorUserDatabase(_ExecutorAdapter, AsyncUserDatabaseRepository):
+    def __init__(
+        self, user_repo: UserDatabaseRepository, executor: Executor | None = None
+    ) -> None:
+        super().__init__(executor)
+        self._user_repo = user_repo
+
+    async def register(self, username: str, password_hash: str) -> None:
+        await self._run(self._user_repo.register, username, password_hash)
+
+    async def get_credentials(self, username: str) -> tuple[int, str]:
+        return await self._run(self._user_repo.get_credentials, username)
+
+    async def get_user(self, user_id: int) -> User:
+        return await self._run(self._user_repo.get_user, user_id)
+
+    async def add_money(self, user_id: int, amount: int) -> None:
+        await self._run(self._user_repo.add_money, user_id=user_id, amount=amount)
+
+    async def edit_profile(
+        self, user_id: int, new_username, new_password_hash: str
+    ) -> None:
+        await self._run(
+            self._user_repo.edit_profile,
+            user_id=user_id,
+            new_username=new_username,
+            new_password_hash=new_password_hash,
+        )
+
+    async def get_property(self, user_id: int) -> UserProperty:
+        return await self._run(self._user_repo.get_property, user_id)
+
+
+class ExecutorMarketDatabase(_ExecutorAdapter, AsyncMarketDatabaseRepository):
+    def __init__(
+        self, market_repo: MarketDatabaseRepository, executor: Executor | None = None
+    ) -> None:
+        super().__init__(executor)
+        self._market_repo = market_repo
+
+    async def get_flat_list(self) -> list[Flat]:
+        return await self._run(self._market_repo.get_flat_list)
+
+    async def find_flats(self, query: FlatQuery) -> FlatPage:
+        return await self._run(self._market_repo.find_flats, query)
+
+    async def get_flat_facets(self, query: FlatQuery) -> FlatFacets:
+        return await self._run(self._market_repo.get_flat_facets, query)
+
+    async def get_flat(self, flat_id: int) -> Flat:
+        return await self._run(self._market_repo.get_flat, flat_id)
+
+    async def purchase_flat(self, user_id: int, flat_id: int) -> None:
+        await self._run(
+            self._market_repo.purchase_flat, user_id=user_id, flat_id=flat_id
+        )
+
+    async def sell_flat(self, user_id: int, flat_id: int) -> None:
+        await self._run(self._market_repo.sell_flat, user_id=user_id, flat_id=flat_id)
@@ -0,0 +1,359 @@
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Hashable, Iterator, Mapping, Sequence
+from itertools import accumulate
+
+from .schema import Column, TableSchema
+
+MAGIC = b"OTVT"
+VERSION = 1
+
+# Magic, version, flags, column count, row count, first key if the keys are
+# consecutive, offset of the key order section, inode, modification time and
+# size of the source CSV file.
+_HEADER = struct.Struct("<4sHHIQqQQqq")
+# Column name, kind and three (offset, length) sections.
+_DESCRIPTOR = struct.Struct("<32sB7x6Q")
+_CONSECUTIVE_KEYS = 1
+
+_INT = 0
+_STRING = 1
+_CATEGORICAL = 2
+
+Signature = tuple[int, int, int]
+
+
+def source_signature(path: str) -> Signature:
+    """Returns the inode, the modification time and the size of the file.
+
+    A file renamed over another keeps its inode and modification time, so a
+    binary table written for a temporary CSV file stays valid once the file
+    takes its place.
+    """
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _kind(column: Column) -> int:
+    if column.dtype is int:
+        return _INT
+    return _CATEGORICAL if column.categorical else _STRING
+
+
+class StringColumn(Sequence):
+    """Strings stored in a UTF-8 heap, decoded on access."""
+
+    def __init__(self, offsets: memoryview, heap: memoryview) -> None:
+        self._offsets = offsets
+        self._heap = heap
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return str(self._heap[self._offsets[index] : self._offsets[index + 1]], "utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        heap = self._heap
+        offsets = self._offsets
+        for start, end in zip(offsets, offsets[1:]):
+            yield str(heap[start:end], "utf-8")
+
+
+class CategoricalColumn(Sequence):
+    """Codes of the values in a small column of the distinct values.
+
+    The distinct values are decoded once, on the first access, so that every
+    row refers to the same string.
+    """
+
+    def __init__(self, codes: memoryview, categories: StringColumn) -> None:
+        self._codes = codes
+        self._categories = categories
+        self._values: list[str] | None = None
+        self._lock = threading.Lock()
+
+    def _decoded(self) -> list[str]:
+        if self._values is None:
+            with self._lock:
+                if self._values is None:
+                    self._values = list(self._categories)
+        return self._values
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __getitem__(self, index: int) -> str:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self._decoded()[self._codes[index]]
+
+    def __iter__(self) -> Iterator[str]:
+        return map(self._decoded().__getitem__, self._codes)
+
+
+class SortedPositions(Mapping):
+    """Positions of the rows by key, found by binary search over the rows
+    ordered by key, for the tables whose keys are not consecutive.
+    """
+
+    def __init__(self, keys: memoryview, order: memoryview) -> None:
+        self._keys = keys
+        self._order = order
+
+    def __getitem__(self, key: Hashable) -> int:
+        if isinstance(key, int):
+            keys = self._keys
+            order = self._order
+            i = bisect_left(order, key, key=keys.__getitem__)
+            if i < len(order) and keys[order[i]] == key:
+                return order[i]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def max_key(self) -> Hashable | None:
+        """Returns the largest key, or None if there are no keys."""
+        return self._keys[self._order[-1]] if len(self._order) else None
+
+    def keys_after(self, key: Hashable | None) -> Iterator[Hashable]:
+        """Iterates over the keys greater than the passed one in ascending
+        order, or over all of them if None is passed.
+        """
+        keys = self._keys
+        order = self._order
+        start = 0 if key is None else bisect_right(order, key, key=keys.__getitem__)
+        return (keys[order[i]] for i in range(start, len(order)))
+
+
+class BinaryTable:
+    """Table file opened with :mod:`mmap`.
+
+    The columns are views of the mapped file, so opening a table reads only
+    the header, and the pages of the rows are read by the OS when they are
+    accessed and shared between the processes.
+    """
+
+    def __init__(self, path: str, schema: TableSchema) -> None:
+        self.path = path
+        self.schema = schema
+        self.columns: dict[str, Sequence] = {}
+        self.positions: Mapping[Hashable, int] | range = range(0)
+        self.source: Signature | None = None
+        self._mmap: mmap.mmap | None = None
+
+    def open(self) -> bool:
+        """Maps the file and checks it against the schema.
+
+        The file is unmapped again if it is not valid.
+
+        :return: Whether the file exists and has the expected format.
+        :rtype: bool
+        """
+        try:
+            with open(self.path, "rb") as file:
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+
+        try:
+            loaded = self._load()
+        except (struct.error, ValueError):
+            loaded = False
+        if not loaded:
+            self.close()
+        return loaded
+
+    def close(self) -> None:
+        """Unmaps the file.  The columns must not be referenced any more."""
+        self.columns = {}
+        self.positions = range(0)
+        self.source = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def _load(self) -> bool:
+        view = memoryview(self._mmap)
+        if len(view) < _HEADER.size + _DESCRIPTOR.size * len(self.schema.columns):
+            return False
+        (
+            magic,
+            version,
+            flags,
+            column_count,
+            row_count,
+            first_key,
+            order_offset,
+            inode,
+            modified,
+            size,
+        ) = _HEADER.unpack_from(view)
+        if (
+            magic != MAGIC
+            or version != VERSION
+            or column_count != len(self.schema.columns)
+        ):
+            return False
+
+        def section(offset: int, length: int, format: str) -> memoryview:
+            return view[offset : offset + length].cast(format)
+
+        for i, column in enumerate(self.schema.columns):
+            name, kind, *sections = _DESCRIPTOR.unpack_from(
+                view, _HEADER.size + _DESCRIPTOR.size * i
+            )
+            if name.rstrip(b"\0").decode() != column.name or kind != _kind(column):
+                return False
+
+            if kind == _INT:
+                values = section(*sections[:2], "q")
+            elif kind == _STRING:
+                values = StringColumn(
+                    section(*sections[:2], "q"), section(*sections[2:4], "B")
+                )
+            else:
+                values = CategoricalColumn(
+                    section(*sections[:2], "i"),
+                    StringColumn(
+                        section(*sections[2:4], "q"), section(*sections[4:], "B")
+                    ),
+                )
+            if len(values) != row_count:
+                return False
+            self.columns[column.name] = values
+
+        keys = self.columns[self.schema.key]
+        if flags & _CONSECUTIVE_KEYS:
+            self.positions = range(first_key, first_key + row_count)
+        else:
+            self.positions = SortedPositions(
+                keys, section(order_offset, row_count * 8, "q")
+            )
+        self.source = inode, modified, size
+        return True
+
+
+def _string_sections(values: Sequence[str]) -> tuple[array, bytes]:
+    encoded = [value.encode() for value in values]
+    offsets = array("q", [0])
+    offsets.extend(accumulate(map(len, encoded)))
+    return offsets, b"".join(encoded)
+
+
+def write_table(
+    path: str,
+    schema: TableSchema,
+    columns: Mapping[str, Sequence],
+    source: Signature,
+) -> bool:
+    """Atomically writes the columns out as a binary table file.
+
+    The file starts with a header carrying the format version, the amount of
+    the rows and the signature of the CSV file it was written for, followed
+    by a descriptor of every column.  Integer columns are stored as arrays
+    of 64-bit integers, string columns as offsets into a heap of UTF-8
+    strings, categorical columns as 32-bit codes of the distinct values.
+    Rows keep the order of the CSV file.  If the keys are not consecutive
+    integers, the positions of the rows ordered by key are stored as well.
+    The file is synced to the disk before it replaces the previous one.
+
+    :param path: Path to the file.
+    :type path: str
+    :param schema: Schema of the table.
+    :type schema: TableSchema
+    :param columns: All the columns of the table by name.
+    :type columns: Mapping[str, Sequence]
+    :param source: Signature of the CSV file, see :func:`source_signature`.
+    :type source: Signature
+    :return: Whether the file was written.  It is not for duplicated keys.
+    :rtype: bool
+    """
+    keys = columns[schema.key]
+    row_count = len(keys)
+    first_key = keys[0] if row_count else 0
+    flags = 0
+    order = None
+    if array("q", keys) == array("q", range(first_key, first_key + row_count)):
+        flags |= _CONSECUTIVE_KEYS
+    else:
+        order = array("q", sorted(range(row_count), key=keys.__getitem__))
+        if any(keys[a] == keys[b] for a, b in zip(order, order[1:])):
+            return False
+
+    sections: list[list] = []
+    for column in schema.columns:
+        values = columns[column.name]
+        if column.dtype is int:
+            sections.append([array("q", values)])
+        elif column.categorical:
+            codes: dict[str, int] = {}
+            column_codes = array("i", [codes.setdefault(v, len(codes)) for v in values])
+            sections.append([column_codes, *_string_sections(list(codes))])
+        else:
+            sections.append(list(_string_sections(values)))
+
+    position = _HEADER.size + _DESCRIPTOR.size * len(schema.columns)
+    layout = []
+    for data in [*(data for column in sections for data in column), order]:
+        if data is None:
+            layout.append((0, 0))
+            continue
+        position += -position % 8
+        length = len(data) * (data.itemsize if isinstance(data, array) else 1)
+        layout.append((position, length))
+        position += length
+
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            file.write(
+                _HEADER.pack(
+                    MAGIC,
+                    VERSION,
+                    flags,
+                    len(schema.columns),
+                    row_count,
+                    first_key,
+                    layout[-1][0],
+                    *source,
+                )
+            )
+            i = 0
+            for column, data in zip(schema.columns, sections):
+                column_layout = layout[i : i + len(data)]
+                i += len(data)
+                column_layout += [(0, 0)] * (3 - len(column_layout))
+                file.write(
+                    _DESCRIPTOR.pack(
+                        column.name.encode(),
+                        _kind(column),
+                        *(value for pair in column_layout for value in pair),
+                    )
+                )
+            for data, (offset, _) in zip(
+                [*(data for column in sections for data in column), order], layout
+            ):
+                if data is not None:
+                    file.write(b"\0" * (offset - file.tell()))
+                    file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+    return True
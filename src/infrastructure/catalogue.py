@@ -0,0 +1,247 @@
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Hashable
+from operator import itemgetter
+
+from domain.value_objects import FlatFacets, FlatQuery
+
+from .tables import LocalTable
+
+_price = itemgetter(0)
+
+
+class FlatCatalogue:
+    """Sorted price indexes of the flat catalogue split by room amount.
+
+    For every room amount, and for the whole catalogue, two lists of
+    ``(price, flat_id)`` pairs sorted by price are kept: one of all the flats
+    and one of the available flats only.  A query is answered by binary search
+    over one of the lists, and facets are read from the ends of the lists.
+    The lists are updated incrementally from the flats and owners table
+    changes and rebuilt only when one of the tables is reloaded from disk.
+
+    The table listeners take the catalogue lock while the table lock is held,
+    so the tables are never read under the catalogue lock.
+    """
+
+    def __init__(self, flats: LocalTable, owners: LocalTable) -> None:
+        self._flats = flats
+        self._owners = owners
+        self._lock = threading.RLock()
+        self._stale = True
+        # Reloads of the tables, and the changes notified while the lists are
+        # being rebuilt, as (is flat, key, new row).
+        self._reloads = 0
+        self._builders = 0
+        self._pending: list[tuple[bool, Hashable, dict | None]] = []
+        self._flat_info: dict[int, tuple[int, int]] = {}
+        self._sold: set[int] = set()
+        self._lists: dict[tuple[int | None, bool], list[tuple[int, int]]] = {}
+
+        flats.add_listener(self._on_flat_changed)
+        owners.add_listener(self._on_ownership_changed)
+
+    def _lists_of(
+        self, room_amount: int, is_available: bool
+    ) -> list[list[tuple[int, int]]]:
+        keys = [(room_amount, False), (None, False)]
+        if is_available:
+            keys += [(room_amount, True), (None, True)]
+        return [self._lists.setdefault(key, []) for key in keys]
+
+    def _add(self, flat_id: int) -> None:
+        price, room_amount = self._flat_info[flat_id]
+        for entries in self._lists_of(room_amount, flat_id not in self._sold):
+            insort(entries, (price, flat_id))
+
+    def _remove(self, flat_id: int) -> None:
+        price, room_amount = self._flat_info[flat_id]
+        for entries in self._lists_of(room_amount, flat_id not in self._sold):
+            del entries[bisect_left(entries, (price, flat_id))]
+
+    def _on_flat_changed(
+        self, key: Hashable, old_row: dict | None, new_row: dict | None
+    ) -> None:
+        with self._lock:
+            if self._check_stale(True, key, new_row):
+                return
+
+            if old_row is not None:
+                self._remove(key)
+                del self._flat_info[key]
+            if new_row is not None:
+                self._flat_info[key] = (new_row["price"], new_row["room_amount"])
+                self._add(key)
+
+    def _on_ownership_changed(
+        self, key: Hashable, old_row: dict | None, new_row: dict | None
+    ) -> None:
+        with self._lock:
+            if self._check_stale(False, key, new_row):
+                return
+            if (old_row is None) == (new_row is None):
+                return
+
+            is_known = key in self._flat_info
+            if is_known:
+                self._remove(key)
+            if new_row is not None:
+                self._sold.add(key)
+            else:
+                self._sold.discard(key)
+            if is_known:
+                self._add(key)
+
+    def _check_stale(self, is_flat: bool, key: Hashable, row: dict | None) -> bool:
+        """Handles a change of a table.  Call under the lock.
+
+        :return: Whether the lists are stale, so the change is not applied to
+            them.
+        :rtype: bool
+        """
+        if key is None:
+            self._stale = True
+            self._reloads += 1
+            self._pending = []
+        elif self._stale and self._builders:
+            self._pending.append((is_flat, key, row))
+        return self._stale
+
+    def _build(self) -> None:
+        # The rows are read without the lock.  Changes notified meanwhile
+        # carry the resulting rows, so applying every one of them in order
+        # over the rows read gives the current state, whether the read has
+        # seen them or not.  A reload makes the rows read stale as a whole.
+        self._flats.keys()
+        self._owners.keys()
+        with self._lock:
+            if not self._stale:
+                return
+            if not self._builders:
+                self._pending = []
+            self._builders += 1
+
+        try:
+            while True:
+                with self._lock:
+                    reloads = self._reloads
+                sold = {flat_id for (flat_id,) in self._owners.select(("flat_id",))}
+                flat_info = {
+                    flat_id: (price, room_amount)
+                    for flat_id, price, room_amount in self._flats.select(
+                        ("id", "price", "room_amount")
+                    )
+                }
+
+                with self._lock:
+                    if not self._stale:
+                        return
+                    if self._reloads != reloads:
+                        continue
+
+                    for is_flat, key, row in self._pending:
+                        if is_flat and row is None:
+                            flat_info.pop(key, None)
+                        elif is_flat:
+                            flat_info[key] = (row["price"], row["room_amount"])
+                        elif row is None:
+                            sold.discard(key)
+                        else:
+                            sold.add(key)
+                    self._fill(flat_info, sold)
+                    return
+        finally:
+            with self._lock:
+                self._builders -= 1
+                if not self._builders:
+                    self._pending = []
+
+    def _fill(self, flat_info: dict[int, tuple[int, int]], sold: set[int]) -> None:
+        self._flat_info = flat_info
+        self._sold = sold
+        self._lists = {}
+        for flat_id, (price, room_amount) in flat_info.items():
+            for entries in self._lists_of(room_amount, flat_id not in sold):
+                entries.append((price, flat_id))
+        for entries in self._lists.values():
+            entries.sort()
+        self._stale = False
+
+    @staticmethod
+    def _price_bounds(
+        entries: list[tuple[int, int]], query: FlatQuery
+    ) -> tuple[int, int]:
+        low = 0
+        high = len(entries)
+        if query.min_price is not None:
+            low = bisect_left(entries, query.min_price, key=_price)
+        if query.max_price is not None:
+            high = bisect_right(entries, query.max_price, key=_price)
+        return low, max(low, high)
+
+    def find(self, query: FlatQuery) -> tuple[list[int], int]:
+        """Executes the query against the indexes.
+
+        :param query: Catalogue query.
+        :type query: FlatQuery
+        :return: IDs of the flats on the requested page and the total amount of
+            the flats matching the query.
+        :rtype: tuple[list[int], int]
+        """
+        self._build()
+        with self._lock:
+            descending = query.sort.startswith("-")
+            if query.room_amount is not None or query.sort.endswith("price"):
+                room_amounts = [query.room_amount]
+            else:
+                room_amounts = sorted(
+                    {room for room, _ in self._lists if room is not None},
+                    reverse=descending,
+                )
+
+            flat_ids = []
+            total = 0
+            skip = query.offset
+            space = query.limit if query.limit is not None else len(self._flat_info)
+            for room_amount in room_amounts:
+                entries = self._lists.get((room_amount, query.only_available), [])
+                low, high = self._price_bounds(entries, query)
+                total += high - low
+
+                taken = []
+                if skip < high - low and space > 0:
+                    if descending:
+                        stop = high - skip
+                        taken = entries[max(low, stop - space) : stop][::-1]
+                    else:
+                        taken = entries[low + skip : min(high, low + skip + space)]
+                skip = max(skip - (high - low), 0)
+                space -= len(taken)
+                flat_ids += [flat_id for _, flat_id in taken]
+
+            return flat_ids, total
+
+    def facets(self, query: FlatQuery) -> FlatFacets:
+        """Returns the catalogue facets without scanning the flats.
+
+        :param query: Catalogue query.  Only its room amount and availability
+            conditions are applied to the price range.
+        :type query: FlatQuery
+        :return: Catalogue facets.
+        :rtype: FlatFacets
+        """
+        self._build()
+        with self._lock:
+            room_amounts = [
+                room
+                for (room, only_available), entries in self._lists.items()
+                if room is not None and not only_available and entries
+            ]
+            entries = self._lists.get((query.room_amount, query.only_available), [])
+            return FlatFacets(
+                flat_amount=len(entries),
+                min_rooms=min(room_amounts, default=0),
+                max_rooms=max(room_amounts, default=0),
+                min_price=entries[0][0] if entries else 0,
+                max_price=entries[-1][0] if entries else 0,
+            )
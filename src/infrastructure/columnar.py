@@ -0,0 +1,314 @@
+import sqlite3
+import threading
+from collections.abc import Callable, Hashable, Iterable
+
+import numpy as np
+import pandas as pd
+
+from domain.value_objects import FlatQuery, GroupStats, MarketStats
+
+from .tables import LocalTable
+
+
+class FlatColumns:
+    """Columnar snapshot of the flat catalogue joined with ownership.
+
+    Every field is a NumPy array with one item per flat, ordered by flat ID.
+    Addresses are stored as category codes into a separate array of the
+    distinct addresses.  Sort orders of the flats by price, and by room
+    amount or floor and then price, are computed once per snapshot.  A query
+    selects the matching flats from an order with its mask, so filters and
+    aggregates are vectorized passes over arrays with no sorting.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        numbers: np.ndarray,
+        floors: np.ndarray,
+        room_amounts: np.ndarray,
+        prices: np.ndarray,
+        address_codes: np.ndarray,
+        addresses: np.ndarray,
+        is_available: np.ndarray,
+        orders: dict[str, np.ndarray] | None = None,
+    ) -> None:
+        self.ids = ids
+        self.numbers = numbers
+        self.floors = floors
+        self.room_amounts = room_amounts
+        self.prices = prices
+        self.address_codes = address_codes
+        self.addresses = addresses
+        self.is_available = is_available
+        self._orders = orders if orders is not None else {}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> "FlatColumns":
+        """Builds the columns from ``(id, number, floor, room_amount, price,
+        address, is_available)`` tuples sorted by ID.
+        """
+        columns = list(zip(*rows)) or [()] * 7
+        ids, numbers, floors, room_amounts, prices, addresses, is_available = columns
+        address_codes, distinct_addresses = pd.factorize(
+            np.array(addresses, dtype=object)
+        )
+        return cls(
+            ids=np.array(ids, dtype=np.int64),
+            numbers=np.array(numbers, dtype=np.int64),
+            floors=np.array(floors, dtype=np.int64),
+            room_amounts=np.array(room_amounts, dtype=np.int64),
+            prices=np.array(prices, dtype=np.int64),
+            address_codes=address_codes.astype(np.int32),
+            addresses=np.asarray(distinct_addresses, dtype=object),
+            is_available=np.array(is_available, dtype=bool),
+        )
+
+    def position(self, flat_id: int) -> int | None:
+        position = int(np.searchsorted(self.ids, flat_id))
+        if position < len(self.ids) and self.ids[position] == flat_id:
+            return position
+        return None
+
+    def _order(self, column: str) -> np.ndarray:
+        order = self._orders.get(column)
+        if order is None:
+            if column == "price":
+                order = np.argsort(self.prices, kind="stable")
+            else:
+                order = np.lexsort((self.prices, getattr(self, f"{column}s")))
+            self._orders[column] = order
+        return order
+
+    def mask(self, query: FlatQuery) -> np.ndarray:
+        """Returns the boolean mask of the flats matching the query conditions."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        if query.only_available:
+            mask &= self.is_available
+        if query.room_amount is not None:
+            mask &= self.room_amounts == query.room_amount
+        if query.min_price is not None:
+            mask &= self.prices >= query.min_price
+        if query.max_price is not None:
+            mask &= self.prices <= query.max_price
+        return mask
+
+    def _select(self, column: str, mask: np.ndarray) -> np.ndarray:
+        order = self._order(column)
+        return order[mask[order]]
+
+    def group_stats(self, column: str, mask: np.ndarray) -> list[GroupStats]:
+        """Aggregates prices and availability of the matching flats by a column.
+
+        :param column: Grouping column, ``room_amount`` or ``floor``.
+        :type column: str
+        :param mask: Mask of the flats to be aggregated.
+        :type mask: np.ndarray
+        :return: Aggregates of every column value, in ascending value order.
+        :rtype: list[GroupStats]
+        """
+        positions = self._select(column, mask)
+        if not len(positions):
+            return []
+
+        keys = getattr(self, f"{column}s")[positions]
+        prices = self.prices[positions]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        counts = np.diff(np.r_[starts, len(keys)])
+        ends = starts + counts - 1
+
+        available_amounts = np.add.reduceat(
+            self.is_available[positions].astype(np.int64), starts
+        )
+        medians = (
+            prices[starts + (counts - 1) // 2] + prices[starts + counts // 2]
+        ) / 2
+        mean_prices = np.add.reduceat(prices, starts) / counts
+        prices_per_room = prices / np.maximum(self.room_amounts[positions], 1)
+        mean_prices_per_room = np.add.reduceat(prices_per_room, starts) / counts
+        return [
+            GroupStats(
+                key=int(keys[starts[i]]),
+                flat_amount=int(counts[i]),
+                available_amount=int(available_amounts[i]),
+                min_price=int(prices[starts[i]]),
+                median_price=float(medians[i]),
+                mean_price=float(mean_prices[i]),
+                max_price=int(prices[ends[i]]),
+                mean_price_per_room=float(mean_prices_per_room[i]),
+            )
+            for i in range(len(starts))
+        ]
+
+    def market_stats(self, query: FlatQuery, price_bins: int = 20) -> MarketStats:
+        """Computes the aggregates of the flats matching the query.
+
+        :param query: Catalogue query.  Its sort and pagination are ignored.
+        :type query: FlatQuery
+        :param price_bins: Amount of equal-width price histogram bins.
+        :type price_bins: int
+        :return: Market aggregates.
+        :rtype: MarketStats
+        """
+        mask = self.mask(query)
+        prices = self.prices[self._select("price", mask)]
+        count = len(prices)
+
+        edges = np.array([])
+        bin_counts = np.array([], dtype=np.int64)
+        median_price = 0.0
+        if count:
+            median_price = (prices[(count - 1) // 2] + prices[count // 2]) / 2
+            low, high = prices[0], prices[-1]
+            if low == high:
+                low, high = low - 0.5, high + 0.5
+            edges = np.linspace(low, high, price_bins + 1)
+            inner_bounds = np.searchsorted(prices, edges[1:-1], side="left")
+            bin_counts = np.diff(np.r_[0, inner_bounds, count])
+
+        return MarketStats(
+            flat_amount=count,
+            available_amount=int(np.count_nonzero(self.is_available[mask])),
+            median_price=float(median_price),
+            by_room_amount=tuple(self.group_stats("room_amount", mask)),
+            by_floor=tuple(self.group_stats("floor", mask)),
+            price_bin_edges=tuple(int(edge) for edge in np.rint(edges)),
+            price_bin_counts=tuple(int(amount) for amount in bin_counts),
+        )
+
+
+class TableFlatColumns:
+    """Columnar read model kept in sync with the resident flats and owners tables.
+
+    Ownership changes flip the availability of one flat in place, other
+    changes rebuild the columns on next read.  The columns are only read
+    under the lock, so a trade never changes them in the middle of a query.
+
+    The table listeners take the lock while the table lock is held, so the
+    tables are read without it.  Ownership changes notified meanwhile are
+    applied over the rows read, other changes restart the read.
+    """
+
+    def __init__(self, flats: LocalTable, owners: LocalTable) -> None:
+        self._flats = flats
+        self._owners = owners
+        self._lock = threading.Lock()
+        self._columns: FlatColumns | None = None
+        self._version = 0
+        # Availability of the flats changed since the columns were dropped.
+        self._pending: dict[Hashable, bool] = {}
+
+        flats.add_listener(self._on_flat_changed)
+        owners.add_listener(self._on_ownership_changed)
+
+    def _on_flat_changed(
+        self, key: Hashable, old_row: dict | None, new_row: dict | None
+    ) -> None:
+        with self._lock:
+            self._drop()
+
+    def _on_ownership_changed(
+        self, key: Hashable, old_row: dict | None, new_row: dict | None
+    ) -> None:
+        with self._lock:
+            if key is None:
+                self._drop()
+                return
+
+            columns = self._columns
+            if columns is None:
+                self._pending[key] = new_row is None
+                return
+
+            position = columns.position(key)
+            if position is None:
+                self._drop()
+            else:
+                columns.is_available[position] = new_row is None
+
+    def _drop(self) -> None:
+        # The changes recorded so far precede any read started afterwards.
+        self._columns = None
+        self._version += 1
+        self._pending = {}
+
+    def _build(self) -> None:
+        self._flats.keys()
+        self._owners.keys()
+        while True:
+            with self._lock:
+                if self._columns is not None:
+                    return
+                version = self._version
+
+            sold_flat_ids = {
+                flat_id for (flat_id,) in self._owners.select(("flat_id",))
+            }
+            rows = sorted(
+                (*values, values[0] not in sold_flat_ids)
+                for values in self._flats.select(
+                    ("id", "number", "floor", "room_amount", "price", "address")
+                )
+            )
+            columns = FlatColumns.from_rows(rows)
+
+            with self._lock:
+                if self._columns is not None:
+                    return
+                if self._version != version:
+                    continue
+
+                for flat_id, is_available in self._pending.items():
+                    position = columns.position(flat_id)
+                    if position is not None:
+                        columns.is_available[position] = is_available
+                self._pending = {}
+                self._columns = columns
+                return
+
+    def market_stats(self, query: FlatQuery, price_bins: int = 20) -> MarketStats:
+        """Computes the market aggregates, see :meth:`FlatColumns.market_stats`."""
+        while True:
+            self._build()
+            with self._lock:
+                # The columns may have been dropped again since the build.
+                if self._columns is not None:
+                    return self._columns.market_stats(query, price_bins)
+
+
+class SqliteFlatColumns:
+    """Columnar read model of an SQLite database.
+
+    It reads through its own connection, whose ``data_version`` changes on
+    every commit made by the other connections, and rebuilds the columns on
+    the first read after one.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection]) -> None:
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._data_version: int | None = None
+        self._columns: FlatColumns | None = None
+
+    def market_stats(self, query: FlatQuery, price_bins: int = 20) -> MarketStats:
+        """Computes the market aggregates, see :meth:`FlatColumns.market_stats`."""
+        return self.snapshot().market_stats(query, price_bins)
+
+    def snapshot(self) -> FlatColumns:
+        """Returns the current columns, rebuilding them after a commit."""
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+
+            (data_version,) = self._connection.execute("PRAGMA data_version").fetchone()
+            if self._columns is None or data_version != self._data_version:
+                rows = self._connection.execute(
+                    "SELECT flats.id, number, floor, room_amount, price, address,"
+                    " owners.flat_id IS NULL FROM flats"
+                    " LEFT JOIN owners ON owners.flat_id = flats.id"
+                    " ORDER BY flats.id"
+                ).fetchall()
+                self._columns = FlatColumns.from_rows(rows)
+                self._data_version = data_version
+            return self._columns
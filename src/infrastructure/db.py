@@ -1,229 +1,419 @@
-import pandas as pd
+import threading
+from collections.abc import Callable, Iterator, Mapping, Sequence
+from typing import TYPE_CHECKING
 
 from application.exceptions import (
+    FlatAlreadyExists,
     FlatNotFound,
-    InvalidCredentials,
+    ItemAlreadySold,
     NotAnOwnerError,
+    TransactionConflict,
     UsernameTaken,
     UserNotFound,
 )
+from application.metrics import instrumented
 from application.ports import MarketDatabaseRepository, UserDatabaseRepository
-from domain.entities import Flat, User, UserProperty
+from domain.entities import Flat, FlatPage, User, UserProperty
 from domain.exceptions import NotEnoughMoney
-import csv
+from domain.value_objects import FlatFacets, FlatQuery, MarketStats
 
- 
+from .catalogue import FlatCatalogue
+from .journal import LocalStorage
+from .schema import FLATS_SCHEMA, OWNERS_SCHEMA, USERS_SCHEMA
+from .tables import LocalTable, MultiIndex, UniqueIndex
+from .transactions import Transaction
+
+if TYPE_CHECKING:
+    from .columnar import TableFlatColumns
 
 USERS_LOCAL_TABLE_PATH = "data/db/users.csv"
 FLATS_LOCAL_TABLE_PATH = "data/db/flats.csv"
 OWNERS_LOCAL_TABLE_PATH = "data/db/owners.csv"
+JOURNAL_LOCAL_PATH = "data/db/journal.log"
+LOCK_LOCAL_PATH = "data/db/tables.lock"
+VERSIONS_LOCAL_PATH = "data/db/versions"
+TRANSACTION_ATTEMPTS = 10
 
+USERS_TABLE = LocalTable(
+    USERS_LOCAL_TABLE_PATH, USERS_SCHEMA, indexes=(UniqueIndex("username"),)
+)
+FLATS_TABLE = LocalTable(FLATS_LOCAL_TABLE_PATH, FLATS_SCHEMA)
+OWNERS_TABLE = LocalTable(
+    OWNERS_LOCAL_TABLE_PATH, OWNERS_SCHEMA, indexes=(MultiIndex("user_id"),)
+)
+# Columns read to build the entities, in the order of their fields.
+USER_COLUMNS = ("id", "username", "balance")
+FLAT_COLUMNS = ("id", "address", "number", "floor", "room_amount", "price")
 
-class LocalUserDatabase(UserDatabaseRepository):
-    def register(self, username: str, password_hash: str) -> None:
-        df_users = pd.read_csv(USERS_LOCAL_TABLE_PATH)
+CATALOGUE = FlatCatalogue(FLATS_TABLE, OWNERS_TABLE)
+
+_catalogue_columns: "TableFlatColumns | None" = None
+_catalogue_columns_lock = threading.Lock()
+
+
+def get_catalogue_columns() -> "TableFlatColumns":
+    """Returns the columnar read model of the catalogue, creating it once.
+
+    It is created on first use, so that numpy and pandas are only imported
+    by the processes serving the market statistics.
 
-        if username in df_users["username"].values:
-            raise UsernameTaken("This username is not available")
+    :return: Columnar read model of the flats.
+    :rtype: TableFlatColumns
+    """
+    global _catalogue_columns
 
-        df_new_user = pd.DataFrame(
-            [
+    if _catalogue_columns is not None:
+        return _catalogue_columns
+
+    with _catalogue_columns_lock:
+        if _catalogue_columns is None:
+            from .columnar import TableFlatColumns
+
+            _catalogue_columns = TableFlatColumns(FLATS_TABLE, OWNERS_TABLE)
+    return _catalogue_columns
+
+
+def _apply_record(record: dict) -> None:
+    match record["op"]:
+        case "register":
+            USERS_TABLE.insert(
                 {
-                    "id": max(df_users["id"]) + 1,
-                    "username": username,
-                    "password_hash": password_hash,
+                    "id": record["user_id"],
+                    "username": record["username"],
+                    "password_hash": record["password_hash"],
                     "balance": 0,
                 }
-            ]
+            )
+        case "deposit":
+            USERS_TABLE.update(record["user_id"], balance=record["balance"])
+        case "profile_edit":
+            changes = {
+                column: record[column]
+                for column in ("username", "password_hash")
+                if column in record
+            }
+            USERS_TABLE.update(record["user_id"], **changes)
+        case "purchase":
+            USERS_TABLE.update(record["user_id"], balance=record["balance"])
+            OWNERS_TABLE.insert(
+                {"user_id": record["user_id"], "flat_id": record["flat_id"]}
+            )
+            FLATS_TABLE.touch(record["flat_id"])
+        case "sale":
+            USERS_TABLE.update(record["user_id"], balance=record["balance"])
+            if OWNERS_TABLE.get(record["flat_id"]) is not None:
+                OWNERS_TABLE.delete(record["flat_id"])
+            FLATS_TABLE.touch(record["flat_id"])
+        case "flat_import":
+            FLATS_TABLE.insert_many(record["flats"])
+        case "price_update":
+            FLATS_TABLE.update_many(
+                {flat_id: {"price": price} for flat_id, price in record["prices"]}
+            )
+        case "bulk_deposit":
+            USERS_TABLE.update_many(
+                {
+                    user_id: {"balance": balance}
+                    for user_id, _, balance in record["balances"]
+                }
+            )
+
+
+STORAGE = LocalStorage(
+    tables=(USERS_TABLE, FLATS_TABLE, OWNERS_TABLE),
+    apply=_apply_record,
+    journal_path=JOURNAL_LOCAL_PATH,
+    lock_path=LOCK_LOCAL_PATH,
+    versions_path=VERSIONS_LOCAL_PATH,
+)
+
+
+def _run_transaction(body: Callable[[Transaction], dict | None]) -> None:
+    """Builds a mutation record in a transaction and commits it.
+
+    The body is repeated in a new transaction when the commit conflicts with a
+    concurrent one.
+
+    :param body: Callable reading the data through the transaction, checking
+        preconditions and returning the record (or None if nothing changes).
+    :type body: Callable[[Transaction], dict | None]
+    :raises TransactionConflict: Raised when every attempt conflicted.
+    """
+    for _ in range(TRANSACTION_ATTEMPTS):
+        transaction = Transaction()
+        record = body(transaction)
+        if record is None:
+            return
+
+        try:
+            STORAGE.commit(record, transaction)
+            return
+        except TransactionConflict:
+            continue
+
+    raise TransactionConflict("Too many concurrent updates, try again later")
+
+
+def _get_user_row(user_id: int, transaction: Transaction | None = None) -> dict:
+    if transaction is not None:
+        user_data = transaction.read(USERS_TABLE, user_id)
+    else:
+        user_data = USERS_TABLE.get(user_id)
+
+    if user_data is None:
+        raise UserNotFound(f"User not found. ID: {user_id}")
+
+    return user_data
+
+
+def _get_flat_row(flat_id: int, transaction: Transaction | None = None) -> dict:
+    if transaction is not None:
+        flat_data = transaction.read(FLATS_TABLE, flat_id)
+    else:
+        flat_data = FLATS_TABLE.get(flat_id)
+
+    if flat_data is None:
+        raise FlatNotFound(f"Flat not found. ID: {flat_id}")
+
+    return flat_data
+
+
+def _check_username_available(username: str, user_id: int) -> None:
+    owner_id = USERS_TABLE.find("username", username)
+    if owner_id is not None and owner_id != user_id:
+        raise UsernameTaken("This username is not available")
+
+
+def _make_flat(flat_data: dict, is_available: bool) -> Flat:
+    return Flat(
+        flat_data["id"],
+        flat_data["address"],
+        flat_data["number"],
+        flat_data["floor"],
+        flat_data["room_amount"],
+        flat_data["price"],
+        is_available,
+    )
+
+
+def _read_flat(flat_id: int) -> tuple | None:
+    return FLATS_TABLE.get_values(flat_id, FLAT_COLUMNS)
+
+
+@instrumented
+class LocalUserDatabase(UserDatabaseRepository):
+    def __init__(self) -> None:
+        STORAGE.open()
+
+    def register(self, username: str, password_hash: str) -> None:
+        def register_user(transaction: Transaction) -> dict:
+            user_id = (USERS_TABLE.max_key() or 0) + 1
+            transaction.read(USERS_TABLE, user_id)
+            transaction.check(
+                f"username:{username}",
+                lambda: _check_username_available(username, user_id),
+            )
+            return {
+                "op": "register",
+                "user_id": user_id,
+                "username": username,
+                "password_hash": password_hash,
+            }
+
+        _run_transaction(register_user)
+
+    def get_credentials(self, username: str) -> tuple[int, str]:
+        user_id = USERS_TABLE.find("username", username)
+        user_data = (
+            USERS_TABLE.get_values(user_id, ("password_hash",))
+            if user_id is not None
+            else None
         )
-        df_users = pd.concat([df_users, df_new_user], ignore_index=True)
-        df_users.to_csv(USERS_LOCAL_TABLE_PATH, index=False)
-
-    def login(self, username: str, password_hash: str) -> int:
-        df_users = pd.read_csv(USERS_LOCAL_TABLE_PATH)
-        user_data = df_users[
-            (df_users["username"] == username)
-            & (df_users["password_hash"] == password_hash)
-        ]
 
-        if user_data.empty:
-            raise InvalidCredentials("Invalid credentials")
+        if user_data is None:
+            raise UserNotFound(f"User not found. Username: {username}")
 
-        user_id = user_data["id"].values[0]
-        return user_id
+        return user_id, user_data[0]
 
     def get_user(self, user_id: int) -> User:
-        df_users = pd.read_csv(USERS_LOCAL_TABLE_PATH)
-        user_data = df_users[df_users["id"] == user_id]
-
-        if user_data.empty:
+        user_data = USERS_TABLE.get_values(user_id, USER_COLUMNS)
+        if user_data is None:
             raise UserNotFound(f"User not found. ID: {user_id}")
 
-        user = User(
-            id=user_data["id"].values[0],
-            username=user_data["username"].values[0],
-            balance=user_data["balance"].values[0],
-        )
+        user = User(*user_data)
         return user
 
     def get_property(self, user_id: int) -> UserProperty:
-        df_flats = pd.read_csv(FLATS_LOCAL_TABLE_PATH)
-        df_owners = pd.read_csv(OWNERS_LOCAL_TABLE_PATH)
-
-        df_owners = df_owners[df_owners["user_id"] == user_id]
-        df_owners = df_owners.join(df_flats.set_index("id"), on="flat_id")
-
         property_list = []
-        for property_data in df_owners.to_dict(orient="records"):
-            try:
-                flat_id = property_data["flat_id"]
-                address = property_data["address"]
-                number = property_data["number"]
-                floor = property_data["floor"]
-                room_amount = property_data["room_amount"]
-                price = property_data["price"]
-            except KeyError:
+        for flat_id in sorted(OWNERS_TABLE.find("user_id", user_id)):
+            flat_data = _read_flat(flat_id)
+            if flat_data is None:
                 continue
 
-            flat = Flat(
-                id=flat_id,
-                address=address,
-                number=number,
-                floor=floor,
-                room_amount=room_amount,
-                price=price,
-                is_available=False,
-            )
-            property_list.append(flat)
+            property_list.append(Flat(*flat_data, is_available=False))
 
         user_property = UserProperty(user_id, property_list)
         return user_property
 
     def add_money(self, user_id: int, amount: int) -> None:
-        with open(USERS_LOCAL_TABLE_PATH, "r", encoding ="UTF8") as table:
-            read_table = csv.reader(table) 
-            list_table = list(read_table)
-        itog_balance = int(list_table[user_id][3]) + amount
-        list_table[user_id][3] = str(itog_balance) 
-                
-        with open(USERS_LOCAL_TABLE_PATH, "w", encoding ="UTF8" ) as table:
-            writer_table = csv.writer(table)
-            writer_table.writerows(table)
+        def deposit(transaction: Transaction) -> dict:
+            user_data = _get_user_row(user_id, transaction)
+            return {
+                "op": "deposit",
+                "user_id": user_id,
+                "amount": amount,
+                "balance": user_data["balance"] + amount,
+            }
+
+        _run_transaction(deposit)
+
+    def iter_users(self, chunk_size: int = 1000) -> Iterator[User]:
+        for chunk in USERS_TABLE.scan(chunk_size):
+            for user_data in chunk:
+                yield User(
+                    id=user_data["id"],
+                    username=user_data["username"],
+                    balance=user_data["balance"],
+                )
+
+    def iter_ownership(self, chunk_size: int = 1000) -> Iterator[tuple[int, int]]:
+        for chunk in OWNERS_TABLE.scan(chunk_size):
+            for ownership_data in chunk:
+                yield ownership_data["user_id"], ownership_data["flat_id"]
 
     def edit_profile(self, user_id: int, new_username, new_password_hash: str) -> None:
-        with open(USERS_LOCAL_TABLE_PATH, "r", encoding="UTF-8") as table:
-            read_table = csv.reader(table)
-            list_table = list(read_table)
-        if new_username is not None: 
-            list_table[user_id][1] = new_username 
-        if new_password_hash is not None:
-            list_table[user_id][2] = new_password_hash 
-        
-        with open(USERS_LOCAL_TABLE_PATH, "w", encoding="UTF8-") as table:
-            writer_table = csv.writer(table)
-            writer_table.writerows(table) 
+        def edit(transaction: Transaction) -> dict | None:
+            _get_user_row(user_id, transaction)
+
+            record = {"op": "profile_edit", "user_id": user_id}
+            if new_username:
+                transaction.check(
+                    f"username:{new_username}",
+                    lambda: _check_username_available(new_username, user_id),
+                )
+                record["username"] = new_username
+            if new_password_hash:
+                record["password_hash"] = new_password_hash
+
+            return record if len(record) > 2 else None
+
+        _run_transaction(edit)
+
+    def deposit_many(self, amounts: Mapping[int, int]) -> None:
+        def deposit(transaction: Transaction) -> dict:
+            balances = [
+                (user_id, amount, _get_user_row(user_id, transaction)["balance"])
+                for user_id, amount in amounts.items()
+            ]
+            return {
+                "op": "bulk_deposit",
+                "balances": [
+                    (user_id, amount, balance + amount)
+                    for user_id, amount, balance in balances
+                ],
+            }
 
+        _run_transaction(deposit)
 
+
+@instrumented
 class LocalMarketDatabase(MarketDatabaseRepository):
+    def __init__(self) -> None:
+        STORAGE.open()
+
     def get_flat_list(self) -> list[Flat]:
-        df_flats = pd.read_csv(FLATS_LOCAL_TABLE_PATH)
-        df_owners = pd.read_csv(OWNERS_LOCAL_TABLE_PATH)
-
-        sold_flat_ids = df_owners["flat_id"].tolist()
-        flat_info_list = []
-        for flat_data in df_flats.to_dict(orient="records"):
-            try:
-                flat_id = flat_data["id"]
-                address = flat_data["address"]
-                floor = flat_data["floor"]
-                number = flat_data["number"]
-                room_amount = flat_data["room_amount"]
-                price = flat_data["price"]
-            except KeyError:
-                continue
+        sold_flat_ids = OWNERS_TABLE.keys()
+        return [
+            Flat(*flat_data, is_available=flat_data[0] not in sold_flat_ids)
+            for flat_data in FLATS_TABLE.select(FLAT_COLUMNS)
+        ]
 
-            flat_info = Flat(
-                id=flat_id,
-                address=address,
-                floor=floor,
-                number=number,
-                room_amount=room_amount,
-                price=price,
-                is_available=flat_id not in sold_flat_ids,
-            )
-            flat_info_list.append(flat_info)
-        return flat_info_list
+    def find_flats(self, query: FlatQuery) -> FlatPage:
+        flat_ids, total = CATALOGUE.find(query)
+        sold_flat_ids = OWNERS_TABLE.keys()
+        flats = [
+            Flat(*_read_flat(flat_id), is_available=flat_id not in sold_flat_ids)
+            for flat_id in flat_ids
+        ]
+        return FlatPage(flats, total=total, offset=query.offset, limit=query.limit)
 
-    def get_flat(self, flat_id: int) -> Flat:
-        df_flats = pd.read_csv(FLATS_LOCAL_TABLE_PATH)
-        df_owners = pd.read_csv(OWNERS_LOCAL_TABLE_PATH)
+    def get_flat_facets(self, query: FlatQuery) -> FlatFacets:
+        return CATALOGUE.facets(query)
 
-        flat_data = df_flats[df_flats["id"] == flat_id]
-        sold_flat_ids = df_owners["flat_id"].tolist()
+    def get_market_stats(self, query: FlatQuery, price_bins: int = 20) -> MarketStats:
+        return get_catalogue_columns().market_stats(query, price_bins)
 
-        try:
-            flat_id = flat_data["id"].values[0]
-            address = flat_data["address"].values[0]
-            number = flat_data["number"].values[0]
-            floor = flat_data["floor"].values[0]
-            room_amount = flat_data["room_amount"].values[0]
-            price = flat_data["price"].values[0]
-        except KeyError:
+    def get_flat(self, flat_id: int) -> Flat:
+        flat_data = _read_flat(flat_id)
+        if flat_data is None:
             raise FlatNotFound(f"Flat not found. ID: {flat_id}")
 
-        flat = Flat(
-            id=flat_id,
-            address=address,
-            number=number,
-            floor=floor,
-            room_amount=room_amount,
-            price=price,
-            is_available=flat_id not in sold_flat_ids,
-        )
-        return flat
+        return Flat(*flat_data, is_available=flat_id not in OWNERS_TABLE.keys())
 
     def purchase_flat(self, user_id: int, flat_id: int) -> None:
-        df_users = pd.read_csv(USERS_LOCAL_TABLE_PATH)
-        df_flats = pd.read_csv(FLATS_LOCAL_TABLE_PATH)
-        df_owners = pd.read_csv(OWNERS_LOCAL_TABLE_PATH)
+        def purchase(transaction: Transaction) -> dict:
+            user_data = _get_user_row(user_id, transaction)
+            flat_data = _get_flat_row(flat_id, transaction)
 
-        user_data = df_users[df_users["id"] == user_id]
-        flat_data = df_flats[df_flats["id"] == flat_id]
+            if OWNERS_TABLE.get(flat_id) is not None:
+                raise ItemAlreadySold(f"Flat is already sold. ID: {flat_id}")
 
-        user_balance = user_data["balance"].values[0]
-        flat_price = flat_data["price"].values[0]
+            user_balance = user_data["balance"]
+            flat_price = flat_data["price"]
 
-        if user_balance < flat_price:
-            raise NotEnoughMoney(f"User does not have enough money. ID: {user_id}")
+            if user_balance < flat_price:
+                raise NotEnoughMoney(f"User does not have enough money. ID: {user_id}")
 
-        df_users.loc[df_users["id"] == user_id, "balance"] = user_balance - flat_price
-        df_owners_new = pd.DataFrame([{"user_id": user_id, "flat_id": flat_id}])
-        df_owners = pd.concat([df_owners, df_owners_new], ignore_index=True)
+            return {
+                "op": "purchase",
+                "user_id": user_id,
+                "flat_id": flat_id,
+                "balance": user_balance - flat_price,
+            }
 
-        df_users.to_csv(USERS_LOCAL_TABLE_PATH, index=False)
-        df_owners.to_csv(OWNERS_LOCAL_TABLE_PATH, index=False)
+        _run_transaction(purchase)
 
     def sell_flat(self, user_id: int, flat_id: int) -> None:
-        df_users = pd.read_csv(USERS_LOCAL_TABLE_PATH)
-        df_flats = pd.read_csv(FLATS_LOCAL_TABLE_PATH)
-        df_owners = pd.read_csv(OWNERS_LOCAL_TABLE_PATH)
-
-        ownership_data = df_owners[
-            (df_owners["user_id"] == user_id) & (df_owners["flat_id"] == flat_id)
-        ]
-        if ownership_data.empty:
-            raise NotAnOwnerError("User is not the owner of the property")
+        def sale(transaction: Transaction) -> dict:
+            user_data = _get_user_row(user_id, transaction)
+            flat_data = _get_flat_row(flat_id, transaction)
+
+            ownership_data = OWNERS_TABLE.get(flat_id)
+            if ownership_data is None or ownership_data["user_id"] != user_id:
+                raise NotAnOwnerError("User is not the owner of the property")
+
+            return {
+                "op": "sale",
+                "user_id": user_id,
+                "flat_id": flat_id,
+                "balance": user_data["balance"] + flat_data["price"],
+            }
+
+        _run_transaction(sale)
+
+    def import_flats(self, flats: Sequence[Flat]) -> None:
+        def import_rows(transaction: Transaction) -> dict:
+            rows = {}
+            for flat in flats:
+                if flat.id in rows or transaction.read(FLATS_TABLE, flat.id):
+                    raise FlatAlreadyExists(f"Flat already exists. ID: {flat.id}")
+                rows[flat.id] = {
+                    column: getattr(flat, column) for column in FLATS_TABLE.columns
+                }
+            return {"op": "flat_import", "flats": list(rows.values())}
 
-        user_data = df_users[df_users["id"] == user_id]
-        flat_data = df_flats[df_flats["id"] == flat_id]
+        _run_transaction(import_rows)
 
-        user_balance = user_data["balance"].values[0]
-        flat_price = flat_data["price"].values[0]
+    def update_prices(self, prices: Mapping[int, int]) -> None:
+        def update(transaction: Transaction) -> dict:
+            for flat_id in prices:
+                _get_flat_row(flat_id, transaction)
+            return {"op": "price_update", "prices": list(prices.items())}
 
-        df_users.loc[df_users["id"] == user_id, "balance"] = user_balance + flat_price
-        df_owners = df_owners[
-            (df_owners["user_id"] != user_id) | (df_owners["flat_id"] != flat_id)
-        ]
+        _run_transaction(update)
 
-        df_users.to_csv(USERS_LOCAL_TABLE_PATH, index=False)
-        df_owners.to_csv(OWNERS_LOCAL_TABLE_PATH, index=False)
+    def iter_flats(self, chunk_size: int = 1000) -> Iterator[Flat]:
+        sold_flat_ids = OWNERS_TABLE.keys()
+        for chunk in FLATS_TABLE.scan(chunk_size):
+            for flat_data in chunk:
+                yield _make_flat(flat_data, flat_data["id"] not in sold_flat_ids)
@@ -0,0 +1,516 @@
+import json
+import os
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager, nullcontext
+
+from application.metrics import METRICS
+
+from .tables import LocalTable
+from .transactions import RowLocks, Transaction
+from .versions import SharedVersions
+
+
+class Journal:
+    """Append-only log of repository mutations stored as JSON lines.
+
+    Syncs are group-committed: a writer waits until its record is fsynced, and
+    a single fsync covers every record written before it, so concurrent
+    writers share the cost of syncing.
+    """
+
+    def __init__(self, path: str, durable: bool = True) -> None:
+        self.path = path
+        self._durable = durable
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._file = None
+        self._written = 0
+        self._synced = 0
+        self.record_count = 0
+
+    def open(self) -> None:
+        self._file = open(self.path, "a", encoding="UTF-8")
+
+    def close(self) -> None:
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def reopen(self) -> None:
+        """Switches to the file at the log path, after it was rotated elsewhere."""
+        with self._write_lock:
+            self._file.close()
+            self._file = open(self.path, "a", encoding="UTF-8")
+            self.record_count = 0
+
+    def position(self) -> tuple[int, int]:
+        """Returns the inode of the log file and its size with the written
+        records, as expected by :meth:`tail`.
+        """
+        with self._write_lock:
+            stat = os.fstat(self._file.fileno())
+        return stat.st_ino, stat.st_size
+
+    def append(self, record: dict) -> int:
+        """Writes the record to the end of the log.
+
+        The record is not guaranteed to be on disk until :meth:`sync` is called
+        with the returned position.
+
+        :param record: JSON-serializable mutation record.
+        :type record: dict
+        :return: Position of the record in the log.
+        :rtype: int
+        """
+        line = json.dumps(record, ensure_ascii=False)
+        with self._write_lock:
+            self._file.write(f"{line}\n")
+            self._file.flush()
+            self._written += 1
+            self.record_count += 1
+            position = self._written
+        if METRICS.enabled:
+            METRICS.increment(
+                "io_bytes_total",
+                len(line.encode()) + 1,
+                direction="write",
+                file="journal",
+            )
+        return position
+
+    def sync(self, position: int) -> None:
+        """Waits until the log is durable up to the passed position.
+
+        :param position: Position returned by :meth:`append`.
+        :type position: int
+        """
+        if not self._durable:
+            return
+
+        with self._sync_lock:
+            if self._synced >= position:
+                return
+
+            with self._write_lock:
+                target = self._written
+                file_descriptor = self._file.fileno()
+            with METRICS.span("Journal.fsync"):
+                os.fsync(file_descriptor)
+            self._synced = max(self._synced, target)
+
+    def rotate(self, archive_path: str) -> None:
+        """Moves the current log aside and starts a new empty one.
+
+        :param archive_path: Path the current log is renamed to.
+        :type archive_path: str
+        """
+        with self._write_lock:
+            self._file.flush()
+            if self._durable:
+                os.fsync(self._file.fileno())
+            self._synced = self._written
+            self._file.close()
+            os.replace(self.path, archive_path)
+            self._file = open(self.path, "a", encoding="UTF-8")
+            self.record_count = 0
+
+    @staticmethod
+    def read(path: str) -> Iterator[dict]:
+        """Iterates over the records of a log file.
+
+        A torn record at the end of the file, left by a crash in the middle of
+        an append, is skipped.
+
+        :param path: Path to the log file.
+        :type path: str
+        """
+        if not os.path.exists(path):
+            return
+
+        METRICS.increment(
+            "io_bytes_total", os.path.getsize(path), direction="read", file="journal"
+        )
+        with open(path, "r", encoding="UTF-8") as log:
+            for line in log:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+
+    @staticmethod
+    def tail(
+        path: str, offset: int = 0, inode: int | None = None
+    ) -> tuple[int, list[dict], int] | None:
+        """Reads the complete records written to a log file after the offset.
+
+        :param path: Path to the log file.
+        :type path: str
+        :param offset: Position in bytes to read from.
+        :type offset: int
+        :param inode: Inode the file is expected to have, None for any.
+        :type inode: int | None
+        :return: Inode of the file, the records and the position after them, or
+            None if there is no such file.
+        :rtype: tuple[int, list[dict], int] | None
+        """
+        try:
+            log = open(path, "rb")
+        except FileNotFoundError:
+            return None
+
+        with log:
+            file_inode = os.fstat(log.fileno()).st_ino
+            if inode is not None and file_inode != inode:
+                return None
+
+            log.seek(offset)
+            data = log.read()
+        end = data.rfind(b"\n") + 1
+        if end:
+            METRICS.increment("io_bytes_total", end, direction="read", file="journal")
+        records = [json.loads(line) for line in data[:end].splitlines()]
+        return file_inode, records, offset + end
+
+
+class LocalStorage:
+    """Coordinates mutations of the resident tables and their persistence.
+
+    Every mutation is described by a record which is applied to the tables in
+    memory by the ``apply`` callback.  Records must carry resulting values
+    (e.g. a new balance, not a delta), so that applying one twice is harmless.
+
+    Without a journal, the touched tables are rewritten on each commit.  With
+    a journal, a commit is a single append to the log, and the tables are
+    written out as snapshot CSV files by a background compaction once the log
+    grows past ``compact_after`` records.  On startup the snapshot is loaded
+    and the log is replayed over it.
+
+    With ``versions_path``, several processes may share the data directory.
+    Every commit increments the shared counters of the tables it has written
+    to, and a read first compares the counter of its table with the one seen
+    by the process.  When they differ, the records appended to the journal by
+    the other processes are applied, or without a journal the changed tables
+    are loaded again.
+    """
+
+    def __init__(
+        self,
+        tables: Iterable[LocalTable],
+        apply: Callable[[dict], None],
+        journal_path: str | None = None,
+        compact_after: int = 10_000,
+        durable: bool = True,
+        lock_path: str | None = None,
+        versions_path: str | None = None,
+    ) -> None:
+        self._tables = tuple(tables)
+        self._row_locks = RowLocks(lock_path)
+        self._apply = apply
+        self._journal = Journal(journal_path, durable) if journal_path else None
+        self._compact_after = compact_after
+        self._lock = threading.RLock()
+        self._compaction: threading.Thread | None = None
+        self._opened = False
+
+        self._versions: SharedVersions | None = None
+        if versions_path and SharedVersions.supported():
+            self._versions = SharedVersions(
+                versions_path, [table.name for table in self._tables]
+            )
+        self._table_indexes = {
+            table: index for index, table in enumerate(self._tables, 1)
+        }
+        self._origin = os.urandom(4).hex()
+        self._seen: tuple[int, ...] = ()
+        self._position: tuple[int | None, int] = (None, 0)
+        self._generation = 0
+        self._tail_lock = threading.Lock()
+        self._local = threading.local()
+
+        if self._journal is not None or self._versions is not None:
+            for table in self._tables:
+                table.watch = False
+        if self._versions is not None:
+            for table in self._tables:
+                table.before_read = self._sync
+
+    @property
+    def _archive_path(self) -> str:
+        return f"{self._journal.path}.old"
+
+    @contextmanager
+    def _applying(self) -> Iterator[None]:
+        """Marks the thread as applying records, so that its reads do not sync."""
+        applying = getattr(self._local, "applying", False)
+        self._local.applying = True
+        try:
+            yield
+        finally:
+            self._local.applying = applying
+
+    def open(self) -> None:
+        """Loads the tables and replays the journal over them."""
+        if self._opened:
+            return
+
+        with self._lock:
+            if self._opened:
+                return
+
+            if self._versions is not None:
+                self._open_shared()
+            elif self._journal is not None:
+                replayed = 0
+                for path in (self._archive_path, self._journal.path):
+                    for record in Journal.read(path):
+                        self._apply(record)
+                        replayed += 1
+                if replayed:
+                    self._write_snapshot([table.snapshot() for table in self._tables])
+                    if os.path.exists(self._journal.path):
+                        os.remove(self._journal.path)
+                self._journal.open()
+            self._opened = True
+
+    def _open_shared(self) -> None:
+        # Other processes may be appending to the journal, so it is replayed
+        # but kept.  An archive left by a compaction which has not finished
+        # is written out here, unless its process is still writing it.
+        self._versions.open()
+        with self._tail_lock, self._versions.locked():
+            self._reload()
+            if self._journal is None:
+                return
+
+            self._journal.open()
+            self._generation = self._versions.generation()
+            if os.path.exists(self._archive_path) and self._versions.compact_lock(
+                blocking=False
+            ):
+                self._write_snapshot([table.snapshot() for table in self._tables])
+
+    def _reload(self) -> None:
+        """Discards the tables, to be parsed again on next access, and replays
+        the journal over them.  Call under the tail and shared locks.
+        """
+        with self._applying():
+            for table in self._tables:
+                table.invalidate()
+
+            if self._journal is not None:
+                self._position = (None, 0)
+                for path in (self._archive_path, self._journal.path):
+                    tail = Journal.tail(path)
+                    if tail is not None:
+                        for record in tail[1]:
+                            self._apply(record)
+                if tail is not None:
+                    self._position = tail[0], tail[2]
+        self._seen = self._versions.read()
+
+    def _sync(self, table: LocalTable) -> None:
+        """Applies the changes of other processes if the table has any."""
+        if not self._opened:
+            return
+
+        index = self._table_indexes[table]
+        if self._versions.counter(index) == self._seen[index]:
+            return
+        if not getattr(self._local, "applying", False):
+            with self._tail_lock:
+                self._catch_up()
+
+    def _catch_up(self) -> None:
+        """Applies the changes of other processes.  Call under the tail lock."""
+        counters = self._versions.read()
+        if counters[1:] == self._seen[1:]:
+            return
+
+        if self._journal is None:
+            with self._applying():
+                for table, seen, counter in zip(
+                    self._tables, self._seen[1:], counters[1:]
+                ):
+                    if seen != counter:
+                        table.invalidate()
+        else:
+            self._read_journal()
+        self._seen = counters
+
+    def _read_journal(self) -> None:
+        inode, offset = self._position
+        tail = Journal.tail(self._journal.path, offset, inode)
+        if tail is None:
+            # The journal was rotated, the rest of the one being read is in
+            # the archive unless it was rotated again.  Rotations wait for the
+            # shared lock, and so does the removal of the archive.
+            with self._versions.locked():
+                archived = Journal.tail(self._archive_path, offset, inode)
+                tail = Journal.tail(self._journal.path)
+                if archived is None or tail is None:
+                    self._reload()
+                    return
+                self._apply_foreign(archived[1])
+
+        self._apply_foreign(tail[1])
+        self._position = tail[0], tail[2]
+
+    def _apply_foreign(self, records: list[dict]) -> None:
+        with self._applying():
+            for record in records:
+                if record.get("origin") != self._origin:
+                    self._apply(record)
+
+    def commit(self, record: dict, transaction: Transaction | None = None) -> None:
+        """Durably records the mutation and applies it to the tables.
+
+        :param record: Mutation record.  Its preconditions must be checked by
+            the caller, applying it must not fail.
+        :type record: dict
+        :param transaction: Transaction the record was built in.  It is
+            validated atomically with the write.
+        :type transaction: Transaction | None
+        :raises TransactionConflict: Raised when the transaction rows were
+            changed concurrently.
+        """
+        self.open()
+        lock_names = transaction.lock_names if transaction is not None else ()
+        with self._row_locks.hold(lock_names):
+            if self._versions is not None:
+                position = self._commit_shared(record, transaction)
+            else:
+                if transaction is not None:
+                    transaction.validate()
+
+                if self._journal is None:
+                    with self._lock:
+                        self._apply(record)
+                        for table in self._tables:
+                            if table.dirty:
+                                table.save()
+                    return
+
+                with self._lock:
+                    position = self._journal.append(record)
+                    self._apply(record)
+
+            if self._journal is None:
+                return
+            if self._journal.record_count >= self._compact_after:
+                self.compact(wait=False)
+        self._journal.sync(position)
+
+    def _commit_shared(
+        self, record: dict, transaction: Transaction | None
+    ) -> int | None:
+        # The transaction is validated under its row locks only.  Reading the
+        # row versions applies the changes of other processes first, and any
+        # change to its rows was committed before the locks were taken.  Only
+        # the append and the counter increment are serialised across the
+        # processes, so that the records are applied in the order of the
+        # journal.
+        if transaction is not None:
+            transaction.validate()
+
+        with self._tail_lock, self._versions.locked():
+            self._catch_up()
+            write_counts = [table.write_count for table in self._tables]
+            position = None
+            with self._applying():
+                if self._journal is None:
+                    self._apply(record)
+                    for table in self._tables:
+                        if table.dirty:
+                            table.save()
+                else:
+                    if self._generation != self._versions.generation():
+                        self._journal.reopen()
+                        self._generation = self._versions.generation()
+                    position = self._journal.append({**record, "origin": self._origin})
+                    self._apply(record)
+                    self._position = self._journal.position()
+
+            self._versions.increment(
+                index
+                for index, table in enumerate(self._tables, 1)
+                if table.write_count != write_counts[index - 1]
+            )
+            self._seen = self._versions.read()
+        return position
+
+    def compact(self, wait: bool = True) -> None:
+        """Writes the tables out as snapshot files and truncates the journal.
+
+        :param wait: Whether to wait for the snapshot to be written, or to
+            write it in a background thread.
+        :type wait: bool
+        """
+        if self._journal is None:
+            return
+
+        with self._lock:
+            self.open()
+            if self._compaction is not None and self._compaction.is_alive():
+                if not wait:
+                    return
+                self._compaction.join()
+
+            if self._journal.record_count == 0:
+                return
+
+            if self._versions is None:
+                self._journal.rotate(self._archive_path)
+                snapshots = [table.snapshot() for table in self._tables]
+            else:
+                snapshots = self._rotate_shared()
+                if snapshots is None:
+                    return
+            self._compaction = threading.Thread(
+                target=self._write_snapshot, args=(snapshots,), daemon=True
+            )
+            self._compaction.start()
+
+        if wait:
+            self._compaction.join()
+
+    def _rotate_shared(self) -> list[list[tuple]] | None:
+        # The snapshot must cover the records of every process, so the rest of
+        # the journal is applied while appends wait for the shared lock.  The
+        # compaction lock is held until the archive is removed.
+        with self._tail_lock, self._versions.locked():
+            if not self._versions.compact_lock(blocking=False):
+                return None
+            if os.path.exists(self._archive_path):
+                self._versions.compact_unlock()
+                return None
+
+            if self._generation != self._versions.generation():
+                self._journal.reopen()
+                self._generation = self._versions.generation()
+            self._catch_up()
+
+            self._journal.rotate(self._archive_path)
+            self._versions.increment((0,))
+            self._generation = self._versions.generation()
+            self._position = self._journal.position()
+            return [table.snapshot() for table in self._tables]
+
+    def _write_snapshot(self, snapshots: list[list[tuple]]) -> None:
+        for table, rows in zip(self._tables, snapshots):
+            table.save(rows)
+
+        with self._versions.locked() if self._versions else nullcontext():
+            if os.path.exists(self._archive_path):
+                os.remove(self._archive_path)
+        if self._versions is not None:
+            self._versions.compact_unlock()
+
+    def close(self) -> None:
+        """Compacts the journal and releases the log file."""
+        if self._journal is None or not self._opened:
+            return
+
+        self.compact()
+        self._journal.close()
@@ -0,0 +1,181 @@
+import atexit
+import os
+import threading
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+
+from application.ports import (
+    AsyncMarketDatabaseRepository,
+    AsyncPasswordHasher,
+    AsyncUserDatabaseRepository,
+    MarketDatabaseRepository,
+    PasswordHasher,
+    UserDatabaseRepository,
+)
+from domain.value_objects import FlatQuery
+
+from .async_adapters import (
+    ExecutorMarketDatabase,
+    ExecutorPasswordHasher,
+    ExecutorUserDatabase,
+)
+from .security import PooledHasher, ScryptHasher
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "local")
+METRICS_PORT = os.environ.get("METRICS_PORT")
+
+
+@dataclass
+class Resources:
+    """Repositories and services shared by every session of the server process.
+
+    All of them are safe to be used from several script threads at once.
+    """
+
+    user_repo: UserDatabaseRepository
+    market_repo: MarketDatabaseRepository
+    hasher: PasswordHasher
+    _shutdown_callbacks: list = field(default_factory=list, repr=False)
+
+    def warm_up(self) -> None:
+        """Loads the data, so that the first page render does not pay for it."""
+        self.market_repo.get_flat_facets(FlatQuery())
+
+    def shutdown(self) -> None:
+        """Flushes pending writes and releases files and connections."""
+        while self._shutdown_callbacks:
+            self._shutdown_callbacks.pop()()
+
+
+@dataclass
+class AsyncResources:
+    """Asynchronous repositories and services, bound to one event loop."""
+
+    user_repo: AsyncUserDatabaseRepository
+    market_repo: AsyncMarketDatabaseRepository
+    hasher: AsyncPasswordHasher
+    _close_callbacks: list = field(default_factory=list, repr=False)
+
+    async def close(self) -> None:
+        """Closes the connections opened by the event loop."""
+        while self._close_callbacks:
+            await self._close_callbacks.pop()()
+
+
+def _create_local_resources() -> Resources:
+    from .db import STORAGE, LocalMarketDatabase, LocalUserDatabase
+
+    hasher = PooledHasher(ScryptHasher())
+    resources = Resources(
+        user_repo=LocalUserDatabase(),
+        market_repo=LocalMarketDatabase(),
+        hasher=hasher,
+    )
+    resources._shutdown_callbacks += [hasher.shutdown, STORAGE.close]
+    return resources
+
+
+def _create_sqlite_resources() -> Resources:
+    from .sqlite_db import (
+        SqliteConnectionPool,
+        SqliteMarketDatabase,
+        SqliteUserDatabase,
+    )
+
+    pool = SqliteConnectionPool()
+    hasher = PooledHasher(ScryptHasher())
+    resources = Resources(
+        user_repo=SqliteUserDatabase(pool),
+        market_repo=SqliteMarketDatabase(pool),
+        hasher=hasher,
+    )
+    resources._shutdown_callbacks += [hasher.shutdown, pool.close]
+    return resources
+
+
+_RESOURCE_FACTORIES = {
+    "local": _create_local_resources,
+    "sqlite": _create_sqlite_resources,
+}
+
+_resources: Resources | None = None
+_resources_lock = threading.Lock()
+
+
+def get_resources() -> Resources:
+    """Returns the process-wide resources, creating and warming them up once.
+
+    The backend is chosen by the ``STORAGE_BACKEND`` environment variable:
+    ``local`` (CSV tables, default) or ``sqlite``.  When ``METRICS_PORT`` is
+    set, the process metrics are served on that port.
+
+    :return: Shared resources.
+    :rtype: Resources
+    """
+    global _resources
+
+    if _resources is not None:
+        return _resources
+
+    with _resources_lock:
+        if _resources is None:
+            resources = _RESOURCE_FACTORIES[STORAGE_BACKEND]()
+            if METRICS_PORT:
+                from .metrics_server import start_metrics_server
+
+                server = start_metrics_server(int(METRICS_PORT))
+                resources._shutdown_callbacks += [server.server_close, server.shutdown]
+            resources.warm_up()
+            atexit.register(resources.shutdown)
+            _resources = resources
+    return _resources
+
+
+def shutdown_resources() -> None:
+    """Shuts the process-wide resources down.  They are recreated on next use."""
+    global _resources
+
+    with _resources_lock:
+        if _resources is not None:
+            _resources.shutdown()
+            atexit.unregister(_resources.shutdown)
+            _resources = None
+
+
+def create_async_resources(
+    resources: Resources, executor: Executor | None = None
+) -> AsyncResources:
+    """Creates the asynchronous counterparts of the process-wide resources.
+
+    The ``sqlite`` backend is queried natively through aiosqlite.  The
+    repositories of the ``local`` backend and the hasher are run on the
+    executor, the loop's default one when none is passed.
+
+    :param resources: Shared resources, see :func:`get_resources`.
+    :type resources: Resources
+    :param executor: Executor for the blocking calls.
+    :type executor: Executor | None
+    :return: Asynchronous resources, to be closed within the same event loop.
+    :rtype: AsyncResources
+    """
+    hasher = ExecutorPasswordHasher(resources.hasher, executor)
+    if STORAGE_BACKEND == "sqlite":
+        from .aiosqlite_db import (
+            AsyncSqliteConnectionPool,
+            AsyncSqliteMarketDatabase,
+            AsyncSqliteUserDatabase,
+        )
+
+        pool = AsyncSqliteConnectionPool()
+        return AsyncResources(
+            user_repo=AsyncSqliteUserDatabase(pool),
+            market_repo=AsyncSqliteMarketDatabase(pool),
+            hasher=hasher,
+            _close_callbacks=[pool.close],
+        )
+
+    return AsyncResources(
+        user_repo=ExecutorUserDatabase(resources.user_repo, executor),
+        market_repo=ExecutorMarketDatabase(resources.market_repo, executor),
+        hasher=hasher,
+    )
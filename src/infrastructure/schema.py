@@ -0,0 +1,251 @@
+import csv
+import os
+from array import array
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from itertools import islice
+from operator import itemgetter
+
+CSV_ENGINE = os.environ.get("CSV_ENGINE", "auto")
+PYARROW_MIN_SIZE = 1 << 20
+PYARROW_BLOCK_SIZE = 1 << 20
+# Small chunks keep the transposed rows in the CPU caches.
+CHUNK_ROWS = 1 << 12
+
+
+@dataclass(frozen=True, slots=True)
+class Column:
+    """Column of a table.
+
+    ``int`` columns are kept in arrays of 64-bit integers, ``str`` columns in
+    lists.  Values of a categorical column are shared between the rows, so
+    that e.g. an address repeated by thousands of flats is stored once.
+    """
+
+    name: str
+    dtype: type = str
+    categorical: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class TableSchema:
+    name: str
+    columns: tuple[Column, ...]
+    key: str
+
+    @property
+    def column_names(self) -> tuple[str, ...]:
+        return tuple(column.name for column in self.columns)
+
+    def column(self, name: str) -> Column:
+        for column in self.columns:
+            if column.name == name:
+                return column
+        raise KeyError(f"No column {name} in table {self.name}")
+
+
+USERS_SCHEMA = TableSchema(
+    name="users",
+    columns=(
+        Column("id", int),
+        Column("username"),
+        Column("password_hash"),
+        Column("balance", int),
+    ),
+    key="id",
+)
+FLATS_SCHEMA = TableSchema(
+    name="flats",
+    columns=(
+        Column("id", int),
+        Column("number", int),
+        Column("floor", int),
+        Column("room_amount", int),
+        Column("price", int),
+        Column("address", categorical=True),
+    ),
+    key="id",
+)
+OWNERS_SCHEMA = TableSchema(
+    name="owners",
+    columns=(Column("user_id", int), Column("flat_id", int)),
+    key="flat_id",
+)
+SCHEMAS = {
+    schema.name: schema for schema in (USERS_SCHEMA, FLATS_SCHEMA, OWNERS_SCHEMA)
+}
+
+
+def _pyarrow_available() -> bool:
+    try:
+        import pyarrow.csv  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _choose_engine(path: str, engine: str | None) -> str:
+    engine = engine or CSV_ENGINE
+    if engine == "auto":
+        if os.path.getsize(path) >= PYARROW_MIN_SIZE and _pyarrow_available():
+            return "pyarrow"
+        return "csv"
+    if engine not in ("csv", "pyarrow"):
+        raise ValueError(f"Unknown CSV engine: {engine}")
+    return engine
+
+
+def _convert(column: Column, values: Sequence[str], categories: dict) -> Sequence:
+    if column.dtype is int:
+        return array("q", map(int, values))
+    if column.categorical:
+        return [categories.setdefault(value, value) for value in values]
+    return list(values)
+
+
+def _iter_csv(
+    path: str, columns: tuple[Column, ...], chunk_rows: int
+) -> Iterator[dict[str, Sequence]]:
+    categories = {column.name: {} for column in columns}
+    with open(path, "r", newline="", encoding="UTF-8") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return
+
+        getters = [itemgetter(header.index(column.name)) for column in columns]
+        while rows := list(islice(reader, chunk_rows)):
+            yield {
+                column.name: _convert(
+                    column, list(map(getter, rows)), categories[column.name]
+                )
+                for column, getter in zip(columns, getters)
+            }
+
+
+def _iter_pyarrow(
+    path: str, columns: tuple[Column, ...]
+) -> Iterator[dict[str, Sequence]]:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+
+    types = {
+        column.name: (
+            pa.int64()
+            if column.dtype is int
+            else (
+                pa.dictionary(pa.int32(), pa.string())
+                if column.categorical
+                else pa.string()
+            )
+        )
+        for column in columns
+    }
+    reader = pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(block_size=PYARROW_BLOCK_SIZE),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=types,
+            include_columns=list(types),
+            strings_can_be_null=False,
+        ),
+    )
+    categories = {column.name: {} for column in columns}
+    with reader:
+        for batch in reader:
+            chunk = {}
+            for column in columns:
+                values = batch.column(column.name)
+                if values.null_count:
+                    raise ValueError(f"Empty values in column {column.name} of {path}")
+
+                if column.dtype is int:
+                    chunk[column.name] = _int_array(values)
+                elif column.categorical:
+                    chunk[column.name] = _decode(values, categories[column.name])
+                else:
+                    chunk[column.name] = values.to_pylist()
+            yield chunk
+
+
+def _buffer(values, format: str) -> memoryview:
+    # Bytes of the data of a primitive Arrow array without nulls.
+    size = array(format).itemsize
+    start = values.offset * size
+    return memoryview(values.buffers()[1])[start : start + len(values) * size]
+
+
+def _int_array(values) -> array:
+    result = array("q")
+    result.frombytes(_buffer(values, "q"))
+    return result
+
+
+def _decode(values, categories: dict) -> list[str]:
+    dictionary = [
+        categories.setdefault(value, value) for value in values.dictionary.to_pylist()
+    ]
+    indices = _buffer(values.indices, "i").cast("i")
+    if len(indices) < 2:
+        return [dictionary[index] for index in indices]
+    return list(itemgetter(*indices)(dictionary))
+
+
+def iter_chunks(
+    path: str,
+    schema: TableSchema,
+    columns: Sequence[str] | None = None,
+    chunk_rows: int = CHUNK_ROWS,
+    engine: str | None = None,
+) -> Iterator[dict[str, Sequence]]:
+    """Reads a CSV table in chunks of typed columns.
+
+    With the ``pyarrow`` engine the file is parsed in parallel by Arrow,
+    with the ``csv`` engine by the standard library.  The ``auto`` engine,
+    the default unless ``CSV_ENGINE`` is set, picks Arrow for files of
+    :data:`PYARROW_MIN_SIZE` bytes and more if it is installed.
+
+    :param path: Path to the file.
+    :type path: str
+    :param schema: Schema of the table.
+    :type schema: TableSchema
+    :param columns: Names of the columns to be read, all of them by default.
+    :type columns: Sequence[str] | None
+    :param chunk_rows: Amount of the rows in a chunk read by the ``csv``
+        engine.  Arrow reads blocks of :data:`PYARROW_BLOCK_SIZE` bytes.
+    :type chunk_rows: int
+    :param engine: ``auto``, ``pyarrow`` or ``csv``.
+    :type engine: str | None
+    :return: Iterator over the chunks, dicts of the column values by name.
+    :rtype: Iterator[dict[str, Sequence]]
+    """
+    if os.path.getsize(path) == 0:
+        return
+
+    names = columns or schema.column_names
+    selected = tuple(schema.column(name) for name in names)
+    if _choose_engine(path, engine) == "pyarrow":
+        yield from _iter_pyarrow(path, selected)
+    else:
+        yield from _iter_csv(path, selected, chunk_rows)
+
+
+def read_columns(
+    path: str,
+    schema: TableSchema,
+    columns: Sequence[str] | None = None,
+    engine: str | None = None,
+) -> dict[str, Sequence]:
+    """Reads the whole columns of a CSV table.  See :func:`iter_chunks`.
+
+    :return: Column values by name.
+    :rtype: dict[str, Sequence]
+    """
+    names = columns or schema.column_names
+    result = {
+        name: array("q") if schema.column(name).dtype is int else [] for name in names
+    }
+    for chunk in iter_chunks(path, schema, names, engine=engine):
+        for name, values in chunk.items():
+            result[name].extend(values)
+    return result
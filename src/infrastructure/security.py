@@ -1,8 +1,177 @@
+import base64
 import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 
+from application.metrics import instrumented
 from application.ports import PasswordHasher
 
 
+def _encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    """Checks the password against a hash made by any of the known hashers.
+
+    The algorithm and its parameters are read from the hash string itself.
+    Hashes without them are treated as legacy unsalted SHA-256 hex digests.
+
+    :param password: Password to be checked.
+    :type password: str
+    :param password_hash: Stored password hash.
+    :type password_hash: str
+    :return: Whether the password matches the hash.
+    :rtype: bool
+    """
+    algorithm, *parameters = password_hash.split("$")
+    try:
+        match algorithm, parameters:
+            case Pbkdf2Hasher.algorithm, [iterations, salt, expected]:
+                derived_key = hashlib.pbkdf2_hmac(
+                    "sha256", password.encode(), _decode(salt), int(iterations)
+                )
+            case ScryptHasher.algorithm, [n, r, p, salt, expected]:
+                derived_key = hashlib.scrypt(
+                    password.encode(),
+                    salt=_decode(salt),
+                    n=int(n),
+                    r=int(r),
+                    p=int(p),
+                    maxmem=ScryptHasher.maxmem(int(n), int(r), int(p)),
+                )
+            case _, []:
+                return Sha256Hasher().verify(password, password_hash)
+            case _:
+                return False
+    except ValueError:
+        return False
+
+    return hmac.compare_digest(_encode(derived_key), expected)
+
+
 class Sha256Hasher(PasswordHasher):
+    """Legacy unsalted single-round hasher.  Kept to read existing hashes."""
+
     def hash(self, password: str) -> str:
         return hashlib.sha256(password.encode()).hexdigest()
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return hmac.compare_digest(self.hash(password), password_hash)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return False
+
+
+class Pbkdf2Hasher(PasswordHasher):
+    """Salted PBKDF2-HMAC-SHA256 hasher.
+
+    Hashes look like ``pbkdf2_sha256$<iterations>$<salt>$<hash>``.
+    """
+
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations: int = 600_000) -> None:
+        self._iterations = iterations
+
+    def hash(self, password: str) -> str:
+        salt = os.urandom(16)
+        derived_key = hashlib.pbkdf2_hmac(
+            "sha256", password.encode(), salt, self._iterations
+        )
+        return "$".join(
+            (self.algorithm, str(self._iterations), _encode(salt), _encode(derived_key))
+        )
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return verify_password(password, password_hash)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return not password_hash.startswith(f"{self.algorithm}${self._iterations}$")
+
+
+class ScryptHasher(PasswordHasher):
+    """Salted memory-hard scrypt hasher.
+
+    Hashes look like ``scrypt$<n>$<r>$<p>$<salt>$<hash>``.  Every hash takes
+    about ``128 * n * r`` bytes of memory.
+    """
+
+    algorithm = "scrypt"
+
+    def __init__(self, n: int = 2**14, r: int = 8, p: int = 1) -> None:
+        self._n = n
+        self._r = r
+        self._p = p
+
+    @staticmethod
+    def maxmem(n: int, r: int, p: int) -> int:
+        return 128 * r * (n + p + 2) + 1024**2
+
+    def hash(self, password: str) -> str:
+        salt = os.urandom(16)
+        derived_key = hashlib.scrypt(
+            password.encode(),
+            salt=salt,
+            n=self._n,
+            r=self._r,
+            p=self._p,
+            maxmem=self.maxmem(self._n, self._r, self._p),
+        )
+        parameters = (str(self._n), str(self._r), str(self._p))
+        return "$".join(
+            (self.algorithm, *parameters, _encode(salt), _encode(derived_key))
+        )
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return verify_password(password, password_hash)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        prefix = f"{self.algorithm}${self._n}${self._r}${self._p}$"
+        return not password_hash.startswith(prefix)
+
+
+@instrumented
+class PooledHasher(PasswordHasher):
+    """Runs another hasher on a bounded worker pool.
+
+    At most ``max_workers`` hashes are computed at once, and at most
+    ``max_pending`` more wait for a worker; further callers block until there
+    is room.  This keeps a burst of logins from oversubscribing the CPU, so
+    the latency of every login stays close to the cost of one hash.  Both
+    hashlib KDFs release the GIL, so threads are enough by default.
+    """
+
+    def __init__(
+        self,
+        hasher: PasswordHasher,
+        max_workers: int = os.cpu_count() or 1,
+        max_pending: int = 64,
+        use_processes: bool = False,
+    ) -> None:
+        self._hasher = hasher
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self._executor: Executor = executor_class(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    def _run(self, function, *args):
+        with self._slots:
+            return self._executor.submit(function, *args).result()
+
+    def hash(self, password: str) -> str:
+        return self._run(self._hasher.hash, password)
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return self._run(self._hasher.verify, password, password_hash)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return self._hasher.needs_rehash(password_hash)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown()
@@ -0,0 +1,480 @@
+import sqlite3
+import threading
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from application.exceptions import (
+    FlatAlreadyExists,
+    FlatNotFound,
+    ItemAlreadySold,
+    NotAnOwnerError,
+    UsernameTaken,
+    UserNotFound,
+)
+from application.metrics import instrumented
+from application.ports import MarketDatabaseRepository, UserDatabaseRepository
+from domain.entities import Flat, FlatPage, User, UserProperty
+from domain.exceptions import NotEnoughMoney
+from domain.value_objects import FlatFacets, FlatQuery, MarketStats
+
+from .schema import FLATS_SCHEMA, OWNERS_SCHEMA, USERS_SCHEMA, iter_chunks
+
+if TYPE_CHECKING:
+    from .columnar import SqliteFlatColumns
+
+SQLITE_DB_PATH = "data/db/market.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    balance INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS users_username ON users (username);
+
+CREATE TABLE IF NOT EXISTS flats (
+    id INTEGER PRIMARY KEY,
+    number INTEGER NOT NULL,
+    floor INTEGER NOT NULL,
+    room_amount INTEGER NOT NULL,
+    price INTEGER NOT NULL,
+    address TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS flats_price ON flats (price);
+CREATE INDEX IF NOT EXISTS flats_room_amount_price ON flats (room_amount, price);
+
+CREATE TABLE IF NOT EXISTS owners (
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    flat_id INTEGER NOT NULL REFERENCES flats (id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS owners_flat_id ON owners (flat_id);
+CREATE INDEX IF NOT EXISTS owners_user_id ON owners (user_id);
+"""
+
+FLAT_COLUMNS = "flats.id, address, number, floor, room_amount, price"
+
+
+class SqliteConnectionPool:
+    """Hands every thread its own long-lived connection to the database."""
+
+    def __init__(self, path: str = SQLITE_DB_PATH) -> None:
+        self._path = path
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+        self.connection().executescript(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        """Opens a new connection, closed together with the pool.
+
+        :return: Connection not bound to any thread.
+        :rtype: sqlite3.Connection
+        """
+        connection = sqlite3.connect(
+            self._path, isolation_level=None, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA busy_timeout = 5000")
+        with self._lock:
+            self._connections.append(connection)
+        return connection
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self.connect()
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Runs the block in a write transaction, rolled back on exceptions."""
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def make_flat(row: tuple, is_available: bool) -> Flat:
+    """Builds a flat from a row of the flat columns."""
+    return Flat(*row, is_available)
+
+
+def make_flats(rows: Iterable[tuple]) -> list[Flat]:
+    """Builds flats from rows of the flat columns followed by availability."""
+    return [Flat(*row[:-1], bool(row[-1])) for row in rows]
+
+
+def flat_conditions(
+    query: FlatQuery, check_price: bool = True
+) -> tuple[str, list[int]]:
+    """Builds the ``WHERE`` clause of the query over flats joined with owners.
+
+    :return: Conditions and their parameters.
+    :rtype: tuple[str, list[int]]
+    """
+    conditions, parameters = ["1"], []
+    if query.only_available:
+        conditions.append("owners.flat_id IS NULL")
+    if query.room_amount is not None:
+        conditions.append("room_amount = ?")
+        parameters.append(query.room_amount)
+    if check_price and query.min_price is not None:
+        conditions.append("price >= ?")
+        parameters.append(query.min_price)
+    if check_price and query.max_price is not None:
+        conditions.append("price <= ?")
+        parameters.append(query.max_price)
+    return " AND ".join(conditions), parameters
+
+
+def flat_order(query: FlatQuery) -> str:
+    """Builds the ``ORDER BY`` clause for the sort key of the query."""
+    direction = "DESC" if query.sort.startswith("-") else "ASC"
+    order = f"price {direction}, flats.id {direction}"
+    if query.sort.endswith("room_amount"):
+        order = f"room_amount {direction}, {order}"
+    return order
+
+
+def _scan(
+    pool: SqliteConnectionPool, select: str, key: str, chunk_size: int
+) -> Iterator[tuple]:
+    """Reads the rows in key order, one short query per chunk.
+
+    Chunks are read by key ranges rather than through one long cursor, so
+    no read transaction is held open between the chunks.  The key must be
+    the first selected integer column.
+    """
+    last_key = -(2**63)
+    while True:
+        rows = (
+            pool.connection()
+            .execute(
+                f"{select} WHERE {key} > ? ORDER BY {key} LIMIT ?",
+                (last_key, chunk_size),
+            )
+            .fetchall()
+        )
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_key = rows[-1][0]
+
+
+@instrumented
+class SqliteUserDatabase(UserDatabaseRepository):
+    def __init__(self, pool: SqliteConnectionPool) -> None:
+        self._pool = pool
+
+    def register(self, username: str, password_hash: str) -> None:
+        try:
+            with self._pool.transaction() as connection:
+                connection.execute(
+                    "INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                    (username, password_hash),
+                )
+        except sqlite3.IntegrityError:
+            raise UsernameTaken("This username is not available")
+
+    def get_credentials(self, username: str) -> tuple[int, str]:
+        row = (
+            self._pool.connection()
+            .execute(
+                "SELECT id, password_hash FROM users WHERE username = ?", (username,)
+            )
+            .fetchone()
+        )
+
+        if row is None:
+            raise UserNotFound(f"User not found. Username: {username}")
+
+        return row[0], row[1]
+
+    def get_user(self, user_id: int) -> User:
+        row = (
+            self._pool.connection()
+            .execute("SELECT id, username, balance FROM users WHERE id = ?", (user_id,))
+            .fetchone()
+        )
+
+        if row is None:
+            raise UserNotFound(f"User not found. ID: {user_id}")
+
+        return User(id=row[0], username=row[1], balance=row[2])
+
+    def get_property(self, user_id: int) -> UserProperty:
+        rows = self._pool.connection().execute(
+            f"SELECT {FLAT_COLUMNS} FROM owners JOIN flats ON flats.id = owners.flat_id"
+            " WHERE owners.user_id = ? ORDER BY flats.id",
+            (user_id,),
+        )
+        property_list = [make_flat(row, is_available=False) for row in rows]
+        return UserProperty(user_id, property_list)
+
+    def add_money(self, user_id: int, amount: int) -> None:
+        with self._pool.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE users SET balance = balance + ? WHERE id = ?",
+                (amount, user_id),
+            )
+            if cursor.rowcount == 0:
+                raise UserNotFound(f"User not found. ID: {user_id}")
+
+    def edit_profile(self, user_id: int, new_username, new_password_hash: str) -> None:
+        try:
+            with self._pool.transaction() as connection:
+                cursor = connection.execute(
+                    "UPDATE users SET username = coalesce(?, username),"
+                    " password_hash = coalesce(?, password_hash) WHERE id = ?",
+                    (new_username or None, new_password_hash or None, user_id),
+                )
+                if cursor.rowcount == 0:
+                    raise UserNotFound(f"User not found. ID: {user_id}")
+        except sqlite3.IntegrityError:
+            raise UsernameTaken("This username is not available")
+
+    def deposit_many(self, amounts: Mapping[int, int]) -> None:
+        with self._pool.transaction() as connection:
+            cursor = connection.executemany(
+                "UPDATE users SET balance = balance + ? WHERE id = ?",
+                [(amount, user_id) for user_id, amount in amounts.items()],
+            )
+            if cursor.rowcount != len(amounts):
+                user_ids = {
+                    row[0] for row in connection.execute("SELECT id FROM users")
+                }
+                missing_id = next(iter(amounts.keys() - user_ids))
+                raise UserNotFound(f"User not found. ID: {missing_id}")
+
+    def iter_users(self, chunk_size: int = 1000) -> Iterator[User]:
+        for row in _scan(
+            self._pool, "SELECT id, username, balance FROM users", "id", chunk_size
+        ):
+            yield User(id=row[0], username=row[1], balance=row[2])
+
+    def iter_ownership(self, chunk_size: int = 1000) -> Iterator[tuple[int, int]]:
+        for row in _scan(
+            self._pool, "SELECT flat_id, user_id FROM owners", "flat_id", chunk_size
+        ):
+            yield row[1], row[0]
+
+
+@instrumented
+class SqliteMarketDatabase(MarketDatabaseRepository):
+    def __init__(self, pool: SqliteConnectionPool) -> None:
+        self._pool = pool
+        self._columns: "SqliteFlatColumns | None" = None
+        self._columns_lock = threading.Lock()
+
+    def _flat_columns(self) -> "SqliteFlatColumns":
+        # Created on first use, so that numpy and pandas are only imported by
+        # the processes serving the market statistics.
+        if self._columns is None:
+            with self._columns_lock:
+                if self._columns is None:
+                    from .columnar import SqliteFlatColumns
+
+                    self._columns = SqliteFlatColumns(self._pool.connect)
+        return self._columns
+
+    def get_flat_list(self) -> list[Flat]:
+        rows = self._pool.connection().execute(
+            f"SELECT {FLAT_COLUMNS}, owners.flat_id IS NULL FROM flats"
+            " LEFT JOIN owners ON owners.flat_id = flats.id ORDER BY flats.id"
+        )
+        return make_flats(rows)
+
+    def find_flats(self, query: FlatQuery) -> FlatPage:
+        conditions, parameters = flat_conditions(query)
+        order = flat_order(query)
+        connection = self._pool.connection()
+
+        total = connection.execute(
+            "SELECT count(*) FROM flats LEFT JOIN owners ON owners.flat_id = flats.id"
+            f" WHERE {conditions}",
+            parameters,
+        ).fetchone()[0]
+        rows = connection.execute(
+            f"SELECT {FLAT_COLUMNS}, owners.flat_id IS NULL FROM flats"
+            " LEFT JOIN owners ON owners.flat_id = flats.id"
+            f" WHERE {conditions} ORDER BY {order} LIMIT ? OFFSET ?",
+            [*parameters, query.limit if query.limit is not None else -1, query.offset],
+        )
+
+        flats = make_flats(rows)
+        return FlatPage(flats, total=total, offset=query.offset, limit=query.limit)
+
+    def get_flat_facets(self, query: FlatQuery) -> FlatFacets:
+        conditions, parameters = flat_conditions(query, check_price=False)
+        connection = self._pool.connection()
+
+        min_rooms, max_rooms = connection.execute(
+            "SELECT coalesce(min(room_amount), 0), coalesce(max(room_amount), 0)"
+            " FROM flats"
+        ).fetchone()
+        flat_amount, min_price, max_price = connection.execute(
+            "SELECT count(*), coalesce(min(price), 0), coalesce(max(price), 0)"
+            " FROM flats LEFT JOIN owners ON owners.flat_id = flats.id"
+            f" WHERE {conditions}",
+            parameters,
+        ).fetchone()
+        return FlatFacets(flat_amount, min_rooms, max_rooms, min_price, max_price)
+
+    def get_market_stats(self, query: FlatQuery, price_bins: int = 20) -> MarketStats:
+        return self._flat_columns().market_stats(query, price_bins)
+
+    def get_flat(self, flat_id: int) -> Flat:
+        row = (
+            self._pool.connection()
+            .execute(
+                f"SELECT {FLAT_COLUMNS}, owners.flat_id IS NULL FROM flats"
+                " LEFT JOIN owners ON owners.flat_id = flats.id WHERE flats.id = ?",
+                (flat_id,),
+            )
+            .fetchone()
+        )
+
+        if row is None:
+            raise FlatNotFound(f"Flat not found. ID: {flat_id}")
+
+        return make_flat(row[:-1], is_available=bool(row[-1]))
+
+    def purchase_flat(self, user_id: int, flat_id: int) -> None:
+        with self._pool.transaction() as connection:
+            user_row = connection.execute(
+                "SELECT balance FROM users WHERE id = ?", (user_id,)
+            ).fetchone()
+            if user_row is None:
+                raise UserNotFound(f"User not found. ID: {user_id}")
+
+            flat_row = connection.execute(
+                "SELECT price, EXISTS (SELECT 1 FROM owners WHERE flat_id = flats.id)"
+                " FROM flats WHERE id = ?",
+                (flat_id,),
+            ).fetchone()
+            if flat_row is None:
+                raise FlatNotFound(f"Flat not found. ID: {flat_id}")
+
+            user_balance, (flat_price, is_sold) = user_row[0], flat_row
+            if is_sold:
+                raise ItemAlreadySold(f"Flat is already sold. ID: {flat_id}")
+            if user_balance < flat_price:
+                raise NotEnoughMoney(f"User does not have enough money. ID: {user_id}")
+
+            connection.execute(
+                "UPDATE users SET balance = balance - ? WHERE id = ?",
+                (flat_price, user_id),
+            )
+            connection.execute(
+                "INSERT INTO owners (user_id, flat_id) VALUES (?, ?)",
+                (user_id, flat_id),
+            )
+
+    def sell_flat(self, user_id: int, flat_id: int) -> None:
+        with self._pool.transaction() as connection:
+            cursor = connection.execute(
+                "DELETE FROM owners WHERE user_id = ? AND flat_id = ?",
+                (user_id, flat_id),
+            )
+            if cursor.rowcount == 0:
+                raise NotAnOwnerError("User is not the owner of the property")
+
+            connection.execute(
+                "UPDATE users SET balance = balance"
+                " + (SELECT price FROM flats WHERE id = ?) WHERE id = ?",
+                (flat_id, user_id),
+            )
+
+    def import_flats(self, flats: Sequence[Flat]) -> None:
+        with self._pool.transaction() as connection:
+            for flat in flats:
+                try:
+                    connection.execute(
+                        "INSERT INTO flats (id, number, floor, room_amount, price,"
+                        " address) VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            flat.id,
+                            flat.number,
+                            flat.floor,
+                            flat.room_amount,
+                            flat.price,
+                            flat.address,
+                        ),
+                    )
+                except sqlite3.IntegrityError:
+                    raise FlatAlreadyExists(f"Flat already exists. ID: {flat.id}")
+
+    def update_prices(self, prices: Mapping[int, int]) -> None:
+        with self._pool.transaction() as connection:
+            cursor = connection.executemany(
+                "UPDATE flats SET price = ? WHERE id = ?",
+                [(price, flat_id) for flat_id, price in prices.items()],
+            )
+            if cursor.rowcount != len(prices):
+                flat_ids = {
+                    row[0] for row in connection.execute("SELECT id FROM flats")
+                }
+                missing_id = next(iter(prices.keys() - flat_ids))
+                raise FlatNotFound(f"Flat not found. ID: {missing_id}")
+
+    def iter_flats(self, chunk_size: int = 1000) -> Iterator[Flat]:
+        for row in _scan(
+            self._pool,
+            f"SELECT {FLAT_COLUMNS}, owners.flat_id IS NULL FROM flats"
+            " LEFT JOIN owners ON owners.flat_id = flats.id",
+            "flats.id",
+            chunk_size,
+        ):
+            yield make_flat(row[:-1], is_available=bool(row[-1]))
+
+
+def migrate_from_csv(
+    pool: SqliteConnectionPool,
+    users_path: str = "data/db/users.csv",
+    flats_path: str = "data/db/flats.csv",
+    owners_path: str = "data/db/owners.csv",
+) -> None:
+    """Copies the contents of the local CSV tables into the database.
+
+    Existing rows with the same keys are replaced, so the migration can be
+    safely repeated.  The files are read in chunks of typed columns, see
+    :func:`.schema.iter_chunks`.
+
+    :param pool: Connection pool of the target database.
+    :type pool: SqliteConnectionPool
+    """
+    tables = (
+        (users_path, USERS_SCHEMA),
+        (flats_path, FLATS_SCHEMA),
+        (owners_path, OWNERS_SCHEMA),
+    )
+
+    with pool.transaction() as connection:
+        for path, schema in tables:
+            names = schema.column_names
+            statement = (
+                f"INSERT OR REPLACE INTO {schema.name} ({', '.join(names)})"
+                f" VALUES ({', '.join('?' * len(names))})"
+            )
+            for chunk in iter_chunks(path, schema):
+                connection.executemany(statement, zip(*(chunk[name] for name in names)))
+
+
+if __name__ == "__main__":
+    migrate_from_csv(SqliteConnectionPool())
@@ -0,0 +1,705 @@
+import csv
+import heapq
+import os
+import threading
+from array import array
+from bisect import bisect_right
+from collections.abc import (
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    KeysView,
+    Mapping,
+    MutableMapping,
+    Sequence,
+)
+from itertools import islice
+
+from application.metrics import METRICS
+
+from .binary import (
+    BinaryTable,
+    Signature,
+    SortedPositions,
+    source_signature,
+    write_table,
+)
+from .schema import TableSchema, read_columns
+
+RowListener = Callable[[Hashable, dict | None, dict | None], None]
+
+
+class UniqueIndex:
+    """Hash index mapping a column value to the primary key of its only row."""
+
+    def __init__(self, column: str) -> None:
+        self.column = column
+        self._keys: dict[Hashable, Hashable] = {}
+
+    def clear(self) -> None:
+        self._keys.clear()
+
+    def add(self, key: Hashable, row: dict) -> None:
+        self._keys[row[self.column]] = key
+
+    def build(self, pairs: Iterable[tuple[Hashable, Hashable]]) -> None:
+        """Adds the ``(primary key, column value)`` pairs of a loaded table."""
+        self._keys.update((value, key) for key, value in pairs)
+
+    def remove(self, key: Hashable, row: dict) -> None:
+        self._keys.pop(row[self.column], None)
+
+    def get(self, value: Hashable) -> Hashable | None:
+        return self._keys.get(value)
+
+
+class MultiIndex:
+    """Hash index mapping a column value to the primary keys of all its rows."""
+
+    def __init__(self, column: str) -> None:
+        self.column = column
+        self._keys: dict[Hashable, set[Hashable]] = {}
+
+    def clear(self) -> None:
+        self._keys.clear()
+
+    def add(self, key: Hashable, row: dict) -> None:
+        self._keys.setdefault(row[self.column], set()).add(key)
+
+    def build(self, pairs: Iterable[tuple[Hashable, Hashable]]) -> None:
+        """Adds the ``(primary key, column value)`` pairs of a loaded table."""
+        keys = self._keys
+        for key, value in pairs:
+            keys.setdefault(value, set()).add(key)
+
+    def remove(self, key: Hashable, row: dict) -> None:
+        keys = self._keys.get(row[self.column])
+        if keys is None:
+            return
+
+        keys.discard(key)
+        if not keys:
+            del self._keys[row[self.column]]
+
+    def get(self, value: Hashable) -> frozenset[Hashable]:
+        return frozenset(self._keys.get(value, ()))
+
+
+class ColumnRows(MutableMapping):
+    """Rows of a table by primary key, stored as the columns of the file.
+
+    The loaded rows are kept in typed columns, see :mod:`.schema`, instead of
+    a dict per row, and a row dict is only built when it is requested.  Rows
+    written afterwards are kept as dicts on top of the columns, deletions as
+    None.  If the keys of the file are consecutive integers, as generated
+    ids are, the position of a row is computed from the key, otherwise it is
+    looked up in a dict, or in ``positions`` if they are passed.
+
+    The largest key is found once, on the first request, and kept up to date
+    by the writes, so it is not lowered when the row with it is deleted.
+    """
+
+    def __init__(
+        self,
+        names: tuple[str, ...],
+        columns: Mapping[str, Sequence],
+        key: str,
+        positions: Mapping[Hashable, int] | range | None = None,
+    ) -> None:
+        self.names = names
+        self._columns = [columns[name] for name in names]
+        self._projections: dict[tuple[str, ...], list[Sequence]] = {}
+        keys = columns[key]
+        self._size = len(keys)
+        if positions is None:
+            first = keys[0] if self._size else 0
+            positions = range(first, first + self._size)
+            if not (isinstance(keys, array) and keys == array("q", positions)):
+                positions = dict(zip(keys, range(self._size)))
+        self._first = 0
+        self._positions: Mapping[Hashable, int] | None = None
+        if isinstance(positions, range):
+            self._first = positions.start
+        else:
+            self._positions = positions
+        self._plain = self._positions is None or len(self._positions) == self._size
+        self._changed: dict[Hashable, dict | None] = {}
+        # Sorted keys of the inserted rows and of the dict positions, built
+        # for ordered reads.
+        self._inserted_keys: list[Hashable] | None = None
+        self._sorted_keys: list[Hashable] | None = None
+        self._length = self._size if self._positions is None else len(self._positions)
+        self._max_key: Hashable | None = None
+        self._max_key_known = False
+
+    def _position(self, key: Hashable) -> int | None:
+        if self._positions is not None:
+            return self._positions.get(key)
+        if not isinstance(key, int):
+            return None
+        position = key - self._first
+        return position if 0 <= position < self._size else None
+
+    def _base_keys(self) -> Iterable[Hashable]:
+        if self._positions is not None:
+            return self._positions
+        return range(self._first, self._first + self._size)
+
+    def __getitem__(self, key: Hashable) -> dict:
+        if key in self._changed:
+            row = self._changed[key]
+            if row is None:
+                raise KeyError(key)
+            return row
+
+        position = self._position(key)
+        if position is None:
+            raise KeyError(key)
+        return {
+            name: column[position] for name, column in zip(self.names, self._columns)
+        }
+
+    def __contains__(self, key: object) -> bool:
+        if key in self._changed:
+            return self._changed[key] is not None
+        return self._position(key) is not None
+
+    def __setitem__(self, key: Hashable, row: dict) -> None:
+        if key not in self:
+            if self._position(key) is None:
+                self._inserted_keys = None
+            self._length += 1
+            if self._max_key_known and (self._max_key is None or key > self._max_key):
+                self._max_key = key
+        self._changed[key] = row
+
+    def __delitem__(self, key: Hashable) -> None:
+        if key not in self:
+            raise KeyError(key)
+        if self._position(key) is None:
+            del self._changed[key]
+            self._inserted_keys = None
+        else:
+            self._changed[key] = None
+        self._length -= 1
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[Hashable]:
+        changed = self._changed
+        for key in self._base_keys():
+            if key not in changed or changed[key] is not None:
+                yield key
+        for key, row in list(changed.items()):
+            if row is not None and self._position(key) is None:
+                yield key
+
+    def keys_after(self, key: Hashable | None, limit: int) -> list[Hashable]:
+        """Returns the smallest keys greater than the passed one, in order.
+
+        Only the returned range of the loaded keys is visited, so that the
+        rows can be read in key order chunk by chunk without copying all the
+        keys.  The keys of the inserted rows are sorted once per change.
+
+        :param key: Key to start after, None to start from the smallest one.
+        :type key: Hashable | None
+        :param limit: Largest amount of the keys to be returned.
+        :type limit: int
+        :return: Keys in ascending order.
+        :rtype: list[Hashable]
+        """
+        changed = self._changed
+        base_keys = (
+            base_key
+            for base_key in self._base_keys_after(key)
+            if changed.get(base_key, True) is not None
+        )
+
+        if self._inserted_keys is None:
+            self._inserted_keys = sorted(
+                changed_key
+                for changed_key, row in changed.items()
+                if row is not None and self._position(changed_key) is None
+            )
+        inserted_keys = self._inserted_keys
+        start = 0 if key is None else bisect_right(inserted_keys, key)
+        return list(
+            islice(heapq.merge(base_keys, inserted_keys[start : start + limit]), limit)
+        )
+
+    def _base_keys_after(self, key: Hashable | None) -> Iterator[Hashable]:
+        if self._positions is None:
+            start = self._first if key is None else max(self._first, key + 1)
+            return iter(range(start, self._first + self._size))
+        if isinstance(self._positions, SortedPositions):
+            return self._positions.keys_after(key)
+
+        if self._sorted_keys is None:
+            self._sorted_keys = sorted(self._positions)
+        keys = self._sorted_keys
+        start = 0 if key is None else bisect_right(keys, key)
+        return (keys[i] for i in range(start, len(keys)))
+
+    def max_key(self) -> Hashable | None:
+        """Returns the largest key the rows have had, or None if there were
+        no rows.
+        """
+        if not self._max_key_known:
+            if self._positions is None:
+                base_max = self._first + self._size - 1 if self._size else None
+            elif isinstance(self._positions, SortedPositions):
+                base_max = self._positions.max_key()
+            else:
+                base_max = max(self._positions, default=None)
+            keys = [key for key in (base_max, *self._changed) if key is not None]
+            self._max_key = max(keys, default=None)
+            self._max_key_known = True
+        return self._max_key
+
+    def select(self, names: tuple[str, ...]) -> list[tuple]:
+        """Returns the values of the columns for every row, in table order.
+
+        :param names: Names of the columns.
+        :type names: tuple[str, ...]
+        :return: Tuples of the column values.
+        :rtype: list[tuple]
+        """
+        columns = self._project(names)
+        if self._plain and not self._changed:
+            return list(zip(*columns))
+
+        changed = self._changed
+        result = []
+        for key in self:
+            row = changed.get(key)
+            if row is None:
+                position = self._position(key)
+                result.append(tuple(column[position] for column in columns))
+            else:
+                result.append(tuple(row[name] for name in names))
+        return result
+
+    def get_values(self, key: Hashable, names: tuple[str, ...]) -> tuple | None:
+        """Returns the values of the columns of one row, or None if it is
+        absent, without building the row dict.
+        """
+        if key in self._changed:
+            row = self._changed[key]
+            return None if row is None else tuple(row[name] for name in names)
+
+        position = self._position(key)
+        if position is None:
+            return None
+        return tuple([column[position] for column in self._project(names)])
+
+    def _project(self, names: tuple[str, ...]) -> list[Sequence]:
+        columns = self._projections.get(names)
+        if columns is None:
+            columns = [self._columns[self.names.index(name)] for name in names]
+            self._projections[names] = columns
+        return columns
+
+
+class LocalTable:
+    """Process-wide resident copy of a CSV table.
+
+    The file is parsed once and served from memory afterwards.  It is parsed
+    again only when its modification time or size changes on disk, unless
+    ``watch`` is disabled.  Rows are stored by primary key, and secondary
+    indexes are maintained on every write.  Changes are kept in memory until
+    :meth:`save` is called.
+
+    The file is read column by column as described by the table schema and
+    kept in a :class:`ColumnRows` store, so that a large table takes a
+    fraction of the memory of a dict per row.  Readers needing a few columns
+    of many rows use :meth:`select` instead of building the rows.
+
+    Every time the CSV file is parsed or saved, the table is also written to a
+    binary file next to it, see :mod:`.binary`.  A process opening the table
+    later maps the binary file instead of parsing the CSV one, as long as it
+    was written for the current CSV file, so its startup does not depend on
+    the size of the table.
+
+    ``before_read`` is called with the table before every read, outside of the
+    table lock, so that the owner can bring it up to date with the changes
+    made by other processes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        schema: TableSchema,
+        indexes: tuple[UniqueIndex | MultiIndex, ...] = (),
+    ) -> None:
+        self._path = path
+        self._binary_path = f"{os.path.splitext(path)[0]}.bin"
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.schema = schema
+        self.columns = schema.column_names
+        self._key = schema.key
+        self._indexes = {index.column: index for index in indexes}
+        self._indexed = False
+        self._lock = threading.RLock()
+        self._rows = ColumnRows(
+            self.columns, {name: () for name in self.columns}, self._key
+        )
+        self._signature: tuple[int, int] | None = None
+        self._versions: dict[Hashable, int] = {}
+        self._epoch = 0
+        self._listeners: list[RowListener] = []
+        self.watch = True
+        self.dirty = False
+        self.write_count = 0
+        self.before_read: Callable[[LocalTable], None] | None = None
+
+    def _file_signature(self) -> tuple[int, int]:
+        stat = os.stat(self._path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> None:
+        with METRICS.span(f"LocalTable.load:{self.name}"):
+            source = source_signature(self._path)
+            binary = BinaryTable(self._binary_path, self.schema)
+            if binary.open() and binary.source == source:
+                self._rows = ColumnRows(
+                    self.columns, binary.columns, self._key, binary.positions
+                )
+            else:
+                binary.close()
+                columns = read_columns(self._path, self.schema)
+                self._rows = ColumnRows(self.columns, columns, self._key)
+                self._write_binary(columns, source)
+                METRICS.increment(
+                    "io_bytes_total", source[2], direction="read", file=self.name
+                )
+
+        self._versions = {}
+        self._epoch += 1
+        self._indexed = False
+        for index in self._indexes.values():
+            index.clear()
+        self._notify(None, None, None)
+
+    def _write_binary(self, columns: Mapping[str, Sequence], source: Signature) -> None:
+        # The binary file only saves the next process parsing the CSV file.
+        try:
+            write_table(self._binary_path, self.schema, columns, source)
+        except OSError:
+            pass
+
+    def _build_indexes(self) -> None:
+        # Indexes are built on the first lookup, so that opening a table does
+        # not read all of its rows.  Writes maintain them once they are built.
+        with self._lock:
+            if not self._indexed:
+                for index in self._indexes.values():
+                    index.clear()
+                    index.build(self._rows.select((self._key, index.column)))
+                self._indexed = True
+
+    def _refresh(self) -> None:
+        if not self.watch and self._signature is not None:
+            return
+
+        signature = self._file_signature()
+        if self._signature == signature:
+            return
+
+        with self._lock:
+            signature = self._file_signature()
+            if self._signature != signature:
+                self._load()
+                self._signature = signature
+
+    def _sync(self) -> None:
+        if self.before_read is not None:
+            self.before_read(self)
+
+    def invalidate(self) -> None:
+        """Discards the rows kept in memory, so that the file is parsed again
+        on the next access.
+        """
+        with self._lock:
+            self._signature = None
+
+    def _notify(
+        self, key: Hashable, old_row: dict | None, new_row: dict | None
+    ) -> None:
+        for listener in self._listeners:
+            listener(key, old_row, new_row)
+
+    def add_listener(self, listener: RowListener) -> None:
+        """Subscribes the callback to the table changes.
+
+        The callback receives the primary key with the old and the new row
+        (None for an inserted or a deleted row) on every write, and three Nones
+        when the whole table is reloaded from disk or changed in bulk.
+
+        :param listener: Change callback.
+        :type listener: RowListener
+        """
+        self._listeners.append(listener)
+
+    def get(self, key: Hashable) -> dict | None:
+        """Returns the row with the passed primary key.
+
+        The returned row is shared between all callers and must not be
+        modified in place.
+
+        :param key: Primary key of the row.
+        :type key: Hashable
+        :return: Row data or None if there is no such row.
+        :rtype: dict | None
+        """
+        self._sync()
+        self._refresh()
+        return self._rows.get(key)
+
+    def find(self, column: str, value: Hashable) -> Hashable | frozenset[Hashable]:
+        """Looks the passed value up in the secondary index of the column.
+
+        :param column: Indexed column name.
+        :type column: str
+        :param value: Value to be looked up.
+        :type value: Hashable
+        :return: Primary key (or None) for a unique index, set of primary keys
+            for a non-unique one.
+        :rtype: Hashable | frozenset[Hashable]
+        """
+        self._sync()
+        self._refresh()
+        if not self._indexed:
+            self._build_indexes()
+        return self._indexes[column].get(value)
+
+    def rows(self) -> Iterator[dict]:
+        """Iterates over all the rows of the table in insertion order."""
+        return (dict(zip(self.columns, values)) for values in self.select(self.columns))
+
+    def select(self, columns: tuple[str, ...]) -> list[tuple]:
+        """Returns the values of the columns for all the rows, in insertion
+        order, without building the rows.
+
+        :param columns: Column names.
+        :type columns: tuple[str, ...]
+        :return: Tuples of the column values.
+        :rtype: list[tuple]
+        """
+        self._sync()
+        with self._lock:
+            self._refresh()
+            return self._rows.select(columns)
+
+    def get_values(self, key: Hashable, columns: tuple[str, ...]) -> tuple | None:
+        """Returns the values of the columns of one row.
+
+        :param key: Primary key of the row.
+        :type key: Hashable
+        :param columns: Column names.
+        :type columns: tuple[str, ...]
+        :return: Tuple of the column values or None if there is no such row.
+        :rtype: tuple | None
+        """
+        self._sync()
+        self._refresh()
+        return self._rows.get_values(key, columns)
+
+    def scan(self, chunk_size: int = 1000) -> Iterator[list[dict]]:
+        """Iterates over the rows in chunks, in primary key order.
+
+        Every chunk is read by a key range after the last key of the previous
+        one, so the scan takes constant memory, and the table lock is held
+        while one chunk is read, so writers wait for a chunk, not the whole
+        scan.  Rows written in the meantime are returned as they are when
+        their chunk is read: deleted ones are skipped, inserted ones are
+        returned unless their keys precede the chunk.
+
+        :param chunk_size: Amount of the rows in a chunk.
+        :type chunk_size: int
+        """
+        self._sync()
+        last_key = None
+        while True:
+            with self._lock:
+                self._refresh()
+                keys = self._rows.keys_after(last_key, chunk_size)
+                chunk = [self._rows[key] for key in keys]
+            if chunk:
+                yield chunk
+            if len(keys) < chunk_size:
+                return
+            last_key = keys[-1]
+
+    def keys(self) -> KeysView:
+        """Returns a live view of the primary keys for O(1) membership checks."""
+        self._sync()
+        self._refresh()
+        return self._rows.keys()
+
+    def max_key(self) -> Hashable | None:
+        """Returns the largest primary key, see :meth:`ColumnRows.max_key`."""
+        self._sync()
+        with self._lock:
+            self._refresh()
+            return self._rows.max_key()
+
+    def version(self, key: Hashable) -> tuple[int, int]:
+        """Returns the version of the row, changed by every write to it.
+
+        Versions are also kept for absent rows, so inserting a row changes the
+        version a transaction has read while the row was missing.
+
+        :param key: Primary key of the row.
+        :type key: Hashable
+        :return: Row version.
+        :rtype: tuple[int, int]
+        """
+        self._sync()
+        self._refresh()
+        return self._epoch, self._versions.get(key, 0)
+
+    def touch(self, key: Hashable) -> None:
+        """Changes the row version without changing its data.
+
+        :param key: Primary key of the row.
+        :type key: Hashable
+        """
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self.write_count += 1
+
+    def snapshot(self) -> list[tuple]:
+        """Returns a point-in-time copy of the table rows as value tuples in
+        column order.
+        """
+        self._sync()
+        with self._lock:
+            self._refresh()
+            return self._rows.select(self.columns)
+
+    def save(self, rows: list[tuple] | None = None) -> None:
+        """Atomically replaces the file on disk with the table contents.
+
+        :param rows: Rows to be written instead of the current contents, e.g.
+            an earlier :meth:`snapshot`.
+        :type rows: list[tuple] | None
+        """
+        with self._lock:
+            if rows is None:
+                rows = self._rows.select(self.columns)
+                self.dirty = False
+
+            temp_path = f"{self._path}.tmp"
+            with METRICS.span(f"LocalTable.save:{self.name}"):
+                with open(temp_path, "w", newline="", encoding="UTF-8") as file:
+                    writer = csv.writer(file, lineterminator="\n")
+                    writer.writerow(self.columns)
+                    writer.writerows(rows)
+                # The binary file is written first and carries the signature
+                # of the new CSV file, so it never passes for the old one.
+                columns = zip(*rows) if rows else ((),) * len(self.columns)
+                self._write_binary(
+                    dict(zip(self.columns, columns)), source_signature(temp_path)
+                )
+            if METRICS.enabled:
+                METRICS.increment(
+                    "io_bytes_total",
+                    os.path.getsize(temp_path),
+                    direction="write",
+                    file=self.name,
+                )
+            os.replace(temp_path, self._path)
+            self._signature = self._file_signature()
+
+    def _insert(self, row: dict) -> dict | None:
+        key = row[self._key]
+        old_row = self._rows.get(key)
+        self._rows[key] = row
+        for index in self._indexes.values() if self._indexed else ():
+            if old_row is not None:
+                index.remove(key, old_row)
+            index.add(key, row)
+        self.touch(key)
+        self.dirty = True
+        return old_row
+
+    def _update(self, key: Hashable, changes: dict) -> tuple[dict, dict]:
+        old_row = self._rows[key]
+        new_row = {**old_row, **changes}
+        for index in self._indexes.values() if self._indexed else ():
+            if index.column in changes:
+                index.remove(key, old_row)
+                index.add(key, new_row)
+        self._rows[key] = new_row
+        self.touch(key)
+        self.dirty = True
+        return old_row, new_row
+
+    def insert(self, row: dict) -> None:
+        """Adds a new row or replaces the existing one with the same key.
+
+        :param row: Row data.  Must contain all table columns.
+        :type row: dict
+        """
+        with self._lock:
+            self._refresh()
+            old_row = self._insert(row)
+            self._notify(row[self._key], old_row, row)
+
+    def insert_many(self, rows: Iterable[dict]) -> None:
+        """Adds or replaces a batch of rows.
+
+        Listeners are notified once for the whole batch, as if the table was
+        reloaded, so that they rebuild their state once instead of per row.
+
+        :param rows: Rows data.  Must contain all table columns.
+        :type rows: Iterable[dict]
+        """
+        with self._lock:
+            self._refresh()
+            for row in rows:
+                self._insert(row)
+            self._notify(None, None, None)
+
+    def update(self, key: Hashable, **changes) -> None:
+        """Changes column values of an existing row.
+
+        :param key: Primary key of the row.
+        :type key: Hashable
+        """
+        with self._lock:
+            self._refresh()
+            old_row, new_row = self._update(key, changes)
+            self._notify(key, old_row, new_row)
+
+    def update_many(self, changes: Mapping[Hashable, dict]) -> None:
+        """Changes column values of a batch of existing rows.
+
+        Listeners are notified once for the whole batch, like in
+        :meth:`insert_many`.
+
+        :param changes: Column changes by primary key of the row.
+        :type changes: Mapping[Hashable, dict]
+        """
+        with self._lock:
+            self._refresh()
+            for key, row_changes in changes.items():
+                self._update(key, row_changes)
+            self._notify(None, None, None)
+
+    def delete(self, key: Hashable) -> None:
+        """Removes the row.
+
+        :param key: Primary key of the row.
+        :type key: Hashable
+        """
+        with self._lock:
+            self._refresh()
+            row = self._rows.pop(key)
+            for index in self._indexes.values() if self._indexed else ():
+                index.remove(key, row)
+            self.touch(key)
+            self.dirty = True
+            self._notify(key, row, None)
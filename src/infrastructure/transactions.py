@@ -0,0 +1,148 @@
+import errno
+import threading
+import time
+import zlib
+from collections.abc import Callable, Hashable, Iterable, Iterator
+from contextlib import contextmanager
+
+from application.exceptions import TransactionConflict
+
+from .tables import LocalTable
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def lock_byte(file_descriptor: int, offset: int) -> None:
+    """Takes an exclusive record lock on one byte of the file.
+
+    The kernel detects deadlocks between processes rather than threads, so it
+    may report one when threads of two processes wait for unrelated locks.
+    Callers take the locks in a fixed order, so the wait is simply retried.
+
+    :param file_descriptor: Descriptor of the lock file.
+    :type file_descriptor: int
+    :param offset: Position of the byte.
+    :type offset: int
+    """
+    while True:
+        try:
+            fcntl.lockf(file_descriptor, fcntl.LOCK_EX, 1, offset)
+            return
+        except OSError as error:
+            if error.errno != errno.EDEADLK:
+                raise
+            time.sleep(0.001)
+
+
+class RowLocks:
+    """Striped exclusive locks over named rows.
+
+    Every lock name is hashed to one of ``stripes`` slots.  A slot is guarded
+    by a thread lock inside the process and, where ``fcntl`` is available, by
+    a one-byte record lock on the lock file across processes.  Slots are
+    always taken in ascending order, so holders of several of them cannot
+    deadlock, while writers of unrelated rows do not wait for each other.
+    """
+
+    def __init__(self, path: str | None = None, stripes: int = 64) -> None:
+        self._path = path
+        self._thread_locks = [threading.Lock() for _ in range(stripes)]
+        self._file = None
+        self._file_lock = threading.Lock()
+
+    def _stripe(self, name: str) -> int:
+        return zlib.crc32(name.encode()) % len(self._thread_locks)
+
+    def _file_descriptor(self) -> int | None:
+        if self._path is None or fcntl is None:
+            return None
+
+        with self._file_lock:
+            if self._file is None:
+                self._file = open(self._path, "a+b")
+            return self._file.fileno()
+
+    @contextmanager
+    def hold(self, names: Iterable[str]) -> Iterator[None]:
+        """Holds the locks of all the passed names.
+
+        :param names: Lock names, e.g. ``"users:1"``.
+        :type names: Iterable[str]
+        """
+        stripes = sorted({self._stripe(name) for name in names})
+        file_descriptor = self._file_descriptor() if stripes else None
+        acquired = []
+        try:
+            for stripe in stripes:
+                self._thread_locks[stripe].acquire()
+                acquired.append(stripe)
+                if file_descriptor is not None:
+                    lock_byte(file_descriptor, stripe)
+            yield
+        finally:
+            for stripe in reversed(acquired):
+                if file_descriptor is not None:
+                    fcntl.lockf(file_descriptor, fcntl.LOCK_UN, 1, stripe)
+                self._thread_locks[stripe].release()
+
+
+class Transaction:
+    """Optimistic transaction over the resident tables.
+
+    Rows are read without locking, remembering their versions.  On commit the
+    locks of the read rows are taken, and the transaction is validated: if any
+    of the rows has been written since it was read, or any of the registered
+    checks fails, the commit is rejected with :class:`TransactionConflict`.
+    """
+
+    def __init__(self) -> None:
+        self._versions: dict[tuple[LocalTable, Hashable], tuple[int, int]] = {}
+        self._checks: list[Callable[[], None]] = []
+        self.lock_names: set[str] = set()
+
+    def read(self, table: LocalTable, key: Hashable) -> dict | None:
+        """Reads the row and adds it to the transaction read set.
+
+        :param table: Table to be read from.
+        :type table: LocalTable
+        :param key: Primary key of the row.
+        :type key: Hashable
+        :return: Row data or None if there is no such row.
+        :rtype: dict | None
+        """
+        version = table.version(key)
+        row = table.get(key)
+        self._versions.setdefault((table, key), version)
+        self.lock_names.add(f"{table.name}:{key}")
+        return row
+
+    def check(self, lock_name: str, check: Callable[[], None]) -> None:
+        """Registers a check to be repeated under the named lock on commit.
+
+        Is used for conditions that are not tied to a single row, e.g. username
+        uniqueness.
+
+        :param lock_name: Name of the lock guarding the checked condition.
+        :type lock_name: str
+        :param check: Callable raising an exception if the condition is broken.
+        :type check: Callable[[], None]
+        """
+        check()
+        self.lock_names.add(lock_name)
+        self._checks.append(check)
+
+    def validate(self) -> None:
+        """Checks that the transaction can be committed.  Call under its locks.
+
+        :raises TransactionConflict: Raised when any of the read rows was
+            changed after it was read.
+        """
+        for (table, key), version in self._versions.items():
+            if table.version(key) != version:
+                raise TransactionConflict(f"Row was changed. {table.name}: {key}")
+
+        for check in self._checks:
+            check()
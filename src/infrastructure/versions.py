@@ -0,0 +1,118 @@
+import mmap
+import os
+import struct
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+
+from .transactions import fcntl, lock_byte
+
+_SLOT = struct.Struct("Q")
+_LOCK_BYTE = 0
+_COMPACT_LOCK_BYTE = 1
+
+
+class SharedVersions:
+    """Change counters shared by the processes working on one data directory.
+
+    A small memory-mapped file holds the generation of the journal, changed
+    when it is rotated or replaced, and one counter per table, incremented by
+    every commit writing to the table.  Reading a counter is a memory access,
+    so it is checked on every read, while the data files are only read when
+    it changes.  Writers increment the counters under an exclusive lock of
+    the file, which also serializes the journal appends of all processes.
+    """
+
+    def __init__(self, path: str, names: Iterable[str]) -> None:
+        self._path = path
+        self.names = tuple(names)
+        self._size = _SLOT.size * (len(self.names) + 1)
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file_descriptor: int | None = None
+        self._mmap: mmap.mmap | None = None
+        self._view: memoryview | None = None
+
+    @staticmethod
+    def supported() -> bool:
+        return fcntl is not None
+
+    def open(self) -> None:
+        if self._mmap is not None:
+            return
+
+        file_descriptor = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        lock_byte(file_descriptor, _LOCK_BYTE)
+        try:
+            if os.fstat(file_descriptor).st_size < self._size:
+                os.ftruncate(file_descriptor, self._size)
+        finally:
+            fcntl.lockf(file_descriptor, fcntl.LOCK_UN, 1, _LOCK_BYTE)
+        self._mmap = mmap.mmap(file_descriptor, self._size)
+        self._view = memoryview(self._mmap).cast("Q")
+        self._file_descriptor = file_descriptor
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._view.release()
+            self._mmap.close()
+            os.close(self._file_descriptor)
+            self._mmap = None
+            self._view = None
+            self._file_descriptor = None
+
+    def read(self) -> tuple[int, ...]:
+        """Returns the journal generation followed by the table counters."""
+        return tuple(self._view)
+
+    def counter(self, index: int) -> int:
+        return self._view[index]
+
+    def generation(self) -> int:
+        return self._view[0]
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Holds the exclusive lock of the file, across threads and processes.
+
+        The lock is reentrant within a thread.
+        """
+        with self._thread_lock:
+            if self._depth == 0:
+                lock_byte(self._file_descriptor, _LOCK_BYTE)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    fcntl.lockf(self._file_descriptor, fcntl.LOCK_UN, 1, _LOCK_BYTE)
+
+    def compact_lock(self, blocking: bool = True) -> bool:
+        """Takes the lock held by the process compacting the journal.
+
+        It is released by :meth:`compact_unlock`, possibly in another thread.
+
+        :param blocking: Whether to wait for another process to release it.
+        :type blocking: bool
+        :return: Whether the lock was taken.
+        :rtype: bool
+        """
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.lockf(self._file_descriptor, flags, 1, _COMPACT_LOCK_BYTE)
+        except OSError:
+            return False
+        return True
+
+    def compact_unlock(self) -> None:
+        fcntl.lockf(self._file_descriptor, fcntl.LOCK_UN, 1, _COMPACT_LOCK_BYTE)
+
+    def increment(self, indexes: Iterable[int]) -> None:
+        """Increments the counters.  Call under :meth:`locked`.
+
+        :param indexes: Indexes of the counters, 0 for the journal generation.
+        :type indexes: Iterable[int]
+        """
+        for index in indexes:
+            self._view[index] += 1
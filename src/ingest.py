@@ -0,0 +1,132 @@
+import argparse
+import csv
+import json
+import os
+import sys
+from collections.abc import Iterator
+
+from application.exceptions import FlatAlreadyExists, FlatNotFound, UserNotFound
+from application.use_cases import (
+    DepositMany,
+    ImportFlats,
+    UpdatePrices,
+    check_amount,
+)
+from domain.entities import Flat
+from domain.exceptions import InvalidAmount, InvalidFlat
+from infrastructure.resources import get_resources
+
+FORMATS = ("csv", "jsonl")
+
+
+class InvalidRecord(Exception):
+    """Raised when a record of the input file cannot be loaded."""
+
+    def __init__(self, line: int, error: Exception) -> None:
+        super().__init__(f"line {line}: {error}")
+        self.line = line
+
+
+def read_records(
+    path: str, file_format: str | None = None
+) -> Iterator[tuple[int, dict]]:
+    """Streams the records of a CSV file with a header or of a JSON-lines file.
+
+    :param path: Path to the file.
+    :type path: str
+    :param file_format: ``csv`` or ``jsonl``.  Guessed from the file extension
+        when not passed.
+    :type file_format: str | None
+    :return: Records with the number of the line they end on.
+    :rtype: Iterator[tuple[int, dict]]
+    """
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    with open(path, "r", encoding="UTF-8", newline="") as file:
+        if file_format == "csv":
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record
+        elif file_format == "jsonl":
+            for line, text in enumerate(file, 1):
+                if text.strip():
+                    try:
+                        yield line, json.loads(text)
+                    except json.JSONDecodeError as error:
+                        raise InvalidRecord(line, error)
+        else:
+            raise ValueError(f"Unknown file format: {file_format}")
+
+
+def _read_flats(records: Iterator[tuple[int, dict]]) -> Iterator[Flat]:
+    for line, record in records:
+        try:
+            flat = Flat(
+                id=int(record["id"]),
+                address=str(record["address"]),
+                number=int(record["number"]),
+                floor=int(record["floor"]),
+                room_amount=int(record["room_amount"]),
+                price=int(record["price"]),
+                is_available=True,
+            )
+            flat.check()
+        except (KeyError, TypeError, ValueError, InvalidFlat) as error:
+            raise InvalidRecord(line, error)
+        yield flat
+
+
+def _read_pairs(
+    records: Iterator[tuple[int, dict]], key: str, value: str
+) -> Iterator[tuple[int, int]]:
+    for line, record in records:
+        try:
+            pair = int(record[key]), int(record[value])
+            check_amount(pair[1])
+        except (KeyError, TypeError, ValueError, InvalidAmount) as error:
+            raise InvalidRecord(line, error)
+        yield pair
+
+
+def main() -> None:
+    """Loads a file into the storage chosen by ``STORAGE_BACKEND``.
+
+    Run from the ``src`` directory, e.g.::
+
+        python ingest.py flats catalogue.csv
+        python ingest.py prices prices.jsonl
+        python ingest.py deposits top_ups.csv
+
+    Flats need ``id, number, floor, room_amount, price, address`` fields,
+    prices need ``flat_id, price`` and deposits need ``user_id, amount``.
+
+    Records are loaded in chunks.  The script stops with exit status 1 at the
+    first invalid record or the first chunk rejected by the storage, e.g. a
+    flat with an existing ID.  The chunks before it stay loaded.
+    """
+    parser = argparse.ArgumentParser(description="Loads data in bulk.")
+    parser.add_argument("kind", choices=("flats", "prices", "deposits"))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, dest="file_format")
+    args = parser.parse_args()
+
+    resources = get_resources()
+    records = read_records(args.path, args.file_format)
+    try:
+        match args.kind:
+            case "flats":
+                uc = ImportFlats(market_repo=resources.market_repo)
+                count = uc.execute(_read_flats(records))
+            case "prices":
+                uc = UpdatePrices(market_repo=resources.market_repo)
+                count = uc.execute(_read_pairs(records, "flat_id", "price"))
+            case "deposits":
+                uc = DepositMany(user_repo=resources.user_repo)
+                count = uc.execute(_read_pairs(records, "user_id", "amount"))
+    except (InvalidRecord, FlatAlreadyExists, FlatNotFound, UserNotFound) as error:
+        sys.exit(f"Could not load {args.path}: {error}")
+
+    print(f"Loaded {count} {args.kind} from {args.path}")
+
+
+if __name__ == "__main__":
+    main()
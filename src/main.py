@@ -1,26 +1,71 @@
+import importlib
+import os
+from collections.abc import Callable
+
 import streamlit as st
 
-import ui.pages.account as account_page
-import ui.pages.auth as auth_page
-import ui.pages.home as home_page
-from infrastructure.db import LocalMarketDatabase, LocalUserDatabase
-from infrastructure.security import Sha256Hasher
+from application.cache import UseCaseCache
+from application.exceptions import UserNotFound
+from application.metrics import METRICS
+from application.use_cases import GetUser
+from infrastructure.resources import get_resources
+from ui.components.notifications import show_flashed_messages
+
+ADMIN_USERNAMES = frozenset(
+    filter(None, os.environ.get("ADMIN_USERNAMES", "").split(","))
+)
+
+
+def lazy_page(name: str) -> Callable[[], None]:
+    """Returns the entry point of a page which imports its module on first run.
+
+    Page modules pull in heavy dependencies, e.g. pillow or pandas, so they
+    are only imported when one of their pages is opened.
+
+    :param name: Module name in the ``ui.pages`` package.
+    :type name: str
+    :return: Function rendering the page.
+    :rtype: Callable[[], None]
+    """
+
+    def render() -> None:
+        importlib.import_module(f"ui.pages.{name}").render()
+
+    return render
 
 
 def logout():
     st.session_state.pop("user_id", None)
+    st.session_state.use_case_cache.clear()
     st.rerun()
 
 
+def is_admin() -> bool:
+    """Checks whether the logged in user is listed in ``ADMIN_USERNAMES``."""
+    if not ADMIN_USERNAMES:
+        return False
+
+    uc = GetUser(
+        user_repo=st.session_state.user_repo, cache=st.session_state.use_case_cache
+    )
+    try:
+        return uc.execute(st.session_state.user_id).username in ADMIN_USERNAMES
+    except UserNotFound:
+        return False
+
+
 def main():
-    st.session_state.user_repo = LocalUserDatabase()
-    st.session_state.market_repo = LocalMarketDatabase()
-    st.session_state.hasher = Sha256Hasher()
+    resources = get_resources()
+    st.session_state.user_repo = resources.user_repo
+    st.session_state.market_repo = resources.market_repo
+    st.session_state.hasher = resources.hasher
+    if "use_case_cache" not in st.session_state:
+        st.session_state.use_case_cache = UseCaseCache()
 
     if "user_id" not in st.session_state:
         pages = [
             st.Page(
-                auth_page.render,
+                lazy_page("auth"),
                 url_path="login",
                 title="Авторизация",
                 icon=":material/login:",
@@ -30,13 +75,19 @@ def main():
         pages = {
             "": [
                 st.Page(
-                    home_page.render,
+                    lazy_page("home"),
                     url_path="home",
                     title="Главная",
                     icon=":material/home:",
                 ),
                 st.Page(
-                    account_page.render,
+                    lazy_page("stats"),
+                    url_path="stats",
+                    title="Статистика рынка",
+                    icon=":material/bar_chart:",
+                ),
+                st.Page(
+                    lazy_page("account"),
                     url_path="me",
                     title="Личный кабинет",
                     icon=":material/account_circle:",
@@ -49,9 +100,21 @@ def main():
                 ),
             ],
         }
+        if is_admin():
+            pages[""].insert(
+                -1,
+                st.Page(
+                    lazy_page("diagnostics"),
+                    url_path="diagnostics",
+                    title="Диагностика",
+                    icon=":material/monitoring:",
+                ),
+            )
 
-    pages = st.navigation(pages)
-    pages.run()
+    page = st.navigation(pages)
+    show_flashed_messages()
+    with METRICS.trace(f"page:{page.url_path}"):
+        page.run()
 
 
 if __name__ == "__main__":
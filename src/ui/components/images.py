@@ -0,0 +1,180 @@
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+from application.metrics import METRICS
+
+FLAT_IMAGES_PATH = "ui/assets/flat_images"
+PLACEHOLDER_IMAGE_PATH = "ui/assets/image_placeholder.jpg"
+THUMBNAILS_PATH = "data/thumbnails"
+CARD_IMAGE_WIDTH = 360
+
+
+class ImageService:
+    """Card-sized thumbnails of the flat images.
+
+    Thumbnails are made once per source image version, the modification time
+    of the source file, stored as WebP files in the thumbnail directory and
+    kept in a bounded in-memory LRU of bytes.  Source images are found by one
+    scan of the image directory, repeated only when the directory changes and
+    at most once per ``rescan_interval`` seconds.  A file overwritten in place
+    does not change the directory, so the modification time of a source is
+    checked again when its thumbnail is made and at most once per
+    ``rescan_interval`` seconds when it is served, and rendering a card
+    mostly does not touch the disk.
+    """
+
+    def __init__(
+        self,
+        images_path: str,
+        placeholder_path: str,
+        thumbnails_path: str,
+        width: int,
+        max_bytes: int = 32 * 1024**2,
+        rescan_interval: float = 5.0,
+    ) -> None:
+        self._images_path = images_path
+        self._placeholder_path = placeholder_path
+        self._thumbnails_path = thumbnails_path
+        self._width = width
+        self._max_bytes = max_bytes
+        self._rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        # Path, modification time and the time it was checked by flat ID.
+        self._sources: dict[int | None, tuple[str, int, float]] = {}
+        self._directory_mtime: int | None = None
+        self._scanned_at = -float("inf")
+        self._thumbnails: OrderedDict[tuple, bytes] = OrderedDict()
+        self._size = 0
+
+    def _scan(self) -> None:
+        now = time.monotonic()
+        if now - self._scanned_at < self._rescan_interval:
+            return
+        self._scanned_at = now
+
+        try:
+            directory_mtime = os.stat(self._images_path).st_mtime_ns
+        except FileNotFoundError:
+            directory_mtime = None
+        if directory_mtime == self._directory_mtime and directory_mtime is not None:
+            return
+
+        sources = {}
+        if directory_mtime is not None:
+            with os.scandir(self._images_path) as entries:
+                for entry in entries:
+                    stem, extension = os.path.splitext(entry.name)
+                    if stem.isdigit() and extension == ".jpg" and entry.is_file():
+                        sources[int(stem)] = (
+                            entry.path,
+                            entry.stat().st_mtime_ns,
+                            now,
+                        )
+        sources[None] = (
+            self._placeholder_path,
+            self._source_mtime(self._placeholder_path) or 0,
+            now,
+        )
+
+        self._sources = sources
+        self._directory_mtime = directory_mtime
+
+    @staticmethod
+    def _source_mtime(path: str) -> int | None:
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _source(self, flat_id: int, refresh: bool) -> tuple[str, int]:
+        """Returns the path and the modification time of the flat image, or of
+        the placeholder.  Call under the lock.
+
+        :param refresh: Whether to check the modification time regardless of
+            the time it was checked.
+        :type refresh: bool
+        """
+        key = flat_id if flat_id in self._sources else None
+        path, mtime, checked_at = self._sources[key]
+        now = time.monotonic()
+        if refresh or now - checked_at >= self._rescan_interval:
+            current_mtime = self._source_mtime(path)
+            if current_mtime is None and key is not None:
+                # The image was removed, the next read scans the directory.
+                self._scanned_at = -float("inf")
+                del self._sources[key]
+                return self._source(flat_id, refresh)
+            mtime = current_mtime or 0
+            self._sources[key] = (path, mtime, now)
+        return path, mtime
+
+    def _make_thumbnail(self, path: str, mtime: int) -> bytes:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        thumbnail_path = os.path.join(
+            self._thumbnails_path, f"{stem}-{mtime}-{self._width}.webp"
+        )
+        try:
+            with open(thumbnail_path, "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            pass
+
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            image.thumbnail((self._width, self._width))
+            buffer = io.BytesIO()
+            image.save(buffer, format="WEBP", quality=80, method=4)
+        data = buffer.getvalue()
+
+        os.makedirs(self._thumbnails_path, exist_ok=True)
+        tmp_path = f"{thumbnail_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, thumbnail_path)
+        return data
+
+    def get_flat_image(self, flat_id: int) -> bytes:
+        """Returns the card thumbnail of the flat, or of the placeholder.
+
+        :param flat_id: ID of the flat.
+        :type flat_id: int
+        :return: WebP encoded thumbnail.
+        :rtype: bytes
+        """
+        with self._lock:
+            self._scan()
+            path, mtime = self._source(flat_id, refresh=False)
+            key = (path, mtime)
+            data = self._thumbnails.get(key)
+            if data is not None:
+                self._thumbnails.move_to_end(key)
+                METRICS.increment(
+                    "cache_requests_total", cache="thumbnail", result="hit"
+                )
+                return data
+
+            path, mtime = self._source(flat_id, refresh=True)
+            key = (path, mtime)
+
+        METRICS.increment("cache_requests_total", cache="thumbnail", result="miss")
+        data = self._make_thumbnail(path, mtime)
+        with self._lock:
+            if key not in self._thumbnails:
+                self._thumbnails[key] = data
+                self._size += len(data)
+                while self._size > self._max_bytes and len(self._thumbnails) > 1:
+                    self._size -= len(self._thumbnails.popitem(last=False)[1])
+        return data
+
+
+FLAT_IMAGES = ImageService(
+    images_path=FLAT_IMAGES_PATH,
+    placeholder_path=PLACEHOLDER_IMAGE_PATH,
+    thumbnails_path=THUMBNAILS_PATH,
+    width=CARD_IMAGE_WIDTH,
+)
@@ -0,0 +1,26 @@
+import streamlit as st
+
+FLASH_MESSAGES_KEY = "flash_messages"
+
+
+def flash(message: str, icon: str | None = None) -> None:
+    """Queues a toast to be shown by the next run of the page or fragment.
+
+    Unlike a toast shown right before ``st.rerun``, the message is kept in
+    the session state, so it survives any rerun, a fragment one included.
+
+    :param message: Text of the notification.
+    :type message: str
+    :param icon: Emoji or Material icon shown next to the text.
+    :type icon: str | None
+    """
+    st.session_state.setdefault(FLASH_MESSAGES_KEY, []).append((message, icon))
+
+
+def show_flashed_messages() -> None:
+    """Shows and forgets the queued notifications.
+
+    Called at the start of the app and of every fragment able to queue them.
+    """
+    for message, icon in st.session_state.pop(FLASH_MESSAGES_KEY, []):
+        st.toast(message, icon=icon)
@@ -1,50 +1,49 @@
+from collections.abc import Callable
 from typing import Literal
 
 import streamlit as st
 
 
-@st.dialog("Вы уверены?")
-def display_confirmation_window(key: str) -> None:
-    """Renders confirmation dialog window.
-
-    :param key: Key to be passed to the streamlit components.  Must be unique.
-    :type key: str
-    """
-    st.session_state[f"confirmed_{key}"] = False
-    col1, col2 = st.columns(2)
-    if col1.button("Да", use_container_width=True):
-        st.session_state[f"confirmed_{key}"] = True
-        st.rerun()
-    elif col2.button("Нет", type="primary", use_container_width=True):
-        st.rerun()
-
-
-@st.fragment
 def confirm_button(
     label: str,
     key: str,
+    on_confirm: Callable,
+    args: tuple = (),
+    kwargs: dict | None = None,
     button_type: Literal["primary", "secondary", "tertiary"] = "secondary",
-    use_container_width: bool = False,
+    width: Literal["content", "stretch"] | int = "content",
     disabled: bool = False,
-):
-    def decorator(function):
-        def wrapper(*args, **kwargs) -> None:
-            if st.button(
-                label,
-                type=button_type,
-                use_container_width=use_container_width,
-                key=key,
-                disabled=disabled,
-            ):
-                display_confirmation_window(key)
-
-            if (
-                f"confirmed_{key}" in st.session_state
-                and st.session_state[f"confirmed_{key}"]
-            ):
-                st.session_state.pop(f"confirmed_{key}", None)
-                function(*args, **kwargs)
+) -> None:
+    """Renders a button asking for a confirmation before the action.
 
-        return wrapper
+    The action runs as a widget callback, i.e. before the rerun caused by the
+    click, so the rerun already renders its result.  Within a fragment only
+    the fragment is rerun.
 
-    return decorator
+    :param label: Label of the button.
+    :type label: str
+    :param key: Key to be passed to the streamlit components.  Must be unique.
+    :type key: str
+    :param on_confirm: Action to be run once confirmed.
+    :type on_confirm: Callable
+    :param args: Positional arguments of the action.
+    :type args: tuple
+    :param kwargs: Keyword arguments of the action.
+    :type kwargs: dict | None
+    """
+    with st.popover(
+        label,
+        type=button_type,
+        disabled=disabled,
+        width=width,
+    ):
+        st.write("Вы уверены?")
+        st.button(
+            "Да",
+            key=key,
+            type="primary",
+            on_click=on_confirm,
+            args=args,
+            kwargs=kwargs,
+            width="stretch",
+        )
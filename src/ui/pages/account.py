@@ -1,6 +1,3 @@
-import os
-import time
-
 import streamlit as st
 
 from application.exceptions import UsernameTaken
@@ -9,105 +6,184 @@ from application.ports import (
     PasswordHasher,
     UserDatabaseRepository,
 )
-from application.use_cases import GetUser, GetUserProperty, SellFlat
+from application.use_cases import (
+    AddMoney,
+    EditProfile,
+    GetUser,
+    GetUserProperty,
+    SellFlat,
+)
 from domain.exceptions import InvalidPassword, InvalidUsername
 
+from ..components.images import FLAT_IMAGES
+from ..components.notifications import flash, show_flashed_messages
 from ..components.streamlit_elements import confirm_button
 
-from application.use_cases import AddMoney, EditProfile
+# Session state key of the open form, "add_money" or "edit_profile".
+ACCOUNT_FORM_KEY = "account_form"
 
 
-@st.dialog(title="Пополнить баланс")
-def display_add_money_popup(user_repo: UserDatabaseRepository):
-    amount = st.number_input("Введите сумму", min_value=0, step=10_000)
+def toggle_form(form: str) -> None:
+    """Opens the form, or closes it if it is open.  Runs as a button callback."""
+    if st.session_state.get(ACCOUNT_FORM_KEY) == form:
+        st.session_state[ACCOUNT_FORM_KEY] = None
+    else:
+        st.session_state[ACCOUNT_FORM_KEY] = form
 
-    col1, _ = st.columns(2)
-    if col1.button(
-        "Пополнить", type="primary", use_container_width=True, disabled=amount == 0
-    ):
-        uc = AddMoney(user_repo=user_repo)
 
-        try:
-            uc.execute(user_id=st.session_state.user_id, amount=amount)
-        except Exception:
-            st.error("Произошла непредвиденная ошибка, попробуйте позже")
-            return
+def add_money(user_repo: UserDatabaseRepository) -> None:
+    """Tops the balance up.  Runs as a callback of the form button, so the
+    fragment rerun caused by the click shows the new balance.
 
-        st.success("Баланс успешно пополнен")
-        time.sleep(1)
-        st.rerun()
+    :param user_repo: Repository to provide user implementation linking.
+    :type user_repo: UserDatabaseRepository
+    """
+    uc = AddMoney(user_repo=user_repo, cache=st.session_state.use_case_cache)
+    try:
+        uc.execute(
+            user_id=st.session_state.user_id,
+            amount=st.session_state.add_money_amount,
+        )
+    except Exception:
+        flash("Произошла непредвиденная ошибка, попробуйте позже")
+        return
 
+    st.session_state[ACCOUNT_FORM_KEY] = None
+    flash("Баланс успешно пополнен")
 
-@st.dialog(title="Редактировать профиль")
-def display_edit_profile_popup(
-    user_repo: UserDatabaseRepository, hasher: PasswordHasher
-):
-    new_username = st.text_input("Новый логин (если не меняется, оставьте пустым)")
-    new_password = st.text_input(
-        "Новый пароль (если не меняется, оставьте пустым)", type="password"
-    )
-    st.caption(
-        "От 8 до 20 символов, может содержать только буквы латинского алфавита, цифры и символы из набора !@#$%^&*()_+-="
+
+def edit_profile(user_repo: UserDatabaseRepository, hasher: PasswordHasher) -> None:
+    """Changes the username and the password.  Runs as a callback of the form
+    button, like :func:`add_money`.  The form stays open on errors.
+
+    :param user_repo: Repository to provide user implementation linking.
+    :type user_repo: UserDatabaseRepository
+    :param hasher: Repository to provide password hasher implementation linking.
+    :type hasher: PasswordHasher
+    """
+    uc = EditProfile(
+        user_repo=user_repo,
+        hasher=hasher,
+        cache=st.session_state.use_case_cache,
     )
+    try:
+        uc.execute(
+            user_id=st.session_state.user_id,
+            new_username=st.session_state.new_username,
+            new_password=st.session_state.new_password,
+        )
+    except InvalidUsername:
+        flash(
+            "Имя пользователя может содержать только буквы латинского алфавита и цифры"
+        )
+        return
+    except InvalidPassword:
+        flash("Введенный пароль не соответствует формату")
+        return
+    except UsernameTaken:
+        flash("Имя пользователя уже используется")
+        return
+    except Exception:
+        flash("Произошла непредвиденная ошибка, попробуйте позже")
+        return
 
-    col1, _ = st.columns(2)
-    if col1.button(
-        "Сохранить",
-        type="primary",
-        disabled=not new_username and not new_password,
-        use_container_width=True,
-    ):
-        uc = EditProfile(user_repo=user_repo, hasher=hasher)
-        try:
-            uc.execute(
-                user_id=st.session_state.user_id,
-                new_username=new_username,
-                new_password=new_password,
-            )
-        except InvalidUsername:
-            st.error(
-                "Имя пользователя может содержать только буквы латинского алфавита и цифры"
-            )
-            return
-        except InvalidPassword:
-            st.error("Введенный пароль не соответствует формату")
-            return
-        except UsernameTaken:
-            st.error("Имя пользователя уже используется")
-            return
-        except Exception:
-            st.error("Произошла непредвиденная ошибка, попробуйте позже")
-            return
-
-        st.success("Профиль успешно обновлен")
-        time.sleep(1)
-        st.rerun()
+    st.session_state[ACCOUNT_FORM_KEY] = None
+    flash("Профиль успешно обновлен")
+
+
+def display_add_money_form(user_repo: UserDatabaseRepository) -> None:
+    """Displays the balance top up form.
+
+    :param user_repo: Repository to provide user implementation linking.
+    :type user_repo: UserDatabaseRepository
+    """
+    with st.container(border=True):
+        amount = st.number_input(
+            "Введите сумму", min_value=0, step=10_000, key="add_money_amount"
+        )
+        st.button(
+            "Пополнить",
+            type="primary",
+            width="stretch",
+            disabled=amount == 0,
+            on_click=add_money,
+            args=(user_repo,),
+        )
+
+
+def display_edit_profile_form(
+    user_repo: UserDatabaseRepository, hasher: PasswordHasher
+) -> None:
+    """Displays the profile editing form.
+
+    :param user_repo: Repository to provide user implementation linking.
+    :type user_repo: UserDatabaseRepository
+    :param hasher: Repository to provide password hasher implementation linking.
+    :type hasher: PasswordHasher
+    """
+    with st.container(border=True):
+        new_username = st.text_input(
+            "Новый логин (если не меняется, оставьте пустым)", key="new_username"
+        )
+        new_password = st.text_input(
+            "Новый пароль (если не меняется, оставьте пустым)",
+            type="password",
+            key="new_password",
+        )
+        st.caption(
+            "От 8 до 20 символов, может содержать только буквы латинского алфавита, цифры и символы из набора !@#$%^&*()_+-="
+        )
+        st.button(
+            "Сохранить",
+            type="primary",
+            width="stretch",
+            disabled=not new_username and not new_password,
+            on_click=edit_profile,
+            args=(user_repo, hasher),
+        )
 
 
-@st.fragment
 def display_user_info(
     user_repo: UserDatabaseRepository, hasher: PasswordHasher
 ) -> None:
     """Displays users personal information.
 
+    The forms are shown in the page fragment rather than in dialogs, which
+    can only be closed by a rerun of the whole app, so that saving a form
+    reruns only the fragment.
+
     :param user_repo: Repository to provide user implementations linking.
     :type user_repo: UserDatabaseRepository
     """
-    uc = GetUser(user_repo=user_repo)
+    uc = GetUser(user_repo=user_repo, cache=st.session_state.use_case_cache)
     user = uc.execute(st.session_state.user_id)
+    form = st.session_state.get(ACCOUNT_FORM_KEY)
 
     st.title("Личный кабинет")
 
     col1, _, col3 = st.columns([3, 1, 3])
     with col1:
         st.image("ui/assets/user.jpg", width="stretch")
-        if st.button("Редактировать профиль", use_container_width=True):
-            display_edit_profile_popup(user_repo=user_repo, hasher=hasher)
+        st.button(
+            "Редактировать профиль",
+            width="stretch",
+            on_click=toggle_form,
+            args=("edit_profile",),
+        )
+        if form == "edit_profile":
+            display_edit_profile_form(user_repo=user_repo, hasher=hasher)
     with col3:
         st.subheader(f"Логин: {user.username}")
         st.subheader(f"Баланс: {user.balance:,} ₽".replace(",", " "))
-        if st.button("Пополнить баланс", type="primary", use_container_width=True):
-            display_add_money_popup(user_repo=user_repo)
+        st.button(
+            "Пополнить баланс",
+            type="primary",
+            width="stretch",
+            on_click=toggle_form,
+            args=("add_money",),
+        )
+        if form == "add_money":
+            display_add_money_form(user_repo=user_repo)
 
 
 def sell_flat(
@@ -115,7 +191,7 @@ def sell_flat(
     user_repo: UserDatabaseRepository,
     market_repo: MarketDatabaseRepository,
 ) -> None:
-    """Triggers flat selling.
+    """Triggers flat selling.  Runs as a callback of the sell button.
 
     :param flat_id: ID of the flat to be sold.
     :type flat_id: int
@@ -124,20 +200,20 @@ def sell_flat(
     :param market_repo: Repository to provide market implementation linking.
     :type market_repo: MarketDatabaseRepository
     """
-    uc = SellFlat(user_repo=user_repo, market_repo=market_repo)
+    uc = SellFlat(
+        user_repo=user_repo,
+        market_repo=market_repo,
+        cache=st.session_state.use_case_cache,
+    )
     try:
         uc.execute(user_id=st.session_state.user_id, flat_id=flat_id)
     except Exception:
-        st.toast("Произошла непредвиденная ошибка, попробуйте позже")
-        time.sleep(1)
-        st.rerun()
+        flash("Произошла непредвиденная ошибка, попробуйте позже")
+        return
 
-    st.toast("Квартира успешно продана")
-    time.sleep(1)
-    st.rerun()
+    flash("Квартира успешно продана")
 
 
-@st.fragment
 def display_user_property(
     user_repo: UserDatabaseRepository, market_repo: MarketDatabaseRepository
 ) -> None:
@@ -148,7 +224,7 @@ def display_user_property(
     :param market_repo: Repository to provide market implementation linking.
     :type market_repo: MarketDatabaseRepository
     """
-    uc = GetUserProperty(user_repo=user_repo)
+    uc = GetUserProperty(user_repo=user_repo, cache=st.session_state.use_case_cache)
     user_property = uc.execute(st.session_state.user_id)
 
     if not user_property.properties:
@@ -166,36 +242,52 @@ def display_user_property(
                 display_text = title_text
             st.markdown(f"#### {display_text}", help=title_text)
 
-            image_path = f"ui/assets/flat_images/{flat.id}.jpg"
-            if os.path.exists(image_path):
-                st.image(image_path, width="stretch")
-            else:
-                st.image("ui/assets/image_placeholder.jpg", width="stretch")
+            st.image(FLAT_IMAGES.get_flat_image(flat.id), width="stretch")
 
             st.write(f"Количество комнат: {flat.room_amount}")
             st.markdown(f"#### {flat.price:,} ₽".replace(",", " "))
 
-            confirm_button_wrapper = confirm_button(
+            confirm_button(
                 label="Продать",
+                key=f"sell_button{flat.id}",
+                on_confirm=sell_flat,
+                args=(flat.id, user_repo, market_repo),
                 button_type="primary",
-                key=f"sell_button{i}",
-                use_container_width=True,
-            )
-            confirm_button_function = confirm_button_wrapper(sell_flat)
-            confirm_button_function(
-                flat_id=flat.id, user_repo=user_repo, market_repo=market_repo
+                width="stretch",
             )
 
 
-def render() -> None:
-    """Main function of the page.  Renders all its content."""
-    display_user_info(
-        user_repo=st.session_state.user_repo, hasher=st.session_state.hasher
-    )
+@st.fragment
+def display_account(
+    user_repo: UserDatabaseRepository,
+    market_repo: MarketDatabaseRepository,
+    hasher: PasswordHasher,
+) -> None:
+    """Displays the user information and property.
+
+    A sale or a saved form reruns only this fragment, refreshing the balance
+    and the property list together.
+
+    :param user_repo: Repository to provide user implementation linking.
+    :type user_repo: UserDatabaseRepository
+    :param market_repo: Repository to provide market implementation linking.
+    :type market_repo: MarketDatabaseRepository
+    :param hasher: Repository to provide password hasher implementation linking.
+    :type hasher: PasswordHasher
+    """
+    show_flashed_messages()
+    display_user_info(user_repo=user_repo, hasher=hasher)
 
     st.container(height=100, border=False)
 
     st.header("Ваша собственность")
-    display_user_property(
-        user_repo=st.session_state.user_repo, market_repo=st.session_state.market_repo
+    display_user_property(user_repo=user_repo, market_repo=market_repo)
+
+
+def render() -> None:
+    """Main function of the page.  Renders all its content."""
+    display_account(
+        user_repo=st.session_state.user_repo,
+        market_repo=st.session_state.market_repo,
+        hasher=st.session_state.hasher,
     )
@@ -1,5 +1,3 @@
-import time
-
 import streamlit as st
 
 from application.exceptions import InvalidCredentials, UsernameTaken
@@ -7,6 +5,8 @@ from application.ports import PasswordHasher, UserDatabaseRepository
 from application.use_cases import Login, Register
 from domain.exceptions import InvalidPassword, InvalidUsername
 
+from ..components.notifications import flash
+
 
 @st.dialog("Регистрация")
 def display_registration_popup(
@@ -53,8 +53,7 @@ def display_registration_popup(
             st.error("Произошла непредвиденная ошибка, попробуйте позже")
             return
 
-        st.success("Вы успешно зарегистрировались")
-        time.sleep(1)
+        flash("Вы успешно зарегистрировались")
         st.rerun()
 
 
@@ -78,11 +77,11 @@ def display_login_form(
         col1, col2, _ = st.columns([3, 3, 4])
 
         if col2.form_submit_button(
-            "Зарегистрироваться", type="primary", use_container_width=True
+            "Зарегистрироваться", type="primary", width="stretch"
         ):
             display_registration_popup(user_repo=user_repo, hasher=hasher)
 
-        if col1.form_submit_button("Войти", use_container_width=True):
+        if col1.form_submit_button("Войти", width="stretch"):
             try:
                 st.session_state.user_id = login_uc.execute(
                     username=username, password=password
@@ -94,8 +93,7 @@ def display_login_form(
                 st.error("Произошла непредвиденная ошибка, попробуйте позже")
                 return
 
-            st.toast(body="Авторизация прошла успешно")
-            time.sleep(1)
+            flash("Авторизация прошла успешно")
             st.rerun()
 
 
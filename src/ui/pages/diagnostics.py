@@ -0,0 +1,149 @@
+import time
+
+import pandas as pd
+import streamlit as st
+
+from application.metrics import METRICS, Trace
+
+
+def _operations_frame() -> pd.DataFrame:
+    errors = {
+        dict(labels)["operation"]: value
+        for (name, labels), value in METRICS.counters().items()
+        if name == "call_errors_total"
+    }
+    rows = []
+    for (name, labels), histogram in METRICS.histograms().items():
+        if name != "call_duration_seconds":
+            continue
+        operation = dict(labels)["operation"]
+        rows.append(
+            {
+                "Операция": operation,
+                "Вызовов": histogram.count,
+                "Ошибок": int(errors.get(operation, 0)),
+                "Всего, с": histogram.total,
+                "Среднее, мс": histogram.total / histogram.count * 1000,
+                "p50 ≤, мс": histogram.quantile(0.50) * 1000,
+                "p95 ≤, мс": histogram.quantile(0.95) * 1000,
+                "p99 ≤, мс": histogram.quantile(0.99) * 1000,
+            }
+        )
+    frame = pd.DataFrame(rows)
+    if frame.empty:
+        return frame
+    return frame.sort_values("Всего, с", ascending=False).set_index("Операция")
+
+
+def _counter_frame(metric: str, index: str, columns: str) -> pd.DataFrame:
+    rows = [
+        {**dict(labels), "value": value}
+        for (name, labels), value in METRICS.counters().items()
+        if name == metric
+    ]
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows).pivot_table(
+        index=index, columns=columns, values="value", aggfunc="sum", fill_value=0
+    )
+
+
+def display_caches() -> None:
+    """Displays hit ratios of the caches."""
+    caches = _counter_frame("cache_requests_total", "cache", "result")
+    if caches.empty:
+        st.caption("Обращений к кэшам не было")
+        return
+
+    for column in ("hit", "miss"):
+        if column not in caches:
+            caches[column] = 0
+    caches["Доля попаданий"] = caches["hit"] / (caches["hit"] + caches["miss"])
+    st.dataframe(caches, width="stretch")
+
+
+def display_io() -> None:
+    """Displays amounts of bytes read and written by the local storage."""
+    io = _counter_frame("io_bytes_total", "file", "direction")
+    if io.empty:
+        st.caption("Чтений и записей не было")
+        return
+    st.dataframe(io, width="stretch")
+
+
+def display_trace(trace: Trace) -> None:
+    """Displays the breakdown of one traced request.
+
+    :param trace: Trace of the request.
+    :type trace: Trace
+    """
+    measured = sum(span.duration for span in trace.spans if span.depth == 0)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Всего, мс", f"{trace.duration * 1000:.1f}")
+    col2.metric("В вызовах, мс", f"{measured * 1000:.1f}")
+    col3.metric("Рендеринг и прочее, мс", f"{(trace.duration - measured) * 1000:.1f}")
+
+    spans = pd.DataFrame(
+        {
+            "Вызов": ["    " * span.depth + span.name for span in trace.spans],
+            "Начало, мс": [span.offset * 1000 for span in trace.spans],
+            "Длительность, мс": [span.duration * 1000 for span in trace.spans],
+            "Ошибка": [span.failed for span in trace.spans],
+        }
+    )
+    st.dataframe(spans, hide_index=True, width="stretch")
+
+
+def display_traces() -> None:
+    """Displays the recent traced requests and the breakdown of the chosen one."""
+    traces = METRICS.traces()
+    if not traces:
+        st.caption("Запросов ещё не было")
+        return
+
+    trace = st.selectbox(
+        "Запрос",
+        options=traces,
+        format_func=lambda trace: (
+            f"{time.strftime('%H:%M:%S', time.localtime(trace.started_at))}"
+            f" · {trace.name} · {trace.duration * 1000:.0f} мс · {trace.trace_id}"
+        ),
+    )
+    display_trace(trace)
+
+
+def render() -> None:
+    """Main function of the page.  Renders all its content."""
+    st.title("Диагностика")
+
+    col1, col2 = st.columns([3, 1])
+    METRICS.enabled = col1.toggle("Собирать метрики", value=METRICS.enabled)
+    if col2.button("Сбросить", width="stretch"):
+        METRICS.reset()
+
+    if not METRICS.enabled:
+        st.info(
+            "Сбор метрик выключен.  Его можно включить здесь или переменной"
+            " окружения METRICS_ENABLED=1"
+        )
+
+    st.subheader("Операции")
+    operations = _operations_frame()
+    if operations.empty:
+        st.caption("Вызовов ещё не было")
+    else:
+        st.dataframe(operations, width="stretch")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Кэши")
+        display_caches()
+    with col2:
+        st.subheader("Ввод-вывод, байт")
+        display_io()
+
+    st.subheader("Последние запросы")
+    display_traces()
+
+    with st.expander("Метрики в формате Prometheus"):
+        st.code(METRICS.render(), language="text")
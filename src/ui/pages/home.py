@@ -1,96 +1,156 @@
-import os
-import time
+from dataclasses import replace
 
 import streamlit as st
 
+from application.exceptions import ItemAlreadySold
 from application.ports import MarketDatabaseRepository, UserDatabaseRepository
-from application.use_cases import BuyFlat, GetFlatList
-from domain.entities import Flat
+from application.use_cases import BuyFlat, GetFlatFacets, GetFlatPage
+from domain.entities import Flat, FlatPage
 from domain.exceptions import NotEnoughMoney
+from domain.value_objects import FlatQuery
 
+from ..components.images import FLAT_IMAGES
+from ..components.notifications import flash, show_flashed_messages
 from ..components.streamlit_elements import confirm_button
 
+FLAT_PAGE_SIZE = 10
 
-def display_filters(flats: list[Flat]) -> list[Flat]:
-    """Filters cards by several custom parameters.
 
-    :param flats: List of the flats to be filtered.
-    :type flats: list[Flat]
-    :return: Filtered flat list.
-    :rtype: list[Flat]
+def display_filters(market_repo: MarketDatabaseRepository) -> FlatQuery:
+    """Displays catalogue filters by several custom parameters.
+
+    :param market_repo: Repository to provide market implementation linking.
+    :type market_repo: MarketDatabaseRepository
+    :return: Catalogue query built from the filters chosen by the user.
+    :rtype: FlatQuery
     """
     col1, col2 = st.columns(2)
+    uc = GetFlatFacets(market_repo)
 
+    facets = uc.execute()
     room_options = ["Все"]
-    if flats:
-        least_rooms_flat = min(flats, key=lambda flat: flat.room_amount)
-        most_rooms_flat = max(flats, key=lambda flat: flat.room_amount)
-        min_rooms = least_rooms_flat.room_amount
-        max_rooms = most_rooms_flat.room_amount
-        room_options += [n for n in range(min_rooms, max_rooms + 1)]
+    if facets.flat_amount:
+        room_options += [n for n in range(facets.min_rooms, facets.max_rooms + 1)]
     room_amount = col1.selectbox("Количество комнат", options=room_options)
-    flats = [
-        flat
-        for flat in flats
-        if room_amount == "Все" or flat.room_amount == room_amount
-    ]
+    only_available = col2.checkbox("Только квартиры в наличии")
 
-    if col2.checkbox("Только квартиры в наличии"):
-        flats = [flat for flat in flats if flat.is_available]
+    query = FlatQuery(
+        room_amount=None if room_amount == "Все" else room_amount,
+        only_available=only_available,
+    )
+    facets = uc.execute(query)
 
     min_price = 0
     max_price = 100_000_000
-    if flats:
-        cheapest_flat = min(flats, key=lambda flat: flat.price)
-        most_expensive_flat = max(flats, key=lambda flat: flat.price)
-        min_price = cheapest_flat.price
-        max_price = max(most_expensive_flat.price, min_price + 1)
+    if facets.flat_amount:
+        min_price = facets.min_price
+        max_price = max(facets.max_price, min_price + 1)
     price_range = st.slider(
         "Цена",
         min_value=min_price,
         max_value=max_price,
         value=(min_price, max_price),
         step=500_000,
-        disabled=not flats,
+        disabled=not facets.flat_amount,
     )
-    flats = [
-        flat
-        for flat in flats
-        if flat.price in range(price_range[0], price_range[1] + 1)
-    ]
 
-    return flats
+    return replace(query, min_price=price_range[0], max_price=price_range[1])
+
+
+def display_pager(flat_page: FlatPage) -> None:
+    """Displays catalogue page switcher.
+
+    :param flat_page: Currently displayed catalogue page.
+    :type flat_page: FlatPage
+    """
+    page = flat_page.offset // FLAT_PAGE_SIZE
+    page_amount = max((flat_page.total - 1) // FLAT_PAGE_SIZE + 1, 1)
+
+    col1, col2, col3 = st.columns([2, 3, 2])
+    col2.caption(
+        f"Страница {page + 1} из {page_amount}, найдено квартир: {flat_page.total}"
+    )
+    if col1.button("Назад", width="stretch", disabled=page == 0):
+        st.session_state.flat_page = page - 1
+        st.rerun(scope="fragment")
+    if col3.button("Вперед", width="stretch", disabled=page >= page_amount - 1):
+        st.session_state.flat_page = page + 1
+        st.rerun(scope="fragment")
 
 
 def buy_flat(
-    flat_id: int,
+    flat: Flat,
     user_repo: UserDatabaseRepository,
     market_repo: MarketDatabaseRepository,
 ) -> None:
     """Triggers flat purchase by the user.
 
-    :param flat_id: ID of the flat to be bought.
-    :type flat_id: int
+    Runs as a callback of the card, which then shows the flat as sold without
+    reading it again.
+
+    :param flat: Flat to be bought.
+    :type flat: Flat
     :param user_repo: Repository to provide user implementation linking.
     :type user_repo: UserDatabaseRepository
     :param market_repo: Repository to provide market implementation linking.
     :type market_repo: MarketDatabaseRepository
     """
-    uc = BuyFlat(user_repo=user_repo, market_repo=market_repo)
+    uc = BuyFlat(
+        user_repo=user_repo,
+        market_repo=market_repo,
+        cache=st.session_state.use_case_cache,
+    )
     try:
-        uc.execute(user_id=st.session_state.user_id, flat_id=flat_id)
+        uc.execute(user_id=st.session_state.user_id, flat_id=flat.id)
     except NotEnoughMoney:
-        st.toast("На балансе недостаточно средств")
-        time.sleep(1)
-        st.rerun()
+        flash("На балансе недостаточно средств")
+        return
+    except ItemAlreadySold:
+        st.session_state.changed_flats[flat.id] = replace(flat, is_available=False)
+        flash("Квартира уже продана")
+        return
     except Exception:
-        st.toast("Произошла непредвиденная ошибка, попробуйте позже")
-        time.sleep(1)
-        st.rerun()
+        flash("Произошла непредвиденная ошибка, попробуйте позже")
+        return
+
+    st.session_state.changed_flats[flat.id] = replace(flat, is_available=False)
+    flash("Оплата прошла успешно")
 
-    st.toast("Оплата прошла успешно")
-    time.sleep(1)
-    st.rerun()
+
+@st.fragment
+def display_flat_card(
+    flat: Flat, user_repo: UserDatabaseRepository, market_repo: MarketDatabaseRepository
+) -> None:
+    """Displays a flat card.  A purchase reruns only the card.
+
+    :param flat: Flat as read with the catalogue page.
+    :type flat: Flat
+    :param user_repo: Repository to provide user implementation linking.
+    :type user_repo: UserDatabaseRepository
+    :param market_repo: Repository to provide market implementation linking.
+    :type market_repo: MarketDatabaseRepository
+    """
+    show_flashed_messages()
+    flat = st.session_state.changed_flats.get(flat.id, flat)
+
+    title = f"{flat.address}, кв. {flat.number}"
+    display_text = title if len(title) <= 18 else f"{title:.18}..."
+    st.markdown(f"#### {display_text}", help=title)
+
+    st.image(FLAT_IMAGES.get_flat_image(flat.id), width="stretch")
+
+    st.write(f"Количество комнат: {flat.room_amount}")
+    st.markdown(f"#### {flat.price:,} ₽".replace(",", " "))
+
+    confirm_button(
+        label="Купить" if flat.is_available else "Продано",
+        key=f"buy_button{flat.id}",
+        on_confirm=buy_flat,
+        args=(flat, user_repo, market_repo),
+        button_type="primary",
+        width="stretch",
+        disabled=not flat.is_available,
+    )
 
 
 @st.fragment
@@ -104,52 +164,39 @@ def display_flat_cards(
     :param market_repo: Repository to provide market implementation linking.
     :type market_repo: MarketDatabaseRepository
     """
-    uc = GetFlatList(market_repo)
+    show_flashed_messages()
+    query = display_filters(market_repo)
+    st.divider()
+
+    if st.session_state.get("flat_page_query") != query:
+        st.session_state.flat_page_query = query
+        st.session_state.flat_page = 0
+
+    uc = GetFlatPage(market_repo)
     try:
-        flats = uc.execute()
+        offset = st.session_state.flat_page * FLAT_PAGE_SIZE
+        flat_page = uc.execute(replace(query, offset=offset, limit=FLAT_PAGE_SIZE))
+        if flat_page.total and not flat_page.flats:
+            st.session_state.flat_page = (flat_page.total - 1) // FLAT_PAGE_SIZE
+            offset = st.session_state.flat_page * FLAT_PAGE_SIZE
+            flat_page = uc.execute(replace(query, offset=offset, limit=FLAT_PAGE_SIZE))
     except Exception:
         st.error("Произошла непредвиденная ошибка, попробуйте позже")
         return
+    st.session_state.changed_flats = {}
 
-    flats = display_filters(flats)
-    flats.sort(key=lambda flat: flat.price)
-    st.divider()
-
+    flats = flat_page.flats
     if not flats:
         st.info("По вашему запросу ничего не найдено")
         return
 
+    display_pager(flat_page)
+
     column_amount = 2
     columns = st.columns(column_amount)
     for i, flat in enumerate(flats):
         with columns[i % column_amount].container(height=400, border=True):
-            title = f"{flat.address}, кв. {flat.number}"
-            display_text = title if len(title) <= 18 else f"{title:.18}..."
-            st.markdown(f"#### {display_text}", help=title)
-
-            card_image_path = f"ui/assets/flat_images/{flat.id}.jpg"
-            placeholder_image_path = "ui/assets/image_placeholder.jpg"
-            image_path = (
-                card_image_path
-                if os.path.exists(card_image_path)
-                else placeholder_image_path
-            )
-            st.image(image_path, width="stretch")
-
-            st.write(f"Количество комнат: {flat.room_amount}")
-            st.markdown(f"#### {flat.price:,} ₽".replace(",", " "))
-
-            confirm_button_wrapper = confirm_button(
-                label="Купить" if flat.is_available else "Продано",
-                button_type="primary",
-                key=f"buy_button{i}",
-                use_container_width=True,
-                disabled=not flat.is_available,
-            )
-            confirm_button_function = confirm_button_wrapper(buy_flat)
-            confirm_button_function(
-                flat_id=flat.id, user_repo=user_repo, market_repo=market_repo
-            )
+            display_flat_card(flat, user_repo=user_repo, market_repo=market_repo)
 
 
 def render() -> None:
@@ -0,0 +1,116 @@
+import pandas as pd
+import streamlit as st
+
+from application.ports import MarketDatabaseRepository
+from application.use_cases import GetFlatFacets, GetMarketStats
+from domain.value_objects import FlatQuery, GroupStats, MarketStats
+
+PRICE_BINS = 20
+
+
+def _format_price(price: float) -> str:
+    return f"{price:,.0f} ₽".replace(",", " ")
+
+
+def _group_frame(groups: tuple[GroupStats, ...], key_title: str) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            key_title: [group.key for group in groups],
+            "В наличии": [group.available_amount for group in groups],
+            "Продано": [group.flat_amount - group.available_amount for group in groups],
+            "Медианная цена": [group.median_price for group in groups],
+            "Средняя цена": [group.mean_price for group in groups],
+            "Средняя цена за комнату": [group.mean_price_per_room for group in groups],
+        }
+    ).set_index(key_title)
+
+
+def display_query(market_repo: MarketDatabaseRepository) -> FlatQuery:
+    """Displays the filters of the analysed flats.
+
+    :param market_repo: Repository to provide market implementation linking.
+    :type market_repo: MarketDatabaseRepository
+    :return: Query built from the filters chosen by the user.
+    :rtype: FlatQuery
+    """
+    facets = GetFlatFacets(market_repo).execute()
+    room_options = ["Все"]
+    if facets.flat_amount:
+        room_options += [n for n in range(facets.min_rooms, facets.max_rooms + 1)]
+
+    col1, col2 = st.columns(2)
+    room_amount = col1.selectbox(
+        "Количество комнат", options=room_options, key="stats_room_amount"
+    )
+    only_available = col2.checkbox(
+        "Только квартиры в наличии", key="stats_only_available"
+    )
+    return FlatQuery(
+        room_amount=None if room_amount == "Все" else room_amount,
+        only_available=only_available,
+    )
+
+
+def display_stats(stats: MarketStats) -> None:
+    """Displays market aggregates.
+
+    :param stats: Aggregates of the analysed flats.
+    :type stats: MarketStats
+    """
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Квартир", stats.flat_amount)
+    col2.metric("В наличии", stats.available_amount)
+    col3.metric("Медианная цена", _format_price(stats.median_price))
+
+    if not stats.flat_amount:
+        st.info("По вашему запросу ничего не найдено")
+        return
+
+    st.subheader("Распределение цен")
+    edges = stats.price_bin_edges
+    histogram = pd.DataFrame(
+        {
+            "Цена, млн ₽": [
+                f"{low / 1e6:.1f}–{high / 1e6:.1f}"
+                for low, high in zip(edges, edges[1:])
+            ],
+            "Квартир": stats.price_bin_counts,
+        }
+    ).set_index("Цена, млн ₽")
+    st.bar_chart(histogram, sort=False)
+
+    by_rooms = _group_frame(stats.by_room_amount, "Комнат")
+    st.subheader("Цена за комнату")
+    st.bar_chart(by_rooms["Средняя цена за комнату"])
+
+    by_floor = _group_frame(stats.by_floor, "Этаж")
+    st.subheader("Наличие по этажам")
+    st.bar_chart(by_floor[["В наличии", "Продано"]])
+
+    st.subheader("Сводка по количеству комнат")
+    st.dataframe(by_rooms, width="stretch")
+
+
+@st.fragment
+def display_market_stats(market_repo: MarketDatabaseRepository) -> None:
+    """Displays the market stats page content.
+
+    :param market_repo: Repository to provide market implementation linking.
+    :type market_repo: MarketDatabaseRepository
+    """
+    query = display_query(market_repo)
+    st.divider()
+
+    try:
+        stats = GetMarketStats(market_repo).execute(query, PRICE_BINS)
+    except Exception:
+        st.error("Произошла непредвиденная ошибка, попробуйте позже")
+        return
+
+    display_stats(stats)
+
+
+def render() -> None:
+    """Main function of the page.  Renders all its content."""
+    st.title("Статистика рынка")
+    display_market_stats(market_repo=st.session_state.market_repo)
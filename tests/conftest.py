@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+TESTS_PATH = Path(__file__).resolve().parent
+SRC_PATH = TESTS_PATH.parent / "src"
+PYTHONPATH = os.pathsep.join([str(SRC_PATH), str(TESTS_PATH)])
+
+
+def make_storage(directory: Path, shared: bool = False, **options):
+    """Builds a journaled storage of a users table in the directory.
+
+    Records are deposits setting the balance of a user.
+    """
+    from infrastructure.journal import LocalStorage
+    from infrastructure.schema import USERS_SCHEMA
+    from infrastructure.tables import LocalTable
+
+    path = directory / "users.csv"
+    if not path.exists():
+        path.write_text(
+            "id,username,password_hash,balance\n1,alice,x,0\n2,bob,x,0\n",
+            encoding="UTF-8",
+        )
+    table = LocalTable(str(path), USERS_SCHEMA)
+
+    def apply(record: dict) -> None:
+        table.update(record["user_id"], balance=record["balance"])
+
+    storage = LocalStorage(
+        tables=(table,),
+        apply=apply,
+        journal_path=str(directory / "journal.log"),
+        durable=False,
+        lock_path=str(directory / "tables.lock") if shared else None,
+        versions_path=str(directory / "versions") if shared else None,
+        **options,
+    )
+    return storage, table
+
+
+def deposit(user_id: int, balance: int) -> dict:
+    return {"op": "deposit", "user_id": user_id, "balance": balance}
+
+
+@pytest.fixture
+def data_dir(tmp_path: Path) -> Path:
+    """Working directory with a small ``data/db`` of the local backend:
+    two users with 100 each and one flat for 60.
+    """
+    db_path = tmp_path / "data" / "db"
+    db_path.mkdir(parents=True)
+    (db_path / "users.csv").write_text(
+        "id,username,password_hash,balance\n1,alice,x,100\n2,bob,x,100\n",
+        encoding="UTF-8",
+    )
+    (db_path / "flats.csv").write_text(
+        'id,number,floor,room_amount,price,address\n1,12,3,1,60,"Тверская, 34"\n',
+        encoding="UTF-8",
+    )
+    (db_path / "owners.csv").write_text("user_id,flat_id\n", encoding="UTF-8")
+    return tmp_path
+
+
+@pytest.fixture
+def run_python():
+    """Runs the code in a new interpreter and returns its standard output.
+
+    The repositories keep module-level tables with paths relative to the
+    working directory, so every scenario gets a process of its own.
+    """
+
+    def run(code: str, cwd: Path) -> str:
+        environment = {**os.environ, "PYTHONPATH": PYTHONPATH}
+        result = subprocess.run(
+            [sys.executable, "-c", textwrap.dedent(code)],
+            cwd=cwd,
+            env=environment,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        assert result.returncode == 0, result.stderr
+        return result.stdout
+
+    return run
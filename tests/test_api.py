@@ -0,0 +1,107 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.main import _handle_error, app
+from application.exceptions import ItemAlreadySold
+
+API_SCENARIO = """
+    import json
+    import os
+
+    os.environ["API_SECRET_KEY"] = "secret"
+
+    from fastapi.testclient import TestClient
+
+    from api.main import app
+
+    statuses = {}
+    with TestClient(app) as client:
+        def call(name, method, url, token=None, **kwargs):
+            headers = {"Authorization": f"Bearer {token}"} if token else {}
+            response = client.request(method, url, headers=headers, **kwargs)
+            statuses[name] = response.status_code
+            return response
+
+        carol = {"username": "carol", "password": "password1!"}
+        call("register", "POST", "/users", json=carol)
+        call("register_taken", "POST", "/users", json=carol)
+        call(
+            "register_invalid",
+            "POST",
+            "/users",
+            json={"username": "c a", "password": "password1!"},
+        )
+        call(
+            "login_invalid",
+            "POST",
+            "/tokens",
+            json={"username": "carol", "password": "password2!"},
+        )
+        token = call("login", "POST", "/tokens", json=carol).json()["access_token"]
+        call("forged_token", "GET", "/users/me", token=token + "x")
+        call("no_token", "GET", "/users/me")
+
+        call("deposit", "POST", "/users/me/deposits", token, json={"amount": 100})
+        call("buy", "POST", "/flats/1/purchase", token)
+        call("buy_sold", "POST", "/flats/1/purchase", token)
+        call("buy_missing", "POST", "/flats/2/purchase", token)
+        call("balance", "GET", "/users/me", token)
+
+        call("flats", "GET", "/flats")
+        call("flats_invalid_sort", "GET", "/flats", params={"sort": "floor"})
+        call("flats_page_too_large", "GET", "/flats", params={"limit": 1000})
+        call("flat_missing", "GET", "/flats/2")
+
+        dave = {"username": "dave", "password": "password1!"}
+        call("register_other", "POST", "/users", json=dave)
+        other_token = call("login_other", "POST", "/tokens", json=dave).json()[
+            "access_token"
+        ]
+        call("sell_not_owner", "POST", "/flats/1/sale", other_token)
+        call("sell", "POST", "/flats/1/sale", token)
+    print(json.dumps(statuses))
+"""
+
+
+def test_status_codes(data_dir, run_python):
+    statuses = json.loads(run_python(API_SCENARIO, data_dir))
+    assert statuses == {
+        "register": 201,
+        "register_taken": 409,
+        "register_invalid": 400,
+        "login_invalid": 401,
+        "login": 200,
+        "forged_token": 401,
+        "no_token": 401,
+        "deposit": 204,
+        "buy": 204,
+        "buy_sold": 409,
+        "buy_missing": 404,
+        "balance": 200,
+        "flats": 200,
+        "flats_invalid_sort": 400,
+        "flats_page_too_large": 422,
+        "flat_missing": 404,
+        "register_other": 201,
+        "login_other": 200,
+        "sell_not_owner": 403,
+        "sell": 204,
+    }
+
+
+def test_subclass_of_mapped_error_gets_its_status():
+    class FlatReserved(ItemAlreadySold): ...
+
+    response = asyncio.run(_handle_error(None, FlatReserved("Flat is reserved")))
+    assert response.status_code == 409
+    assert json.loads(response.body) == {"detail": "Flat is reserved"}
+
+
+def test_startup_requires_secret_key(monkeypatch):
+    monkeypatch.delenv("API_SECRET_KEY", raising=False)
+    with pytest.raises(RuntimeError, match="API_SECRET_KEY"):
+        with TestClient(app):
+            pass
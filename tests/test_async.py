@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from application.async_use_cases import (
+    AsyncAddMoney,
+    AsyncBuyFlat,
+    AsyncGetFlatPage,
+    AsyncGetUser,
+    AsyncGetUserProperty,
+    AsyncLogin,
+    AsyncRegister,
+    AsyncSellFlat,
+)
+from application.exceptions import InvalidCredentials, ItemAlreadySold
+from domain.entities import Flat
+from domain.value_objects import FlatQuery
+from infrastructure.aiosqlite_db import (
+    AsyncSqliteConnectionPool,
+    AsyncSqliteMarketDatabase,
+    AsyncSqliteUserDatabase,
+)
+from infrastructure.async_adapters import (
+    ExecutorMarketDatabase,
+    ExecutorPasswordHasher,
+    ExecutorUserDatabase,
+)
+from infrastructure.security import ScryptHasher
+from infrastructure.sqlite_db import (
+    SqliteConnectionPool,
+    SqliteMarketDatabase,
+    SqliteUserDatabase,
+)
+
+FLATS = [
+    Flat(flat_id, "Тверская, 34", flat_id, 1, 1, flat_id * 10, True)
+    for flat_id in range(1, 6)
+]
+
+
+def native_repositories(path):
+    pool = AsyncSqliteConnectionPool(str(path))
+    return AsyncSqliteUserDatabase(pool), AsyncSqliteMarketDatabase(pool), pool.close
+
+
+def executor_repositories(path):
+    pool = SqliteConnectionPool(str(path))
+
+    async def close():
+        pool.close()
+
+    return (
+        ExecutorUserDatabase(SqliteUserDatabase(pool)),
+        ExecutorMarketDatabase(SqliteMarketDatabase(pool)),
+        close,
+    )
+
+
+@pytest.mark.parametrize("repositories", [native_repositories, executor_repositories])
+def test_async_use_cases(tmp_path, repositories):
+    path = tmp_path / "market.sqlite3"
+    seed_pool = SqliteConnectionPool(str(path))
+    SqliteMarketDatabase(seed_pool).import_flats(FLATS)
+    seed_pool.close()
+
+    async def scenario():
+        user_repo, market_repo, close = repositories(path)
+        hasher = ExecutorPasswordHasher(ScryptHasher(n=2**8))
+        try:
+            await AsyncRegister(user_repo, hasher).execute("alice", "password1!")
+            with pytest.raises(InvalidCredentials):
+                await AsyncLogin(user_repo, hasher).execute("alice", "password2!")
+            user_id = await AsyncLogin(user_repo, hasher).execute("alice", "password1!")
+            await AsyncAddMoney(user_repo).execute(user_id, 100)
+
+            # Both purchases run at once, only one of them gets the flat.
+            buy = AsyncBuyFlat(user_repo, market_repo)
+            results = await asyncio.gather(
+                buy.execute(user_id, 3), buy.execute(user_id, 3), return_exceptions=True
+            )
+            assert results.count(None) == 1
+            assert any(isinstance(result, ItemAlreadySold) for result in results)
+            assert (await AsyncGetUser(user_repo).execute(user_id)).balance == 70
+
+            page = await AsyncGetFlatPage(market_repo).execute(
+                FlatQuery(only_available=True, sort="-price", limit=2)
+            )
+            assert [flat.id for flat in page.flats] == [5, 4]
+            assert page.total == 4
+
+            user_property = await AsyncGetUserProperty(user_repo).execute(user_id)
+            assert [flat.id for flat in user_property.properties] == [3]
+            await AsyncSellFlat(user_repo, market_repo).execute(user_id, 3)
+            assert (await AsyncGetUser(user_repo).execute(user_id)).balance == 100
+        finally:
+            await close()
+
+    asyncio.run(scenario())
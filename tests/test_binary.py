@@ -0,0 +1,166 @@
+import os
+import struct
+from array import array
+
+import pytest
+
+from infrastructure.binary import (
+    _HEADER,
+    BinaryTable,
+    SortedPositions,
+    source_signature,
+    write_table,
+)
+from infrastructure.schema import FLATS_SCHEMA, OWNERS_SCHEMA, USERS_SCHEMA
+from infrastructure.tables import LocalTable
+
+SOURCE = (1, 2, 3)
+
+
+def test_round_trip_with_consecutive_keys(tmp_path):
+    path = str(tmp_path / "flats.bin")
+    columns = {
+        "id": array("q", [1, 2, 3]),
+        "number": array("q", [12, 45, -1]),
+        "floor": array("q", [3, 8, 0]),
+        "room_amount": array("q", [1, 2, 1]),
+        "price": array("q", [7_200_000, 13_850_000, 2**62]),
+        "address": ["Тверская, 34", "Ленинградский проспект, 5", "Тверская, 34"],
+    }
+    assert write_table(path, FLATS_SCHEMA, columns, SOURCE)
+
+    table = BinaryTable(path, FLATS_SCHEMA)
+    assert table.open()
+    assert table.source == SOURCE
+    assert table.positions == range(1, 4)
+    for name, values in columns.items():
+        assert list(table.columns[name]) == list(values)
+        assert [table.columns[name][i] for i in range(3)] == list(values)
+
+
+def test_round_trip_with_sparse_keys(tmp_path):
+    path = str(tmp_path / "owners.bin")
+    columns = {"user_id": [7, 3, 7, 1], "flat_id": [40, 5, 12, 900]}
+    assert write_table(path, OWNERS_SCHEMA, columns, SOURCE)
+
+    table = BinaryTable(path, OWNERS_SCHEMA)
+    assert table.open()
+    assert isinstance(table.positions, SortedPositions)
+    assert {key: table.positions[key] for key in (5, 12, 40, 900)} == {
+        40: 0,
+        5: 1,
+        12: 2,
+        900: 3,
+    }
+    assert 6 not in table.positions
+    assert list(table.columns["user_id"]) == columns["user_id"]
+
+
+def test_round_trip_of_empty_table(tmp_path):
+    path = str(tmp_path / "users.bin")
+    columns = {name: [] for name in USERS_SCHEMA.column_names}
+    assert write_table(path, USERS_SCHEMA, columns, SOURCE)
+
+    table = BinaryTable(path, USERS_SCHEMA)
+    assert table.open()
+    assert all(len(values) == 0 for values in table.columns.values())
+
+
+def test_duplicate_keys_are_not_written(tmp_path):
+    path = tmp_path / "owners.bin"
+    columns = {"user_id": [1, 2], "flat_id": [5, 5]}
+    assert not write_table(str(path), OWNERS_SCHEMA, columns, SOURCE)
+    assert not path.exists()
+
+
+def test_file_of_other_schema_is_rejected(tmp_path):
+    path = str(tmp_path / "owners.bin")
+    write_table(path, OWNERS_SCHEMA, {"user_id": [1], "flat_id": [1]}, SOURCE)
+    assert not BinaryTable(path, USERS_SCHEMA).open()
+    assert not BinaryTable(str(tmp_path / "missing.bin"), USERS_SCHEMA).open()
+
+
+def test_binary_table_follows_csv_signature(tmp_path):
+    csv_path = tmp_path / "users.csv"
+    csv_path.write_text(
+        "id,username,password_hash,balance\n1,alice,x,100\n", encoding="UTF-8"
+    )
+    LocalTable(str(csv_path), USERS_SCHEMA).get(1)
+    binary = BinaryTable(str(tmp_path / "users.bin"), USERS_SCHEMA)
+    assert binary.open()
+    assert binary.source == source_signature(str(csv_path))
+
+    # The CSV file is replaced by one of the same size and modification time,
+    # only the inode tells them apart.
+    stat = os.stat(csv_path)
+    replacement = tmp_path / "replacement.csv"
+    replacement.write_text(
+        "id,username,password_hash,balance\n1,alice,x,200\n", encoding="UTF-8"
+    )
+    os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(replacement, csv_path)
+    assert source_signature(str(csv_path)) != binary.source
+    assert LocalTable(str(csv_path), USERS_SCHEMA).get(1)["balance"] == 200
+
+    # A changed modification time or size invalidates the file as well.
+    for content in ("1,alice,x,300\n", "1,alice,x,3000\n"):
+        csv_path.write_text(
+            "id,username,password_hash,balance\n" + content, encoding="UTF-8"
+        )
+        balance = int(content.rsplit(",", 1)[1])
+        assert LocalTable(str(csv_path), USERS_SCHEMA).get(1)["balance"] == balance
+
+
+def test_stale_binary_table_is_replaced(tmp_path):
+    csv_path = tmp_path / "users.csv"
+    csv_path.write_text(
+        "id,username,password_hash,balance\n1,alice,x,100\n", encoding="UTF-8"
+    )
+    LocalTable(str(csv_path), USERS_SCHEMA).get(1)
+    csv_path.write_text(
+        "id,username,password_hash,balance\n1,alice,x,100\n2,bob,x,5\n",
+        encoding="UTF-8",
+    )
+    LocalTable(str(csv_path), USERS_SCHEMA).get(1)
+
+    binary = BinaryTable(str(tmp_path / "users.bin"), USERS_SCHEMA)
+    assert binary.open()
+    assert binary.source == source_signature(str(csv_path))
+    assert list(binary.columns["username"]) == ["alice", "bob"]
+
+
+def test_rejected_file_is_unmapped(tmp_path):
+    path = tmp_path / "users.bin"
+    columns = {"id": [1, 2], "username": ["alice", "bob"]}
+    columns |= {"password_hash": ["x", "x"], "balance": [0, 5]}
+    write_table(str(path), USERS_SCHEMA, columns, SOURCE)
+    data = path.read_bytes()
+
+    # A column of the wrong length, a truncated file and a mangled name.
+    wrong_length = bytearray(data)
+    struct.pack_into("<Q", wrong_length, 12, 3)
+    mangled_name = bytearray(data)
+    mangled_name[_HEADER.size] = 0xFF
+    for content in (wrong_length, data[: _HEADER.size], mangled_name):
+        path.write_bytes(content)
+        table = BinaryTable(str(path), USERS_SCHEMA)
+        assert not table.open()
+        assert table._mmap is None
+        assert (table.columns, table.positions, table.source) == ({}, range(0), None)
+
+
+def test_failed_write_keeps_previous_file(tmp_path, monkeypatch):
+    path = tmp_path / "owners.bin"
+    write_table(str(path), OWNERS_SCHEMA, {"user_id": [1], "flat_id": [1]}, SOURCE)
+
+    def fail(file_descriptor):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(os, "fsync", fail)
+    with pytest.raises(OSError):
+        write_table(str(path), OWNERS_SCHEMA, {"user_id": [2], "flat_id": [2]}, SOURCE)
+    assert os.listdir(tmp_path) == ["owners.bin"]
+
+    table = BinaryTable(str(path), OWNERS_SCHEMA)
+    assert table.open()
+    assert list(table.columns["user_id"]) == [1]
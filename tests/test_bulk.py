@@ -0,0 +1,95 @@
+import pytest
+
+from application.cache import UseCaseCache
+from application.exceptions import FlatAlreadyExists, FlatNotFound, UserNotFound
+from application.use_cases import (
+    BuyFlat,
+    DepositMany,
+    GetFlatList,
+    GetUser,
+    GetUserProperty,
+    ImportFlats,
+    UpdatePrices,
+)
+from domain.entities import Flat
+from domain.exceptions import InvalidAmount, InvalidFlat
+from infrastructure.sqlite_db import (
+    SqliteConnectionPool,
+    SqliteMarketDatabase,
+    SqliteUserDatabase,
+    migrate_from_csv,
+)
+
+CHECK_LOCAL_BACKEND = """
+    from infrastructure.db import LocalMarketDatabase, LocalUserDatabase
+    from test_bulk import check_bulk_writes
+
+    check_bulk_writes(LocalUserDatabase(), LocalMarketDatabase())
+"""
+
+
+def make_flat(flat_id: int, price: int = 100) -> Flat:
+    return Flat(flat_id, "Тверская, 34", flat_id, 1, 2, price, True)
+
+
+def check_bulk_writes(user_repo, market_repo) -> None:
+    """Runs bulk writes over the repositories of the ``data_dir`` fixture,
+    reading the results through the use case cache.
+    """
+    cache = UseCaseCache()
+    get_flat_list = GetFlatList(market_repo, cache)
+    get_user_property = GetUserProperty(user_repo, cache)
+    get_user = GetUser(user_repo, cache)
+
+    def flat_prices():
+        return {flat.id: flat.price for flat in get_flat_list.execute()}
+
+    assert flat_prices() == {1: 60}
+    BuyFlat(user_repo, market_repo, cache).execute(user_id=1, flat_id=1)
+    assert [flat.price for flat in get_user_property.execute(1).properties] == [60]
+    assert get_user.execute(1).balance == 40
+
+    import_flats = ImportFlats(market_repo, cache)
+    with pytest.raises(FlatAlreadyExists):
+        import_flats.execute([make_flat(2), make_flat(1)])
+    with pytest.raises(FlatAlreadyExists):
+        import_flats.execute([make_flat(3), make_flat(3)])
+    with pytest.raises(InvalidFlat):
+        import_flats.execute([make_flat(4), make_flat(5, price=0)])
+    assert flat_prices() == {1: 60}
+    assert import_flats.execute(make_flat(flat_id) for flat_id in (2, 3)) == 2
+    assert flat_prices() == {1: 60, 2: 100, 3: 100}
+
+    update_prices = UpdatePrices(market_repo, cache)
+    assert update_prices.execute({1: 80, 3: 90}) == 2
+    assert flat_prices() == {1: 80, 2: 100, 3: 90}
+    assert [flat.price for flat in get_user_property.execute(1).properties] == [80]
+    with pytest.raises(FlatNotFound):
+        update_prices.execute([(2, 10), (9, 10)])
+    with pytest.raises(InvalidAmount):
+        update_prices.execute([(2, 10), (3, -1)])
+    assert flat_prices() == {1: 80, 2: 100, 3: 90}
+
+    deposit_many = DepositMany(user_repo, cache)
+    assert deposit_many.execute([(1, 10), (2, 5), (1, 10)]) == 3
+    assert (get_user.execute(1).balance, get_user.execute(2).balance) == (60, 105)
+    with pytest.raises(UserNotFound):
+        deposit_many.execute({2: 5, 9: 5})
+    assert get_user.execute(2).balance == 105
+
+
+def test_bulk_writes_on_local_backend(data_dir, run_python):
+    run_python(CHECK_LOCAL_BACKEND, data_dir)
+
+
+def test_bulk_writes_on_sqlite_backend(data_dir):
+    db_path = data_dir / "data" / "db"
+    pool = SqliteConnectionPool(str(db_path / "market.sqlite3"))
+    migrate_from_csv(
+        pool,
+        users_path=str(db_path / "users.csv"),
+        flats_path=str(db_path / "flats.csv"),
+        owners_path=str(db_path / "owners.csv"),
+    )
+    check_bulk_writes(SqliteUserDatabase(pool), SqliteMarketDatabase(pool))
+    pool.close()
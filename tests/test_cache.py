@@ -0,0 +1,29 @@
+from application.cache import UseCaseCache
+
+
+def test_value_loaded_before_invalidation_is_not_stored():
+    cache = UseCaseCache()
+    loads = []
+
+    def load_and_write():
+        loads.append(None)
+        if len(loads) == 1:
+            # A concurrent write commits after the value was read.
+            cache.invalidate(("user", 1))
+        return len(loads)
+
+    assert cache.get_or_load(("user", 1), load_and_write) == 1
+    assert cache.get_or_load(("user", 1), load_and_write) == 2
+    assert cache.get_or_load(("user", 1), load_and_write) == 2
+
+
+def test_namespace_invalidation_during_load():
+    cache = UseCaseCache()
+
+    def load_and_write():
+        cache.invalidate_namespaces("flat_list")
+        return "stale"
+
+    assert cache.get_or_load(("flat_list", None), load_and_write) == "stale"
+    assert cache.get_or_load(("flat_list", None), lambda: "fresh") == "fresh"
+    assert cache.get_or_load(("flat_list", None), lambda: "other") == "fresh"
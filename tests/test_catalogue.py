@@ -0,0 +1,105 @@
+import threading
+
+from domain.value_objects import FlatQuery
+from infrastructure.catalogue import FlatCatalogue
+from infrastructure.schema import FLATS_SCHEMA, OWNERS_SCHEMA
+from infrastructure.tables import LocalTable
+
+FLAT_AMOUNT = 200
+
+
+def make_tables(directory) -> tuple[LocalTable, LocalTable]:
+    rows = [
+        f'{flat_id},{flat_id},1,{flat_id % 4 + 1},{flat_id * 1000},"Тверская, 1"'
+        for flat_id in range(1, FLAT_AMOUNT + 1)
+    ]
+    (directory / "flats.csv").write_text(
+        "\n".join(["id,number,floor,room_amount,price,address", *rows]) + "\n",
+        encoding="UTF-8",
+    )
+    (directory / "owners.csv").write_text("user_id,flat_id\n", encoding="UTF-8")
+    return (
+        LocalTable(str(directory / "flats.csv"), FLATS_SCHEMA),
+        LocalTable(str(directory / "owners.csv"), OWNERS_SCHEMA),
+    )
+
+
+def run_concurrently(*targets) -> None:
+    barrier = threading.Barrier(len(targets))
+
+    def run(target):
+        barrier.wait()
+        target()
+
+    threads = [
+        threading.Thread(target=run, args=(target,), daemon=True) for target in targets
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert not any(thread.is_alive() for thread in threads), "Deadlock"
+
+
+def test_reload_and_query_do_not_deadlock(tmp_path):
+    flats, owners = make_tables(tmp_path)
+    catalogue = FlatCatalogue(flats, owners)
+    for _ in range(100):
+        flats.invalidate()
+        owners.invalidate()
+        run_concurrently(
+            lambda: flats.get(1),
+            lambda: owners.get(1),
+            lambda: catalogue.find(FlatQuery(limit=5)),
+            lambda: catalogue.facets(FlatQuery()),
+        )
+    assert catalogue.find(FlatQuery(limit=2)) == ([1, 2], FLAT_AMOUNT)
+
+
+def test_changes_during_rebuild_are_not_lost(tmp_path):
+    flats, owners = make_tables(tmp_path)
+    catalogue = FlatCatalogue(flats, owners)
+    query = FlatQuery(only_available=True)
+
+    for round_number in range(20):
+        flats.invalidate()
+        sold = range(round_number * 10 + 1, round_number * 10 + 11)
+
+        def trade():
+            for flat_id in sold:
+                owners.insert({"user_id": 1, "flat_id": flat_id})
+            flats.update(sold[0], price=1)
+
+        run_concurrently(trade, lambda: catalogue.find(query))
+
+        flat_ids, total = catalogue.find(query)
+        assert total == FLAT_AMOUNT - len(owners.keys())
+        assert set(flat_ids).isdisjoint(owners.keys())
+        assert catalogue.facets(FlatQuery()).min_price == 1
+
+
+def test_market_stats_follow_trades_without_deadlock(tmp_path):
+    from infrastructure.columnar import TableFlatColumns
+
+    flats, owners = make_tables(tmp_path)
+    columns = TableFlatColumns(flats, owners)
+
+    def trade(flat_id):
+        # Saved, so that the next reload of the table keeps it.
+        owners.insert({"user_id": 1, "flat_id": flat_id})
+        owners.save()
+
+    for round_number in range(50):
+        flats.invalidate()
+        owners.invalidate()
+        run_concurrently(
+            lambda: flats.get(1),
+            lambda: trade(round_number + 1),
+            lambda: columns.market_stats(FlatQuery()),
+        )
+        stats = columns.market_stats(FlatQuery())
+        assert stats.flat_amount == FLAT_AMOUNT
+        assert stats.available_amount == FLAT_AMOUNT - round_number - 1
+
+    owners.delete(1)
+    assert columns.market_stats(FlatQuery()).available_amount == FLAT_AMOUNT - 49
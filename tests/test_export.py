@@ -0,0 +1,127 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+
+import pyarrow.parquet as pq
+import pytest
+
+from conftest import PYTHONPATH, SRC_PATH
+
+FLATS_CSV = (
+    "id,number,floor,room_amount,price,address\n"
+    '1,12,3,1,60,"Тверская, 34"\n'
+    '2,13,3,2,150,"Ленинградский проспект, 5"\n'
+    '3,14,4,2,90,"Тверская, 34"\n'
+)
+
+EXPECTED = {
+    "users": [
+        {"id": 1, "username": "alice", "balance": 40},
+        {"id": 2, "username": "bob", "balance": 100},
+    ],
+    "flats": [
+        {
+            "id": 1,
+            "address": "Тверская, 34",
+            "number": 12,
+            "floor": 3,
+            "room_amount": 1,
+            "price": 60,
+            "is_available": False,
+        },
+        {
+            "id": 2,
+            "address": "Ленинградский проспект, 5",
+            "number": 13,
+            "floor": 3,
+            "room_amount": 2,
+            "price": 150,
+            "is_available": True,
+        },
+        {
+            "id": 3,
+            "address": "Тверская, 34",
+            "number": 14,
+            "floor": 4,
+            "room_amount": 2,
+            "price": 90,
+            "is_available": True,
+        },
+    ],
+    "ownership": [{"user_id": 1, "flat_id": 1}],
+}
+
+
+def run_script(script: str, cwd, *args) -> None:
+    result = subprocess.run(
+        [sys.executable, str(SRC_PATH / script), *args],
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": PYTHONPATH},
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def read_export(path) -> list[dict]:
+    match path.suffix:
+        case ".csv":
+            with open(path, encoding="UTF-8", newline="") as file:
+                return list(csv.DictReader(file))
+        case ".jsonl":
+            return [json.loads(line) for line in path.read_text("UTF-8").splitlines()]
+        case ".parquet":
+            return pq.read_table(path).to_pylist()
+
+
+def as_csv_values(rows: list[dict]) -> list[dict]:
+    return [{name: str(value) for name, value in row.items()} for row in rows]
+
+
+@pytest.fixture
+def market_dir(data_dir, run_python):
+    (data_dir / "data" / "db" / "flats.csv").write_text(FLATS_CSV, encoding="UTF-8")
+    run_python(
+        """
+        from infrastructure.db import LocalMarketDatabase
+
+        LocalMarketDatabase().purchase_flat(user_id=1, flat_id=1)
+        """,
+        data_dir,
+    )
+    return data_dir
+
+
+@pytest.mark.parametrize("file_format", ["csv", "jsonl", "parquet"])
+def test_export_round_trip(market_dir, file_format):
+    for kind, rows in EXPECTED.items():
+        path = market_dir / f"{kind}.{file_format}"
+        run_script("export.py", market_dir, kind, path.name)
+        expected = as_csv_values(rows) if file_format == "csv" else rows
+        assert read_export(path) == expected
+        assert not (market_dir / f"{path.name}.tmp").exists()
+
+
+def test_exported_flats_can_be_imported(market_dir, tmp_path):
+    run_script("export.py", market_dir, "flats", "flats.jsonl")
+
+    target_db_path = tmp_path / "target" / "data" / "db"
+    target_db_path.mkdir(parents=True)
+    (target_db_path / "users.csv").write_text(
+        "id,username,password_hash,balance\n", encoding="UTF-8"
+    )
+    (target_db_path / "flats.csv").write_text(
+        FLATS_CSV.splitlines(keepends=True)[0], encoding="UTF-8"
+    )
+    (target_db_path / "owners.csv").write_text("user_id,flat_id\n", encoding="UTF-8")
+    target_dir = tmp_path / "target"
+    os.replace(market_dir / "flats.jsonl", target_dir / "flats.jsonl")
+    run_script("ingest.py", target_dir, "flats", "flats.jsonl")
+
+    run_script("export.py", target_dir, "flats", "flats.jsonl")
+    assert read_export(target_dir / "flats.jsonl") == [
+        {**flat, "is_available": True} for flat in EXPECTED["flats"]
+    ]
@@ -0,0 +1,36 @@
+import os
+import time
+
+from PIL import Image
+
+from ui.components.images import ImageService
+
+
+def test_image_overwritten_in_place_gets_new_thumbnail(tmp_path):
+    images_path = tmp_path / "images"
+    images_path.mkdir()
+    placeholder_path = tmp_path / "placeholder.jpg"
+    Image.new("RGB", (50, 50), "gray").save(placeholder_path)
+    image_path = images_path / "1.jpg"
+    Image.new("RGB", (50, 50), "red").save(image_path)
+    service = ImageService(
+        str(images_path),
+        str(placeholder_path),
+        str(tmp_path / "thumbnails"),
+        width=20,
+        rescan_interval=0.1,
+    )
+    red = service.get_flat_image(1)
+
+    # Overwriting the file does not change the directory.
+    directory_mtime = os.stat(images_path).st_mtime_ns
+    Image.new("RGB", (50, 50), "blue").save(image_path)
+    os.utime(images_path, ns=(directory_mtime, directory_mtime))
+    time.sleep(0.15)
+    blue = service.get_flat_image(1)
+    assert blue != red
+
+    image_path.unlink()
+    os.utime(images_path, ns=(directory_mtime, directory_mtime))
+    time.sleep(0.15)
+    assert service.get_flat_image(1) == service.get_flat_image(2)
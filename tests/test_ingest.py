@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+
+from conftest import PYTHONPATH, SRC_PATH
+
+FLATS_HEADER = "id,number,floor,room_amount,price,address\n"
+
+
+def ingest(cwd, *args) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, str(SRC_PATH / "ingest.py"), *args],
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": PYTHONPATH},
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+
+def test_flats_are_loaded(data_dir, run_python):
+    (data_dir / "flats.csv").write_text(
+        FLATS_HEADER + '2,13,3,2,150,"Тверская, 34"\n3,14,3,2,90,"Тверская, 34"\n',
+        encoding="UTF-8",
+    )
+    result = ingest(data_dir, "flats", "flats.csv")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == "Loaded 2 flats from flats.csv\n"
+
+    output = run_python(
+        """
+        from infrastructure.db import LocalMarketDatabase
+
+        print([flat.price for flat in LocalMarketDatabase().iter_flats()])
+        """,
+        data_dir,
+    )
+    assert output == "[60, 150, 90]\n"
+
+
+def test_invalid_records_are_reported_with_their_line(data_dir):
+    (data_dir / "flats.csv").write_text(
+        FLATS_HEADER + '2,13,3,2,150,"Тверская, 34"\n3,14,3,2,-90,"Тверская, 34"\n',
+        encoding="UTF-8",
+    )
+    (data_dir / "prices.jsonl").write_text(
+        '{"flat_id": 1, "price": 70}\n\n{"flat_id": 1, "price": "x"}\n',
+        encoding="UTF-8",
+    )
+    (data_dir / "deposits.csv").write_text(
+        "user_id,amount\n1,10\n2,0\n", encoding="UTF-8"
+    )
+    for args, message in (
+        (("flats", "flats.csv"), "line 3: Invalid flat data. ID: 3"),
+        (("prices", "prices.jsonl"), "line 3: invalid literal"),
+        (("deposits", "deposits.csv"), "line 3: Amount must be positive: 0"),
+    ):
+        result = ingest(data_dir, *args)
+        assert result.returncode == 1
+        assert result.stderr.startswith(f"Could not load {args[1]}: {message}")
+        assert "Traceback" not in result.stderr
+
+
+def test_rejected_chunks_are_reported(data_dir):
+    (data_dir / "flats.csv").write_text(
+        FLATS_HEADER + '1,13,3,2,150,"Тверская, 34"\n', encoding="UTF-8"
+    )
+    result = ingest(data_dir, "flats", "flats.csv")
+    assert result.returncode == 1
+    assert result.stderr == "Could not load flats.csv: Flat already exists. ID: 1\n"
@@ -0,0 +1,69 @@
+import json
+
+from conftest import deposit, make_storage
+
+
+def balances(table) -> dict[int, int]:
+    return {row["id"]: row["balance"] for row in table.rows()}
+
+
+def test_replay_skips_torn_last_record(tmp_path):
+    journal_path = tmp_path / "journal.log"
+    complete = [json.dumps(deposit(1, 10)), json.dumps(deposit(2, 20))]
+    torn = json.dumps(deposit(1, 99))[:-5]
+    journal_path.write_text("\n".join(complete) + "\n" + torn, encoding="UTF-8")
+
+    storage, table = make_storage(tmp_path)
+    storage.open()
+    assert balances(table) == {1: 10, 2: 20}
+
+    # The replayed records are written out and the torn tail is dropped, so
+    # the records appended after it are read back on the next start.
+    storage.commit(deposit(2, 30))
+    storage._journal.close()
+    storage, table = make_storage(tmp_path)
+    storage.open()
+    assert balances(table) == {1: 10, 2: 30}
+
+
+def test_replay_of_archive_left_by_interrupted_compaction(tmp_path):
+    (tmp_path / "journal.log.old").write_text(
+        json.dumps(deposit(1, 10)) + "\n", encoding="UTF-8"
+    )
+    (tmp_path / "journal.log").write_text(
+        json.dumps(deposit(1, 15)) + "\n", encoding="UTF-8"
+    )
+
+    storage, table = make_storage(tmp_path)
+    storage.open()
+    assert balances(table) == {1: 15, 2: 0}
+    assert not (tmp_path / "journal.log.old").exists()
+
+
+def test_restart_after_compaction(tmp_path):
+    storage, table = make_storage(tmp_path)
+    storage.open()
+    for balance in range(1, 6):
+        storage.commit(deposit(1, balance))
+    storage.compact(wait=True)
+    assert not (tmp_path / "journal.log.old").exists()
+    assert (tmp_path / "journal.log").stat().st_size == 0
+
+    storage.commit(deposit(2, 7))
+    storage._journal.close()
+
+    restarted, restarted_table = make_storage(tmp_path)
+    restarted.open()
+    assert balances(restarted_table) == {1: 5, 2: 7}
+
+
+def test_background_compaction_after_record_limit(tmp_path):
+    storage, table = make_storage(tmp_path, compact_after=3)
+    storage.open()
+    for balance in range(1, 8):
+        storage.commit(deposit(balance % 2 + 1, balance))
+    storage.close()
+
+    restarted, restarted_table = make_storage(tmp_path)
+    restarted.open()
+    assert balances(restarted_table) == {1: 6, 2: 7}
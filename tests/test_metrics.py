@@ -0,0 +1,105 @@
+import pytest
+
+from application.metrics import METRICS, Metrics, instrumented
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    monkeypatch.setattr(METRICS, "enabled", True)
+    METRICS.reset()
+    yield METRICS
+    METRICS.reset()
+
+
+def test_disabled_registry_records_nothing():
+    metrics = Metrics()
+    metrics.increment("logins_total")
+    metrics.observe("call_duration_seconds", 0.1, operation="Login.execute")
+    with metrics.span("Login.execute"):
+        pass
+    with metrics.trace("login") as trace:
+        assert trace is None
+    assert metrics.render() == "\n"
+
+
+def test_render_in_prometheus_text_format():
+    metrics = Metrics(enabled=True)
+    metrics.increment("logins_total", result="ok")
+    metrics.increment("logins_total", 2, result="failed")
+    metrics.increment("errors_total", path='/flats/"1"\n')
+    metrics.observe("call_duration_seconds", 0.003, operation="BuyFlat.execute")
+    metrics.observe("call_duration_seconds", 20, operation="BuyFlat.execute")
+
+    lines = metrics.render().splitlines()
+    assert lines[:5] == [
+        "# TYPE app_errors_total counter",
+        'app_errors_total{path="/flats/\\"1\\"\\n"} 1',
+        "# TYPE app_logins_total counter",
+        'app_logins_total{result="failed"} 2',
+        'app_logins_total{result="ok"} 1',
+    ]
+    assert lines[5] == "# TYPE app_call_duration_seconds histogram"
+    buckets = [line for line in lines if "_bucket" in line]
+    assert buckets[3:5] == [
+        'app_call_duration_seconds_bucket{operation="BuyFlat.execute",le="0.0025"} 0',
+        'app_call_duration_seconds_bucket{operation="BuyFlat.execute",le="0.005"} 1',
+    ]
+    assert buckets[-2:] == [
+        'app_call_duration_seconds_bucket{operation="BuyFlat.execute",le="10"} 1',
+        'app_call_duration_seconds_bucket{operation="BuyFlat.execute",le="+Inf"} 2',
+    ]
+    assert lines[-2:] == [
+        'app_call_duration_seconds_sum{operation="BuyFlat.execute"} 20.003',
+        'app_call_duration_seconds_count{operation="BuyFlat.execute"} 2',
+    ]
+
+
+@instrumented
+class Repository:
+    def get(self, key: int) -> int:
+        if key < 0:
+            raise KeyError(key)
+        return key
+
+    def iter_keys(self):
+        yield from range(3)
+
+    def _load(self) -> None:
+        pass
+
+
+@instrumented
+class UseCase:
+    def __init__(self, repo: Repository) -> None:
+        self.repo = repo
+
+    def execute(self, key: int) -> int:
+        return self.repo.get(key)
+
+
+def test_instrumented_calls_are_timed_and_traced(metrics):
+    uc = UseCase(Repository())
+    with metrics.trace("page", trace_id="abc") as trace:
+        assert uc.execute(1) == 1
+        with pytest.raises(KeyError):
+            uc.execute(-1)
+        assert list(uc.repo.iter_keys()) == [0, 1, 2]
+
+    assert metrics.traces() == [trace]
+    assert trace.trace_id == "abc"
+    assert [(span.name, span.depth, span.failed) for span in trace.spans] == [
+        ("UseCase.execute", 0, False),
+        ("Repository.get", 1, False),
+        ("UseCase.execute", 0, True),
+        ("Repository.get", 1, True),
+    ]
+    counts = {
+        dict(labels)["operation"]: histogram.count
+        for (name, labels), histogram in metrics.histograms().items()
+    }
+    assert counts == {"UseCase.execute": 2, "Repository.get": 2}
+    assert metrics.counters() == {
+        ("call_errors_total", (("operation", "Repository.get"),)): 1,
+        ("call_errors_total", (("operation", "UseCase.execute"),)): 1,
+    }
+    assert "UseCase.__init__" not in metrics.render()
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from application.exceptions import InvalidSortKey
+from application.use_cases import GetFlatPage
+from domain.value_objects import FLAT_SORT_KEYS, FlatQuery
+from infrastructure.sqlite_db import (
+    SqliteConnectionPool,
+    SqliteMarketDatabase,
+    migrate_from_csv,
+)
+
+FLAT_AMOUNT = 23
+SOLD_FLATS = (4, 9, 17)
+PAGE_SIZE = 10
+
+# Prices repeat, so that the pages depend on the order of equal prices.
+FLATS = {
+    flat_id: {"room_amount": flat_id % 3 + 1, "price": (flat_id * 7) % 10 * 1000}
+    for flat_id in range(1, FLAT_AMOUNT + 1)
+}
+
+READ_PAGES = """
+    import json
+
+    from application.use_cases import GetFlatPage
+    from infrastructure.db import LocalMarketDatabase
+    from test_pagination import read_pages
+
+    print(json.dumps(read_pages(GetFlatPage(LocalMarketDatabase()))))
+"""
+
+
+def write_flats(data_dir) -> None:
+    db_path = data_dir / "data" / "db"
+    rows = [
+        f'{flat_id},{flat_id},1,{flat["room_amount"]},{flat["price"]},"Тверская, 1"'
+        for flat_id, flat in FLATS.items()
+    ]
+    (db_path / "flats.csv").write_text(
+        "\n".join(["id,number,floor,room_amount,price,address", *rows]) + "\n",
+        encoding="UTF-8",
+    )
+    (db_path / "owners.csv").write_text(
+        "".join(["user_id,flat_id\n", *(f"1,{flat_id}\n" for flat_id in SOLD_FLATS)]),
+        encoding="UTF-8",
+    )
+
+
+def expected_order(sort: str, only_available: bool) -> list[int]:
+    def sort_key(flat_id):
+        flat = FLATS[flat_id]
+        key = (flat["price"], flat_id)
+        return (flat["room_amount"], *key) if sort.endswith("room_amount") else key
+
+    flat_ids = [
+        flat_id for flat_id in FLATS if not (only_available and flat_id in SOLD_FLATS)
+    ]
+    return sorted(flat_ids, key=sort_key, reverse=sort.startswith("-"))
+
+
+def read_pages(uc: GetFlatPage) -> dict[str, list]:
+    pages = {}
+    for sort in FLAT_SORT_KEYS:
+        for only_available in (False, True):
+            offset, flat_ids = 0, []
+            while True:
+                page = uc.execute(
+                    FlatQuery(
+                        sort=sort,
+                        only_available=only_available,
+                        offset=offset,
+                        limit=PAGE_SIZE,
+                    )
+                )
+                assert len(page.flats) <= PAGE_SIZE
+                flat_ids += [flat.id for flat in page.flats]
+                offset += PAGE_SIZE
+                if offset >= page.total:
+                    break
+            pages[f"{sort} {only_available}"] = [flat_ids, page.total]
+    return pages
+
+
+def check_pages(pages: dict[str, list]) -> None:
+    for sort in FLAT_SORT_KEYS:
+        for only_available in (False, True):
+            flat_ids = expected_order(sort, only_available)
+            assert pages[f"{sort} {only_available}"] == [flat_ids, len(flat_ids)]
+
+
+def test_pages_of_local_catalogue(data_dir, run_python):
+    write_flats(data_dir)
+    output = run_python(READ_PAGES, data_dir)
+    check_pages(json.loads(output))
+
+
+@pytest.fixture
+def sqlite_market(data_dir):
+    write_flats(data_dir)
+    db_path = data_dir / "data" / "db"
+    pool = SqliteConnectionPool(str(db_path / "market.sqlite3"))
+    migrate_from_csv(
+        pool,
+        users_path=str(db_path / "users.csv"),
+        flats_path=str(db_path / "flats.csv"),
+        owners_path=str(db_path / "owners.csv"),
+    )
+    yield SqliteMarketDatabase(pool)
+    pool.close()
+
+
+def test_pages_of_sqlite_catalogue(sqlite_market):
+    check_pages(read_pages(GetFlatPage(sqlite_market)))
+
+
+def test_page_bounds_are_normalised(sqlite_market):
+    uc = GetFlatPage(sqlite_market)
+    page = uc.execute(FlatQuery(offset=-5, limit=-1))
+    assert (page.flats, page.total, page.offset, page.limit) == ([], FLAT_AMOUNT, 0, 0)
+
+    page = uc.execute(FlatQuery(offset=FLAT_AMOUNT - 1))
+    assert [flat.id for flat in page.flats] == expected_order("price", False)[-1:]
+    assert uc.execute(FlatQuery(offset=FLAT_AMOUNT, limit=5)).flats == []
+
+    with pytest.raises(InvalidSortKey):
+        uc.execute(FlatQuery(sort="floor"))
@@ -0,0 +1,83 @@
+import csv
+from array import array
+
+import pytest
+
+from infrastructure import schema
+from infrastructure.schema import FLATS_SCHEMA, iter_chunks, read_columns
+
+FLAT_AMOUNT = 5000
+ADDRESSES = ("Тверская, 34", "Ленинградский проспект, 5", 'ул. "Новая", 1')
+
+
+def write_flats(path) -> None:
+    # The columns are not in the order of the schema.
+    with open(path, "w", encoding="UTF-8", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["address", "id", "number", "floor", "room_amount", "price"])
+        for flat_id in range(1, FLAT_AMOUNT + 1):
+            writer.writerow(
+                [
+                    ADDRESSES[flat_id % 3],
+                    flat_id,
+                    flat_id % 50,
+                    flat_id % 9,
+                    2,
+                    -flat_id,
+                ]
+            )
+
+
+def read_chunks(path, engine: str, columns=None) -> list[dict]:
+    return list(iter_chunks(str(path), FLATS_SCHEMA, columns, 1000, engine=engine))
+
+
+@pytest.fixture
+def flats_path(tmp_path, monkeypatch):
+    # Arrow reads several blocks of the small file.
+    monkeypatch.setattr(schema, "PYARROW_BLOCK_SIZE", 1 << 14)
+    path = tmp_path / "flats.csv"
+    write_flats(path)
+    return path
+
+
+def test_engines_read_the_same_typed_columns(flats_path):
+    columns = {}
+    for engine in ("csv", "pyarrow"):
+        chunks = read_chunks(flats_path, engine)
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert list(chunk) == list(FLATS_SCHEMA.column_names)
+            assert isinstance(chunk["price"], array)
+            assert chunk["price"].typecode == "q"
+            assert isinstance(chunk["address"], list)
+
+        # Values of the categorical column are shared between the chunks.
+        addresses = [address for chunk in chunks for address in chunk["address"]]
+        assert len({id(address) for address in addresses}) == len(ADDRESSES)
+        columns[engine] = read_columns(str(flats_path), FLATS_SCHEMA, engine=engine)
+
+    assert columns["csv"] == columns["pyarrow"]
+    assert list(columns["csv"]["id"]) == list(range(1, FLAT_AMOUNT + 1))
+    assert columns["csv"]["price"][-1] == -FLAT_AMOUNT
+    assert columns["csv"]["address"][:3] == [ADDRESSES[1], ADDRESSES[2], ADDRESSES[0]]
+
+
+def test_engines_read_the_selected_columns(flats_path):
+    for engine in ("csv", "pyarrow"):
+        columns = read_columns(str(flats_path), FLATS_SCHEMA, ["price", "id"], engine)
+        assert list(columns) == ["price", "id"]
+        assert list(columns["id"]) == list(range(1, FLAT_AMOUNT + 1))
+
+
+def test_empty_files_and_unknown_engines(tmp_path, flats_path):
+    empty_path = tmp_path / "empty.csv"
+    empty_path.write_text("")
+    header_path = tmp_path / "header.csv"
+    header_path.write_text("id,number,floor,room_amount,price,address\n")
+    for engine in ("csv", "pyarrow"):
+        assert read_chunks(empty_path, engine) == []
+        assert read_chunks(header_path, engine) == []
+
+    with pytest.raises(ValueError, match="Unknown CSV engine: pandas"):
+        read_chunks(flats_path, "pandas")
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+from application.exceptions import InvalidCredentials
+from application.use_cases import Login
+from infrastructure.security import (
+    Pbkdf2Hasher,
+    PooledHasher,
+    ScryptHasher,
+    Sha256Hasher,
+    verify_password,
+)
+from infrastructure.sqlite_db import SqliteConnectionPool, SqliteUserDatabase
+
+# Cheap parameters, the format does not depend on them.
+FAST_SCRYPT = {"n": 2**8, "r": 8, "p": 1}
+
+
+def test_scrypt_hashes_are_salted_and_self_describing():
+    hasher = ScryptHasher(**FAST_SCRYPT)
+    first, second = hasher.hash("password1!"), hasher.hash("password1!")
+    assert first != second
+    assert first.startswith("scrypt$256$8$1$")
+
+    assert hasher.verify("password1!", first)
+    assert hasher.verify("password1!", second)
+    assert not hasher.verify("password2!", first)
+    assert not hasher.needs_rehash(first)
+    assert ScryptHasher(n=2**9).needs_rehash(first)
+
+
+def test_hashes_of_every_known_hasher_are_verified():
+    hashes = [
+        ScryptHasher(**FAST_SCRYPT).hash("password1!"),
+        Pbkdf2Hasher(iterations=1000).hash("password1!"),
+        Sha256Hasher().hash("password1!"),
+    ]
+    for password_hash in hashes:
+        assert verify_password("password1!", password_hash)
+        assert not verify_password("password2!", password_hash)
+        assert ScryptHasher(**FAST_SCRYPT).verify("password1!", password_hash)
+
+    assert ScryptHasher().needs_rehash(hashes[1])
+    assert ScryptHasher().needs_rehash(hashes[2])
+
+
+def test_malformed_hashes_are_rejected():
+    for password_hash in ("", "scrypt$1$2", "scrypt$x$8$1$AA$AA", "unknown$1$2"):
+        assert not verify_password("password1!", password_hash)
+
+
+def test_pooled_hasher_serves_concurrent_callers():
+    hasher = PooledHasher(ScryptHasher(**FAST_SCRYPT), max_workers=2, max_pending=1)
+    results = {}
+
+    def hash_and_verify(number):
+        password = f"password{number}!"
+        results[number] = hasher.verify(password, hasher.hash(password))
+
+    threads = [
+        threading.Thread(target=hash_and_verify, args=(number,)) for number in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    hasher.shutdown()
+    assert results == {number: True for number in range(8)}
+
+
+def test_login_upgrades_legacy_hash(tmp_path):
+    pool = SqliteConnectionPool(str(tmp_path / "market.sqlite3"))
+    users = SqliteUserDatabase(pool)
+    users.register("alice", Sha256Hasher().hash("password1!"))
+    login = Login(users, ScryptHasher(**FAST_SCRYPT))
+
+    with pytest.raises(InvalidCredentials):
+        login.execute("alice", "password2!")
+    assert users.get_credentials("alice")[1] == Sha256Hasher().hash("password1!")
+
+    user_id = login.execute("alice", "password1!")
+    upgraded_hash = users.get_credentials("alice")[1]
+    assert upgraded_hash.startswith("scrypt$")
+    assert verify_password("password1!", upgraded_hash)
+
+    # The upgraded hash is kept by the next logins.
+    assert login.execute("alice", "password1!") == user_id
+    assert users.get_credentials("alice")[1] == upgraded_hash
+    pool.close()
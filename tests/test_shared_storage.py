@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from conftest import deposit, make_storage
+from infrastructure.transactions import Transaction
+from infrastructure.versions import SharedVersions
+
+pytestmark = pytest.mark.skipif(
+    not SharedVersions.supported(), reason="Shared mode needs fcntl"
+)
+
+OTHER_PROCESS = """
+    from pathlib import Path
+
+    from conftest import deposit, make_storage
+
+    storage, table = make_storage(Path("."), shared=True)
+    storage.open()
+    {}
+"""
+
+
+def balances(table) -> dict[int, int]:
+    return {row["id"]: row["balance"] for row in table.rows()}
+
+
+def test_catch_up_with_appends_of_other_process(tmp_path, run_python):
+    storage, table = make_storage(tmp_path, shared=True)
+    storage.open()
+    assert balances(table) == {1: 0, 2: 0}
+
+    run_python(OTHER_PROCESS.format("storage.commit(deposit(1, 10))"), tmp_path)
+    assert balances(table) == {1: 10, 2: 0}
+
+
+def test_catch_up_after_other_process_rotates_journal(tmp_path, run_python):
+    storage, table = make_storage(tmp_path, shared=True)
+    storage.open()
+    storage.commit(deposit(1, 10))
+    assert balances(table) == {1: 10, 2: 0}
+
+    run_python(
+        OTHER_PROCESS.format(
+            "storage.commit(deposit(2, 20)); storage.compact(wait=True); "
+            "storage.commit(deposit(2, 25))"
+        ),
+        tmp_path,
+    )
+    assert not (tmp_path / "journal.log.old").exists()
+    assert balances(table) == {1: 10, 2: 25}
+
+    # Appends go to the new journal, where the other processes read them.
+    storage.commit(deposit(1, 30))
+    output = run_python(
+        OTHER_PROCESS.format("print(table.get(1)['balance'], table.get(2)['balance'])"),
+        tmp_path,
+    )
+    assert output.split() == ["30", "25"]
+
+
+class MeetingTransaction(Transaction):
+    """Waits in validation until the other transaction validates as well."""
+
+    def __init__(self, barrier: threading.Barrier) -> None:
+        super().__init__()
+        self._barrier = barrier
+
+    def validate(self) -> None:
+        self._barrier.wait(timeout=5)
+        super().validate()
+
+
+def test_transactions_on_disjoint_rows_commit_concurrently(tmp_path):
+    storage, table = make_storage(tmp_path, shared=True)
+    storage.open()
+    barrier = threading.Barrier(2)
+    errors = []
+
+    def commit(user_id):
+        transaction = MeetingTransaction(barrier)
+        transaction.read(table, user_id)
+        try:
+            storage.commit(deposit(user_id, user_id * 10), transaction)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=commit, args=(user_id,)) for user_id in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert balances(table) == {1: 10, 2: 20}
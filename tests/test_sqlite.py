@@ -0,0 +1,113 @@
+import pytest
+
+from application.exceptions import (
+    ItemAlreadySold,
+    NotAnOwnerError,
+    UsernameTaken,
+    UserNotFound,
+)
+from domain.entities import Flat, User
+from domain.exceptions import NotEnoughMoney
+from domain.value_objects import FlatFacets, FlatQuery
+from infrastructure.sqlite_db import (
+    SqliteConnectionPool,
+    SqliteMarketDatabase,
+    SqliteUserDatabase,
+    migrate_from_csv,
+)
+
+
+@pytest.fixture
+def pool(data_dir):
+    db_path = data_dir / "data" / "db"
+    pool = SqliteConnectionPool(str(db_path / "market.sqlite3"))
+    migrate_from_csv(
+        pool,
+        users_path=str(db_path / "users.csv"),
+        flats_path=str(db_path / "flats.csv"),
+        owners_path=str(db_path / "owners.csv"),
+    )
+    yield pool
+    pool.close()
+
+
+def test_migration_copies_the_tables_and_can_be_repeated(data_dir, pool):
+    db_path = data_dir / "data" / "db"
+    (db_path / "owners.csv").write_text("user_id,flat_id\n2,1\n", encoding="UTF-8")
+    migrate_from_csv(
+        pool,
+        users_path=str(db_path / "users.csv"),
+        flats_path=str(db_path / "flats.csv"),
+        owners_path=str(db_path / "owners.csv"),
+    )
+
+    users = SqliteUserDatabase(pool)
+    assert list(users.iter_users()) == [User(1, "alice", 100), User(2, "bob", 100)]
+    assert users.get_credentials("bob") == (2, "x")
+    assert list(users.iter_ownership()) == [(2, 1)]
+    assert list(SqliteMarketDatabase(pool).iter_flats()) == [
+        Flat(1, "Тверская, 34", 12, 3, 1, 60, False)
+    ]
+
+
+def test_users(pool):
+    users = SqliteUserDatabase(pool)
+    users.register("carol", "hash")
+    user_id, password_hash = users.get_credentials("carol")
+    assert (user_id, password_hash) == (3, "hash")
+    with pytest.raises(UsernameTaken):
+        users.register("carol", "other")
+
+    users.add_money(user_id, 50)
+    users.edit_profile(user_id, new_username="dave", new_password_hash=None)
+    assert users.get_user(user_id) == User(3, "dave", 50)
+    assert users.get_credentials("dave") == (3, "hash")
+    with pytest.raises(UsernameTaken):
+        users.edit_profile(user_id, new_username="alice", new_password_hash=None)
+    with pytest.raises(UserNotFound):
+        users.get_user(4)
+    with pytest.raises(UserNotFound):
+        users.add_money(4, 50)
+
+
+def test_purchase_and_sale(pool):
+    users, market = SqliteUserDatabase(pool), SqliteMarketDatabase(pool)
+    market.import_flats([Flat(2, "Тверская, 34", 13, 3, 2, 150, True)])
+    with pytest.raises(NotEnoughMoney):
+        market.purchase_flat(user_id=1, flat_id=2)
+
+    market.purchase_flat(user_id=1, flat_id=1)
+    with pytest.raises(ItemAlreadySold):
+        market.purchase_flat(user_id=2, flat_id=1)
+    assert users.get_user(1).balance == 40
+    assert [flat.id for flat in users.get_property(1).properties] == [1]
+    assert not market.get_flat(1).is_available
+
+    with pytest.raises(NotAnOwnerError):
+        market.sell_flat(user_id=2, flat_id=1)
+    market.sell_flat(user_id=1, flat_id=1)
+    assert users.get_user(1).balance == 100
+    assert market.get_flat(1).is_available
+
+
+def test_catalogue_queries(pool):
+    market = SqliteMarketDatabase(pool)
+    market.import_flats(
+        [
+            Flat(2, "Тверская, 34", 13, 3, 2, 150, True),
+            Flat(3, "Тверская, 34", 14, 3, 2, 90, True),
+        ]
+    )
+    market.purchase_flat(user_id=1, flat_id=1)
+
+    page = market.find_flats(FlatQuery(sort="-price"))
+    assert [flat.id for flat in page.flats] == [2, 3, 1]
+    page = market.find_flats(FlatQuery(room_amount=2, only_available=True, limit=1))
+    assert ([flat.id for flat in page.flats], page.total) == ([3], 2)
+    page = market.find_flats(FlatQuery(min_price=80, max_price=100))
+    assert [flat.id for flat in page.flats] == [3]
+
+    assert market.get_flat_facets(FlatQuery()) == FlatFacets(3, 1, 2, 60, 150)
+    assert market.get_flat_facets(FlatQuery(only_available=True)) == FlatFacets(
+        2, 1, 2, 90, 150
+    )
@@ -0,0 +1,81 @@
+from infrastructure.schema import OWNERS_SCHEMA, USERS_SCHEMA
+from infrastructure.tables import LocalTable
+
+
+def make_table(path, header: str, rows: list[str], schema) -> LocalTable:
+    path.write_text("\n".join([header, *rows]) + "\n", encoding="UTF-8")
+    return LocalTable(str(path), schema)
+
+
+def test_max_key_follows_writes(tmp_path):
+    users = make_table(
+        tmp_path / "users.csv",
+        "id,username,password_hash,balance",
+        ["1,alice,x,0", "2,bob,x,0"],
+        USERS_SCHEMA,
+    )
+    assert users.max_key() == 2
+    users.insert({"id": 3, "username": "carol", "password_hash": "x", "balance": 0})
+    assert users.max_key() == 3
+    users.delete(3)
+    assert users.max_key() == 3
+
+
+def test_max_key_of_sparse_and_empty_tables(tmp_path):
+    header = "user_id,flat_id"
+    owners = make_table(
+        tmp_path / "owners.csv", header, ["1,40", "1,5", "2,900"], OWNERS_SCHEMA
+    )
+    assert owners.max_key() == 900
+    # The binary file written by the first table is mapped by the second one.
+    mapped = LocalTable(str(tmp_path / "owners.csv"), OWNERS_SCHEMA)
+    assert mapped.max_key() == 900
+
+    empty = make_table(tmp_path / "empty.csv", header, [], OWNERS_SCHEMA)
+    assert empty.max_key() is None
+    empty.insert({"user_id": 1, "flat_id": 7})
+    assert empty.max_key() == 7
+
+
+def scanned_keys(table: LocalTable, chunk_size: int) -> list[list[int]]:
+    return [[row["flat_id"] for row in chunk] for chunk in table.scan(chunk_size)]
+
+
+def test_scan_reads_key_ranges_in_order(tmp_path):
+    header = "user_id,flat_id"
+    rows = ["1,40", "1,5", "2,900", "3,12", "1,7"]
+    # The first table parses the file, the second one maps its binary copy.
+    parsed = make_table(tmp_path / "owners.csv", header, rows, OWNERS_SCHEMA)
+    mapped = LocalTable(str(tmp_path / "owners.csv"), OWNERS_SCHEMA)
+    for table in (parsed, mapped):
+        assert scanned_keys(table, 2) == [[5, 7], [12, 40], [900]]
+
+        table.insert({"user_id": 4, "flat_id": 8})
+        table.insert({"user_id": 4, "flat_id": 1000})
+        table.delete(12)
+        table.update(40, user_id=5)
+        assert scanned_keys(table, 2) == [[5, 7], [8, 40], [900, 1000]]
+        assert [row["user_id"] for chunk in table.scan(10) for row in chunk] == [
+            1,
+            1,
+            4,
+            5,
+            2,
+            4,
+        ]
+        table.invalidate()
+
+
+def test_scan_sees_writes_between_chunks(tmp_path):
+    users = make_table(
+        tmp_path / "users.csv",
+        "id,username,password_hash,balance",
+        [f"{user_id},user{user_id},x,0" for user_id in range(1, 7)],
+        USERS_SCHEMA,
+    )
+    chunks = users.scan(2)
+    assert [row["id"] for row in next(chunks)] == [1, 2]
+    users.delete(3)
+    users.insert({"id": 7, "username": "user7", "password_hash": "x", "balance": 0})
+    users.insert({"id": 0, "username": "user0", "password_hash": "x", "balance": 0})
+    assert [[row["id"] for row in chunk] for chunk in chunks] == [[4, 5], [6, 7]]
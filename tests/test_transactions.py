@@ -0,0 +1,105 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import time
+
+from conftest import PYTHONPATH
+
+BUY_FLAT = """
+    import json
+    import threading
+    import time
+
+    from application.exceptions import ItemAlreadySold
+    from infrastructure.db import LocalMarketDatabase, LocalUserDatabase
+
+    def buy(user_id):
+        try:
+            LocalMarketDatabase().purchase_flat(user_id, 1)
+        except ItemAlreadySold:
+            return False
+        return True
+"""
+
+READ_STATE = """
+    import json
+
+    from infrastructure.db import LocalMarketDatabase, LocalUserDatabase
+
+    users = LocalUserDatabase()
+    print(json.dumps({
+        "balances": {
+            user_id: users.get_user(user_id).balance for user_id in (1, 2)
+        },
+        "flats": {
+            user_id: [flat.id for flat in users.get_property(user_id).properties]
+            for user_id in (1, 2)
+        },
+    }))
+"""
+
+
+def _assert_one_winner(state: dict) -> None:
+    winners = [user_id for user_id, flats in state["flats"].items() if flats]
+    assert len(winners) == 1
+    assert state["flats"][winners[0]] == [1]
+    assert sorted(state["balances"].values()) == [40, 100]
+    assert state["balances"][winners[0]] == 40
+
+
+def test_threads_race_for_one_flat(data_dir, run_python):
+    output = run_python(
+        BUY_FLAT + """
+    barrier = threading.Barrier(2)
+    results = {}
+
+    def race(user_id):
+        barrier.wait()
+        results[user_id] = buy(user_id)
+
+    threads = [threading.Thread(target=race, args=(user_id,)) for user_id in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps(results))
+    """,
+        data_dir,
+    )
+    assert sorted(json.loads(output).values()) == [False, True]
+
+    # A new process sees the state replayed from the journal.
+    _assert_one_winner(json.loads(run_python(READ_STATE, data_dir)))
+
+
+def test_processes_race_for_one_flat(data_dir, run_python):
+    start = time.time() + 2
+    processes = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                textwrap.dedent(BUY_FLAT) + textwrap.dedent(f"""
+                    while time.time() < {start}:
+                        pass
+                    print(json.dumps(buy({user_id})))
+                    """),
+            ],
+            cwd=data_dir,
+            env={**os.environ, "PYTHONPATH": PYTHONPATH},
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        for user_id in (1, 2)
+    ]
+    results = []
+    for process in processes:
+        stdout, stderr = process.communicate(timeout=60)
+        assert process.returncode == 0, stderr
+        results.append(json.loads(stdout))
+    assert sorted(results) == [False, True]
+
+    _assert_one_winner(json.loads(run_python(READ_STATE, data_dir)))
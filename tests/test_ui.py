@@ -0,0 +1,76 @@
+import json
+import sys
+
+from streamlit.testing.v1 import AppTest
+
+from conftest import SRC_PATH
+
+LOG_IN = """
+    import json
+
+    from streamlit.testing.v1 import AppTest
+
+    from infrastructure.security import Sha256Hasher
+    from test_ui import HEAVY_PACKAGES, imported
+
+    with open("data/db/users.csv", "a", encoding="UTF-8") as file:
+        file.write(f"3,carol,{Sha256Hasher().hash('password1!')},0\\n")
+
+    at = AppTest.from_file("main.py", default_timeout=30)
+    at.run()
+    report = {"login": imported(HEAVY_PACKAGES), "title": at.title[0].value}
+
+    at.text_input[0].input("carol")
+    at.text_input[1].input("password1!")
+    at.button[0].click().run()
+    report["user_id"] = at.session_state["user_id"]
+    report["toasts"] = [toast.value for toast in at.toast]
+    report["home"] = imported(HEAVY_PACKAGES)
+    print(json.dumps(report))
+"""
+
+HEAVY_PACKAGES = ("pandas", "numpy", "PIL")
+
+
+def imported(packages) -> list[str]:
+    return [package for package in packages if package in sys.modules]
+
+
+def flash_on_click():
+    import streamlit as st
+
+    from ui.components.notifications import flash, show_flashed_messages
+
+    show_flashed_messages()
+    st.session_state.runs = st.session_state.get("runs", 0) + 1
+    if st.button("Сохранить"):
+        flash("Профиль успешно обновлен", icon="✅")
+        st.rerun()
+
+
+def test_flashed_messages_are_shown_once_after_rerun():
+    at = AppTest.from_function(flash_on_click).run()
+    assert len(at.toast) == 0
+
+    at.button[0].click().run()
+    assert at.session_state["runs"] == 3
+    assert [(toast.value, toast.icon) for toast in at.toast] == [
+        ("Профиль успешно обновлен", "✅")
+    ]
+
+    at.run()
+    assert len(at.toast) == 0
+
+
+def test_login_does_not_import_heavy_packages(data_dir, run_python):
+    (data_dir / "main.py").symlink_to(SRC_PATH / "main.py")
+    (data_dir / "ui").mkdir()
+    (data_dir / "ui" / "assets").symlink_to(SRC_PATH / "ui" / "assets")
+
+    report = json.loads(run_python(LOG_IN, data_dir))
+    assert report["title"] == "Otiva"
+    assert report["login"] == []
+    assert report["user_id"] == 3
+    assert report["toasts"] == ["Авторизация прошла успешно"]
+    # Images of the catalogue need pillow and numpy, its statistics pandas.
+    assert "pandas" not in report["home"]